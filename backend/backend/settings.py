@@ -58,6 +58,8 @@ LOGGING = {
 # Handle empty origins gracefully to avoid Django 4.0 validation errors
 cors_env = os.environ.get("CORS_ALLOWED_ORIGINS", "")
 CORS_ALLOWED_ORIGINS = cors_env.split(",") if cors_env else ["http://localhost:5173", "http://127.0.0.1:5173"]
+# Años que NASA no entregó en un análisis histórico parcial (ver historical_analysis)
+CORS_EXPOSE_HEADERS = ["X-Missing-Ranges"]
 
 csrf_env = os.environ.get("CSRF_TRUSTED_ORIGINS", "")
 CSRF_TRUSTED_ORIGINS = csrf_env.split(",") if csrf_env else ["http://localhost:5173", "http://127.0.0.1:5173"]
@@ -216,3 +218,35 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 # ------------------------------------------------------------------------------
 
 SITE_ID = 1
+
+# ------------------------------------------------------------------------------
+# CLIENTE NASA POWER (Sesión HTTP compartida)
+# ------------------------------------------------------------------------------
+NASA_POWER_CONNECT_TIMEOUT = config('NASA_POWER_CONNECT_TIMEOUT', default=5, cast=float)  # segundos
+NASA_POWER_READ_TIMEOUT = config('NASA_POWER_READ_TIMEOUT', default=60, cast=float)       # segundos
+NASA_POWER_MAX_RETRIES = config('NASA_POWER_MAX_RETRIES', default=3, cast=int)            # reintentos en 429/5xx
+NASA_POWER_BACKOFF_FACTOR = config('NASA_POWER_BACKOFF_FACTOR', default=0.5, cast=float)  # 0.5s, 1s, 2s...
+NASA_POWER_BACKOFF_MAX = config('NASA_POWER_BACKOFF_MAX', default=8, cast=float)          # tope de espera
+NASA_POWER_POOL_SIZE = config('NASA_POWER_POOL_SIZE', default=10, cast=int)               # conexiones keep-alive
+NASA_POWER_RATE_LIMIT = config('NASA_POWER_RATE_LIMIT', default=2, cast=float)            # peticiones/segundo (0 = sin límite)
+NASA_POWER_RATE_BURST = config('NASA_POWER_RATE_BURST', default=2, cast=int)              # ráfaga máxima
+NASA_POWER_CHUNK_DAYS = config('NASA_POWER_CHUNK_DAYS', default=366, cast=int)            # rangos más largos se parten por año
+NASA_POWER_CHUNK_WORKERS = config('NASA_POWER_CHUNK_WORKERS', default=4, cast=int)        # años descargados en paralelo
+NASA_POWER_BULK_WORKERS = config('NASA_POWER_BULK_WORKERS', default=8, cast=int)          # descargas concurrentes
+
+# Caché persistente de NASA POWER (tabla NasaPowerDailyCache)
+NASA_POWER_CACHE_ENABLED = config('NASA_POWER_CACHE_ENABLED', default=True, cast=bool)
+NASA_POWER_PROVISIONAL_DAYS = config('NASA_POWER_PROVISIONAL_DAYS', default=90, cast=int)  # días que NASA aún corrige
+NASA_POWER_REFRESH_HOURS = config('NASA_POWER_REFRESH_HOURS', default=24, cast=float)      # vigencia de un día provisional
+NASA_SYNC_RECHECK_DAYS = config('NASA_SYNC_RECHECK_DAYS', default=7, cast=int)              # días guardados que repite la sincronización incremental
+
+# ------------------------------------------------------------------------------
+# PRECIPITACIONES (Sincronización CHIRPS)
+# ------------------------------------------------------------------------------
+PRECIPITATION_BULK_BATCH_SIZE = config('PRECIPITATION_BULK_BATCH_SIZE', default=500, cast=int)  # filas por INSERT
+CHIRPS_BACKEND = config('CHIRPS_BACKEND', default='gee')              # 'gee' (Earth Engine) | 'local' (rásters en disco)
+CHIRPS_LOCAL_DIR = config('CHIRPS_LOCAL_DIR', default='')            # carpeta con .nc anuales o .tif diarios (ver requirements-chirps-local.txt)
+CHIRPS_PROVISIONAL_DAYS = config('CHIRPS_PROVISIONAL_DAYS', default=60, cast=int)  # días preliminares (caché)
+CHIRPS_REFRESH_HOURS = config('CHIRPS_REFRESH_HOURS', default=24, cast=float)     # vigencia de un día preliminar
+CHIRPS_SYNC_RECHECK_DAYS = config('CHIRPS_SYNC_RECHECK_DAYS', default=15, cast=int)  # días guardados que repite la sincronización incremental
+DEPENDABLE_RAIN_MIN_YEARS = config('DEPENDABLE_RAIN_MIN_YEARS', default=3, cast=int)           # años completos mínimos por mes (FAO)
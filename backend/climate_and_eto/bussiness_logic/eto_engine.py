@@ -0,0 +1,183 @@
+from functools import cached_property
+import numpy as np
+import pandas as pd
+
+from ..eto_formules_vectorial import (
+    _kernel_penman, _kernel_hargreaves, _kernel_turc, _kernel_makkink,
+    _kernel_makkink_abstew, _kernel_simple_abstew, _kernel_priestley_taylor,
+    _kernel_ivanov, _kernel_christiansen,
+    presion_atmosferica, constante_psicrometrica,
+    presion_vapor_saturacion, pendiente_presion_vapor,
+)
+from ..utils.metereological_utils import astronomia
+
+
+class ETOColumnEngine:
+    """
+    Motor columnar multi-fórmula.
+
+    Recibe el DataFrame diario (columnas de NASA POWER indexadas por fecha) y
+    calcula las nueve ETo en una sola pasada sobre arrays NumPy. Los
+    intermediarios FAO-56 (P, γ, Δ, e°, Ra) se calculan una única vez y se
+    comparten entre fórmulas.
+
+    Contrato de salida (igual al antiguo df.apply por fila):
+      - Día sin mínimos vitales (temp_avg o radiación): PENMAN, HARGREAVES y
+        TURC valen 0 y el resto de fórmulas queda NaN (sin dato).
+      - Día válido en el que una fórmula no se puede evaluar (falta humedad,
+        viento, etc.): esa fórmula vale 0.
+    Con `formulas` se limita el cálculo a un subconjunto de métodos (por
+    defecto, las nueve).
+    """
+
+    def __init__(self, df: pd.DataFrame, latitude: float, elevation: float = 0):
+        self.latitude = latitude
+        self.elevation = elevation
+        self.index = df.index
+        self.day_of_year = df.index.dayofyear.to_numpy()
+
+        def col(name):
+            if name in df.columns:
+                return df[name].to_numpy(dtype=float, na_value=np.nan)
+            return np.full(len(df), np.nan)
+
+        self.temp_max = col('temp_max')
+        self.temp_min = col('temp_min')
+        self.temp_avg = col('temp_avg')
+        self.humidity = col('humidity')
+        self.wind_speed = col('wind_speed')
+        self.radiation = col('radiation')
+
+        # Mínimos vitales del día (igual que la validación por fila anterior)
+        self.valid = ~np.isnan(self.temp_avg) & ~np.isnan(self.radiation)
+
+    # -------------------------------------------------------------------------
+    #  Intermediarios compartidos (se calculan bajo demanda, una sola vez)
+    # -------------------------------------------------------------------------
+    @cached_property
+    def gamma(self):
+        return constante_psicrometrica(presion_atmosferica(self.elevation))
+
+    @cached_property
+    def temp_mean(self):
+        return (self.temp_max + self.temp_min) / 2.0
+
+    @cached_property
+    def e_tmax(self):
+        return presion_vapor_saturacion(self.temp_max)
+
+    @cached_property
+    def e_tmin(self):
+        return presion_vapor_saturacion(self.temp_min)
+
+    @cached_property
+    def e_tmean(self):
+        return presion_vapor_saturacion(self.temp_mean)
+
+    @cached_property
+    def delta_tmean(self):
+        return pendiente_presion_vapor(self.temp_mean, self.e_tmean)
+
+    @cached_property
+    def delta_tavg(self):
+        return pendiente_presion_vapor(self.temp_avg)
+
+    @cached_property
+    def Ra(self):
+        return astronomia(self.latitude, self.day_of_year)['Ra']
+
+    # -------------------------------------------------------------------------
+    #  Fórmulas
+    # -------------------------------------------------------------------------
+    def _penman(self):
+        es = (self.e_tmax + self.e_tmin) / 2.0
+        ea = es * (self.humidity / 100.0)
+        Rso = (0.75 + 2e-5 * self.elevation) * self.Ra
+        return _kernel_penman(
+            self.temp_max, self.temp_min, self.temp_mean, self.delta_tmean, self.gamma,
+            ea, es, self.radiation, Rso, self.wind_speed
+        )
+
+    def _hargreaves(self):
+        return _kernel_hargreaves(self.temp_max, self.temp_min, self.temp_avg, self.Ra)
+
+    def _turc(self):
+        return _kernel_turc(self.temp_avg, self.humidity, self.radiation)
+
+    def _priestley(self):
+        return _kernel_priestley_taylor(self.delta_tavg, self.gamma, self.radiation)
+
+    def _makkink(self):
+        return _kernel_makkink(self.delta_tavg, self.gamma, self.radiation)
+
+    def _makkink_abstew(self):
+        return _kernel_makkink_abstew(self.delta_tavg, self.gamma, self.radiation)
+
+    def _ivanov(self):
+        return _kernel_ivanov(self.temp_avg, self.humidity)
+
+    def _christiansen(self):
+        return _kernel_christiansen(
+            self.delta_tmean, self.gamma, self.e_tmean, self.humidity,
+            self.wind_speed, self.radiation, self.temp_mean
+        )
+
+    def _simple_abstew(self):
+        return _kernel_simple_abstew(self.temp_max, self.temp_min, self.radiation)
+
+    _DISPATCH = {
+        'PENMAN': _penman,
+        'HARGREAVES': _hargreaves,
+        'TURC': _turc,
+        'PRIESTLEY': _priestley,
+        'MAKKINK': _makkink,
+        'MAKKINK_ABSTEW': _makkink_abstew,
+        'IVANOV': _ivanov,
+        'CHRISTIANSEN': _christiansen,
+        'SIMPLE_ABSTEW': _simple_abstew,
+    }
+    # Orden canónico de columnas (el mismo que usaba la gráfica histórica)
+    FORMULAS = list(_DISPATCH.keys())
+    # Únicas columnas que el cálculo por fila devolvía (en 0) para un día inválido
+    ZERO_WHEN_INVALID = ('PENMAN', 'HARGREAVES', 'TURC')
+
+    @classmethod
+    def resolve_formulas(cls, formulas=None) -> list:
+        """
+        Normaliza la selección de fórmulas (lista o 'PENMAN,TURC').
+        None o vacío = todas. Lanza ValueError si alguna no existe.
+        """
+        if not formulas:
+            return list(cls.FORMULAS)
+        if isinstance(formulas, str):
+            formulas = formulas.split(',')
+        requested = [f.strip().upper() for f in formulas if f and f.strip()]
+        unknown = [f for f in requested if f not in cls._DISPATCH]
+        if unknown:
+            raise ValueError(
+                f"Fórmulas no soportadas: {', '.join(unknown)}. "
+                f"Disponibles: {', '.join(cls.FORMULAS)}"
+            )
+        # Respetamos el orden canónico y eliminamos duplicados
+        return [f for f in cls.FORMULAS if f in requested] or list(cls.FORMULAS)
+
+    def compute(self, formulas=None) -> pd.DataFrame:
+        """
+        Retorna un DataFrame (mismo índice) con una columna por fórmula pedida.
+        Solo se evalúan los intermediarios que esas fórmulas necesitan.
+        """
+        columns = {}
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            for key in self.resolve_formulas(formulas):
+                raw = self._DISPATCH[key](self)
+                eto = np.round(np.maximum(raw, 0.0), 2)
+                # Máscara en lugar de try/except: fórmula no evaluable → 0
+                eto = np.where(np.isfinite(eto), eto, 0.0)
+                # Día sin mínimos vitales → 0 o NaN según el contrato de arriba
+                invalido = 0.0 if key in self.ZERO_WHEN_INVALID else np.nan
+                columns[key] = np.where(self.valid, eto, invalido)
+        return pd.DataFrame(columns, index=self.index)
+
+    @classmethod
+    def calculate(cls, df: pd.DataFrame, latitude: float, elevation: float = 0, formulas=None) -> pd.DataFrame:
+        return cls(df, latitude, elevation).compute(formulas)
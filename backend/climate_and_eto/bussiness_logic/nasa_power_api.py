@@ -1,7 +1,61 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
 import requests
-from datetime import datetime, date
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from datetime import datetime, date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
 from django.conf import settings
+from .nasa_power_cache import NASAPowerCache, PowerGrid
+
+logger = logging.getLogger(__name__)
+
+
+class NASAPowerPartialError(Exception):
+    """
+    Fallaron algunos bloques de una descarga por bloques. No se pierde lo que
+    sí llegó: `frame` trae la serie parcial (mismo formato que
+    get_daily_frame) y `failed_ranges` los rangos (inicio, fin) que faltan.
+    """
+
+    def __init__(self, failed_ranges: List[Tuple[date, date]], frames: List[pd.DataFrame]):
+        self.failed_ranges = failed_ranges
+        self.frames = frames
+        self.frame = None
+        failed = ', '.join(f"{start:%Y-%m-%d}..{end:%Y-%m-%d}" for start, end in failed_ranges)
+        super().__init__(f"NASA POWER: fallaron {len(failed_ranges)} bloques ({failed})")
+
+
+class RateLimiter:
+    """
+    Token bucket thread-safe: como máximo `rate` peticiones por segundo, con
+    ráfagas de hasta `burst`. rate <= 0 desactiva el límite.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
 class NASAPowerAPI:
     BASE_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
@@ -16,10 +70,138 @@ class NASAPowerAPI:
         'PS',
     ]
 
-    def get_daily_data(self, latitude: float, longitude: float, start_date: date, end_date: date) -> Dict:
-        """Obtiene datos diarios de NASA POWER"""
+    # Parámetro NASA → columna del modelo (mismo orden que NASAPowerCache.FIELDS)
+    FIELD_MAP = [
+        ('T2M_MAX', 'temp_max'),
+        ('T2M_MIN', 'temp_min'),
+        ('T2M', 'temp_avg'),
+        ('RH2M', 'humidity'),
+        ('ALLSKY_SFC_SW_DWN', 'radiation'),
+        ('WS2M', 'wind_speed'),
+        ('PS', 'pressure'),
+    ]
+
+    # Valor de relleno de NASA POWER para "sin dato"
+    FILL_VALUE = -999
+
+    # Códigos que ameritan reintento (rate limit y fallas transitorias del servidor)
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    # Sesión keep-alive compartida por todo el proceso (una por worker de gunicorn)
+    _session = None
+    _session_lock = threading.Lock()
+
+    # Límite de peticiones a NASA compartido por todos los hilos del proceso
+    _rate_limiter = None
+
+    # Contadores acumulados del proceso (diagnóstico)
+    stats = {'calls': 0, 'attempts': 0, 'failures': 0, 'total_latency_ms': 0.0}
+    _stats_lock = threading.Lock()
+
+    def __init__(self, connect_timeout: float = None, read_timeout: float = None,
+                 max_retries: int = None, backoff_factor: float = None, backoff_max: float = None,
+                 use_cache: bool = None, chunk_workers: int = None):
+        self.use_cache = use_cache if use_cache is not None else getattr(settings, 'NASA_POWER_CACHE_ENABLED', True)
+        self.connect_timeout = connect_timeout if connect_timeout is not None else getattr(settings, 'NASA_POWER_CONNECT_TIMEOUT', 5)
+        self.read_timeout = read_timeout if read_timeout is not None else getattr(settings, 'NASA_POWER_READ_TIMEOUT', 60)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'NASA_POWER_MAX_RETRIES', 3)
+        self.backoff_factor = backoff_factor if backoff_factor is not None else getattr(settings, 'NASA_POWER_BACKOFF_FACTOR', 0.5)
+        self.backoff_max = backoff_max if backoff_max is not None else getattr(settings, 'NASA_POWER_BACKOFF_MAX', 8)
+        self.chunk_days = getattr(settings, 'NASA_POWER_CHUNK_DAYS', 366)
+        self.chunk_workers = chunk_workers or getattr(settings, 'NASA_POWER_CHUNK_WORKERS', 4)
+        # Métricas de la última llamada: {'attempts', 'latency_ms', 'status'}
+        self.last_call_stats = None
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """Crea (una sola vez) la sesión HTTP con pool de conexiones keep-alive."""
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    pool_size = getattr(settings, 'NASA_POWER_POOL_SIZE', 10)
+                    # Los reintentos los gestionamos nosotros (backoff + contadores)
+                    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def get_rate_limiter(cls) -> RateLimiter:
+        """Token bucket del proceso (NASA_POWER_RATE_LIMIT peticiones/segundo)."""
+        if cls._rate_limiter is None:
+            with cls._session_lock:
+                if cls._rate_limiter is None:
+                    cls._rate_limiter = RateLimiter(
+                        getattr(settings, 'NASA_POWER_RATE_LIMIT', 2),
+                        getattr(settings, 'NASA_POWER_RATE_BURST', 2),
+                    )
+        return cls._rate_limiter
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Backoff exponencial acotado; respeta Retry-After si el servidor lo envía."""
+        delay = self.backoff_factor * (2 ** (attempt - 1))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return min(delay, self.backoff_max)
+
+    def _record_call(self, attempts: int, started: float, status: Optional[int], failed: bool):
+        latency_ms = (time.monotonic() - started) * 1000
+        self.last_call_stats = {'attempts': attempts, 'latency_ms': round(latency_ms, 1), 'status': status}
+        with self._stats_lock:
+            self.stats['calls'] += 1
+            self.stats['attempts'] += attempts
+            self.stats['total_latency_ms'] += latency_ms
+            if failed:
+                self.stats['failures'] += 1
+        logger.debug(f"NASA POWER: {attempts} intento(s), {latency_ms:.0f} ms, status={status}")
+
+    def _request(self, params: Dict) -> Dict:
+        """GET con timeouts de conexión/lectura y reintentos en 429/5xx o errores de red."""
+        session = self.get_session()
+        limiter = self.get_rate_limiter()
+        timeout = (self.connect_timeout, self.read_timeout)
+        started = time.monotonic()
+        attempts = 0
+        status = None
 
-        params = {
+        while True:
+            attempts += 1
+            limiter.acquire()  # Los reintentos también cuentan contra el límite de NASA
+            try:
+                response = session.get(self.BASE_URL, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempts > self.max_retries:
+                    self._record_call(attempts, started, status, failed=True)
+                    raise
+                delay = self._backoff_delay(attempts)
+                logger.warning(f"NASA POWER: error de red ({e}). Reintento {attempts}/{self.max_retries} en {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            status = response.status_code
+            if status in self.RETRY_STATUSES and attempts <= self.max_retries:
+                delay = self._backoff_delay(attempts, response.headers.get('Retry-After'))
+                logger.warning(f"NASA POWER: HTTP {status}. Reintento {attempts}/{self.max_retries} en {delay:.1f}s")
+                response.close()
+                time.sleep(delay)
+                continue
+
+            try:
+                response.raise_for_status()
+                data = response.json()
+            except Exception:
+                self._record_call(attempts, started, status, failed=True)
+                raise
+            self._record_call(attempts, started, status, failed=False)
+            return data
+
+    def _build_params(self, latitude: float, longitude: float, start_date: date, end_date: date) -> Dict:
+        return {
             'parameters': ','.join(self.PARAMETERS),
             'community': 'AG',
             'longitude': longitude,
@@ -29,47 +211,160 @@ class NASAPowerAPI:
             'format': 'JSON'
         }
 
-        response = requests.get(self.BASE_URL, params=params)
-        response.raise_for_status()
+    def get_daily_data(self, latitude: float, longitude: float, start_date: date, end_date: date) -> Dict:
+        """
+        Obtiene datos diarios de NASA POWER en formato de diccionario por fecha
+        ISO: {'YYYY-MM-DD': {'temp_max': ..., ...}}. Para series largas usar
+        get_daily_frame (evita crear un dict por día).
+        """
+        return self._frame_to_days(self.get_daily_frame(latitude, longitude, start_date, end_date))
+
+    def get_daily_frame(self, latitude: float, longitude: float, start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        Obtiene datos diarios de NASA POWER como DataFrame (índice de fechas,
+        una columna float por variable, NaN donde NASA no tiene dato).
+        Con caché activa solo se descargan los sub-rangos que faltan (o los días
+        provisionales vencidos) y se mezclan con lo ya guardado.
+        Si fallan algunos bloques se lanza NASAPowerPartialError con la serie
+        parcial en `frame` (sin caché es la única copia de lo descargado).
+        """
+        if not self.use_cache:
+            try:
+                frames = self._fetch_ranges(latitude, longitude, [(start_date, end_date)])
+            except NASAPowerPartialError as e:
+                e.frame = self._complete_frame(self._assemble(e.frames))
+                raise
+            return self._complete_frame(self._assemble(frames))
+
+        cache = NASAPowerCache()
+        cell = PowerGrid.cell(latitude, longitude)
+
+        # Una sola descarga por zona a la vez; se pide el centro de la zona (dentro
+        # de la celda meteorológica y de la solar) para que todas las fincas de la
+        # zona compartan exactamente la misma petición y serie
+        with PowerGrid.single_flight(cell):
+            cached = cache.load(cell, start_date, end_date)
+            missing = cache.missing_ranges(cached, start_date, end_date)
+            # Cada bloque se guarda apenas llega: si otro falla, el reintento solo pide ese año
+            try:
+                fetched = self._fetch_ranges(
+                    cell.latitude, cell.longitude, missing, on_chunk=lambda frame: cache.store(cell, frame)
+                )
+            except NASAPowerPartialError as e:
+                e.frame = self._complete_frame(self._assemble([cached[NASAPowerCache.FIELDS]] + e.frames))
+                raise
+
+        return self._complete_frame(self._assemble([cached[NASAPowerCache.FIELDS]] + fetched))
+
+    def _split_range(self, start_date: date, end_date: date) -> List[Tuple[date, date]]:
+        """Rangos largos (> NASA_POWER_CHUNK_DAYS) se parten en años calendario."""
+        if (end_date - start_date).days < self.chunk_days:
+            return [(start_date, end_date)]
+        chunks = []
+        curr = start_date
+        while curr <= end_date:
+            chunk_end = min(date(curr.year, 12, 31), end_date)
+            chunks.append((curr, chunk_end))
+            curr = chunk_end + timedelta(days=1)
+        return chunks
+
+    def _fetch_chunk(self, latitude: float, longitude: float, start_date: date, end_date: date) -> pd.DataFrame:
+        frame = self._parse_frame(self._request(self._build_params(latitude, longitude, start_date, end_date)))
+        # NASA puede devolver días fuera del sub-rango pedido; solo dejamos los pedidos
+        return frame.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+
+    def _fetch_ranges(self, latitude: float, longitude: float, ranges: List[Tuple[date, date]],
+                      on_chunk: Callable[[pd.DataFrame], None] = None) -> List[pd.DataFrame]:
+        """
+        Descarga los rangos partidos en bloques anuales, en paralelo
+        (NASA_POWER_CHUNK_WORKERS). `on_chunk` se ejecuta en este hilo por cada
+        bloque que llega (ej. guardarlo en caché). Si falla el único bloque se
+        relanza su error; si fallan algunos de varios se esperan los demás y se
+        lanza NASAPowerPartialError con los bloques que sí llegaron.
+        """
+        chunks = [chunk for start, end in ranges for chunk in self._split_range(start, end)]
+        if not chunks:
+            return []
+
+        if len(chunks) == 1:
+            frame = self._fetch_chunk(latitude, longitude, *chunks[0])
+            if on_chunk:
+                on_chunk(frame)
+            return [frame]
+
+        frames, errors = [], []
+        with ThreadPoolExecutor(max_workers=min(self.chunk_workers, len(chunks))) as executor:
+            futures = {executor.submit(self._fetch_chunk, latitude, longitude, *chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    frame = future.result()
+                except Exception as e:
+                    errors.append((futures[future], e))
+                    continue
+                if on_chunk:
+                    on_chunk(frame)
+                frames.append(frame)
+
+        if errors:
+            errors.sort(key=lambda x: x[0])
+            partial = NASAPowerPartialError([chunk for chunk, _ in errors], frames)
+            logger.error(f"{partial} de {len(chunks)}; primer error: {errors[0][1]}")
+            raise partial from errors[0][1]
+        return frames
+
+    @staticmethod
+    def _assemble(frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """Une bloques en una serie ordenada; ante fechas repetidas gana el último (lo recién descargado)."""
+        frames = [frame for frame in frames if not frame.empty] or frames[:1]
+        if not frames:
+            return pd.DataFrame(columns=NASAPowerCache.FIELDS, index=pd.DatetimeIndex([]), dtype=float)
+        frame = pd.concat(frames) if len(frames) > 1 else frames[0]
+        return frame[~frame.index.duplicated(keep='last')].sort_index()
 
-        return self._process_nasa_response(response.json())
-    
     def _process_nasa_response(self, data: Dict) -> Dict:
         """Convierte la respuesta de NASA POWER a formato del modelo"""
+        return self._frame_to_days(self._complete_frame(self._parse_frame(data)))
 
+    def _parse_frame(self, data: Dict) -> pd.DataFrame:
+        """
+        Bloque `parameter` de NASA → DataFrame columnar (todos los días, incluidos
+        los incompletos). Cada parámetro se convierte directamente en un array
+        float y el valor de relleno de NASA (-999) pasa a NaN en un solo paso.
+        """
         parameters = data['properties']['parameter']
-        processed_data = {}
-
-        # Obtener las fechas disponibles del primer parametro
-        first_param = list(parameters.keys())[0]
-        dates = parameters[first_param].keys()
-
-        for date_str in dates:
-            # Convertir formato NASA (YYYYMMDD) a nuestro formato
-            formatted_date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
-
-            # CORRECCIÓN DE UNIDADES: 
-            # NASA envía kWh/m^2/dia. 
-            # FAO Penman-Monteith requiere MJ/m^2/dia.
-            # Factor de conversión: 1 kWh = 3.6 MJ
-            raw_radiation = parameters.get('ALLSKY_SFC_SW_DWN', {}).get(date_str)
-            if raw_radiation == -999: raw_radiation = None
-
-            day_data = {
-                'temp_max': parameters.get('T2M_MAX', {}).get(date_str),
-                'temp_min': parameters.get('T2M_MIN', {}).get(date_str),
-                'temp_avg': parameters.get('T2M', {}).get(date_str),
-                'humidity': parameters.get('RH2M', {}).get(date_str),
-                'radiation': raw_radiation, # Se usa el valor convertido
-                'wind_speed': parameters.get('WS2M', {}).get(date_str),
-                'pressure': parameters.get('PS', {}).get(date_str),
-            }
-
-            # Validar que no haya valores None críticos
-            if day_data['temp_avg'] is not None and day_data['radiation'] is not None:
-                processed_data[formatted_date] = day_data
-
-        return processed_data
+        if not parameters:
+            return pd.DataFrame(columns=NASAPowerCache.FIELDS, index=pd.DatetimeIndex([]), dtype=float)
+
+        # Fechas disponibles según el primer parámetro (YYYYMMDD)
+        date_keys = list(next(iter(parameters.values())).keys())
+        n_days = len(date_keys)
+
+        values = np.full((n_days, len(self.FIELD_MAP)), np.nan)
+        for col, (param, _) in enumerate(self.FIELD_MAP):
+            series = parameters.get(param)
+            if not series:
+                continue
+            if len(series) == n_days and list(series.keys()) == date_keys:
+                values[:, col] = np.fromiter(series.values(), dtype=float, count=n_days)
+            else:
+                # Parámetro con fechas distintas (raro): alineamos por clave
+                values[:, col] = [series.get(k, np.nan) for k in date_keys]
+
+        values[values == self.FILL_VALUE] = np.nan
+
+        index = pd.to_datetime(date_keys, format='%Y%m%d')
+        return pd.DataFrame(values, index=index, columns=[field for _, field in self.FIELD_MAP])
+
+    @staticmethod
+    def _complete_frame(frame: pd.DataFrame) -> pd.DataFrame:
+        """Descarta los días sin los valores críticos (temp_avg y radiación)."""
+        return frame.loc[frame['temp_avg'].notna() & frame['radiation'].notna(), NASAPowerCache.FIELDS]
+
+    @staticmethod
+    def _frame_to_days(frame: pd.DataFrame) -> Dict:
+        """DataFrame → {'YYYY-MM-DD': {...}} con None en lugar de NaN."""
+        records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+        return dict(zip(frame.index.strftime('%Y-%m-%d'), records))
 
 def _validate(self, value):
         """Helper para limpiar valores de error de NASA (-999)"""
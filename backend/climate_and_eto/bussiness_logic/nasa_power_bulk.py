@@ -0,0 +1,74 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from typing import Dict, Hashable, Iterable, Iterator, NamedTuple, Optional
+import pandas as pd
+from django.conf import settings
+from django.db import close_old_connections
+
+from .nasa_power_api import NASAPowerAPI
+
+logger = logging.getLogger(__name__)
+
+
+class FetchJob(NamedTuple):
+    """Una descarga: `key` identifica el resultado (ej. id del suelo o la celda)."""
+    key: Hashable
+    latitude: float
+    longitude: float
+    start_date: date
+    end_date: date
+
+
+class FetchResult(NamedTuple):
+    job: FetchJob
+    data: Optional[pd.DataFrame]
+    error: Optional[Exception]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class NASAPowerBulkFetcher:
+    """
+    Descarga muchas ubicaciones de NASA POWER en paralelo.
+
+    - Concurrencia acotada (NASA_POWER_BULK_WORKERS hilos).
+    - El límite de peticiones/segundo lo aplica NASAPowerAPI (token bucket
+      compartido), así que solo consumen cupo las llamadas reales a NASA; los
+      días que ya están en caché no cuentan.
+    - Cada resultado trae el DataFrame diario de la ubicación.
+    - Los resultados se entregan a medida que terminan; un error en una
+      ubicación no detiene las demás.
+    """
+
+    def __init__(self, max_workers: int = None, api: NASAPowerAPI = None):
+        self.max_workers = max_workers or getattr(settings, 'NASA_POWER_BULK_WORKERS', 8)
+        self.api = api or NASAPowerAPI()
+
+    def _run(self, job: FetchJob) -> pd.DataFrame:
+        try:
+            return self.api.get_daily_frame(job.latitude, job.longitude, job.start_date, job.end_date)
+        finally:
+            # Cada hilo abre su propia conexión a la BD (caché): la cerramos al terminar
+            close_old_connections()
+
+    def iter_fetch(self, jobs: Iterable[FetchJob]) -> Iterator[FetchResult]:
+        """Genera un FetchResult por trabajo, en orden de finalización."""
+        jobs = list(jobs)
+        if not jobs:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+            futures = {executor.submit(self._run, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    yield FetchResult(job, future.result(), None)
+                except Exception as e:
+                    logger.warning(f"NASA POWER: falló la descarga de {job.key}: {e}")
+                    yield FetchResult(job, None, e)
+
+    def fetch_all(self, jobs: Iterable[FetchJob]) -> Dict[Hashable, FetchResult]:
+        """Versión bloqueante: {key: FetchResult}."""
+        return {result.job.key: result for result in self.iter_fetch(jobs)}
@@ -0,0 +1,172 @@
+import math
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import List, NamedTuple, Tuple
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import NasaPowerDailyCache
+
+
+class PowerCell(NamedTuple):
+    """
+    Zona de la grilla POWER identificada por sus índices: celda MERRA-2 de la
+    meteorología (grid_lat, grid_lon) y celda de 1° de la radiación solar
+    (rad_lat, rad_lon). Todo punto de la zona recibe la misma serie diaria.
+    """
+    grid_lat: int
+    grid_lon: int
+    rad_lat: int
+    rad_lon: int
+
+    @property
+    def latitude(self) -> float:
+        """Centro de la zona: dentro de la celda MERRA-2 y de la celda solar."""
+        return PowerGrid.center(self.grid_lat, PowerGrid.LAT_STEP, self.rad_lat)
+
+    @property
+    def longitude(self) -> float:
+        return PowerGrid.center(self.grid_lon, PowerGrid.LON_STEP, self.rad_lon)
+
+
+class PowerGrid:
+    """
+    Capa de ubicación sobre las grillas de NASA POWER. La meteorología viene
+    de MERRA-2 (0.5° de latitud × 0.625° de longitud, centradas en múltiplos
+    del paso) y la radiación solar de una grilla de 1° (celdas [n, n+1)) que
+    no coincide con la anterior. Una zona es la intersección de ambas celdas:
+    todo punto dentro de ella recibe exactamente la misma serie diaria, así
+    que se descarga una vez por zona/fecha y se comparte entre usuarios.
+    """
+    LAT_STEP = 0.5
+    LON_STEP = 0.625
+    SOLAR_STEP = 1.0
+
+    # Descargas en curso por zona: dos peticiones simultáneas a la misma zona
+    # no descargan dos veces (la segunda espera y lee de la caché). Zonas
+    # distintas nunca se bloquean entre sí, y la entrada se borra al terminar.
+    _in_flight = {}
+    _in_flight_lock = threading.Lock()
+
+    @classmethod
+    def cell(cls, latitude: float, longitude: float) -> PowerCell:
+        """Zona que contiene el punto."""
+        latitude, longitude = float(latitude), float(longitude)
+        return PowerCell(
+            round(latitude / cls.LAT_STEP), round(longitude / cls.LON_STEP),
+            math.floor(latitude / cls.SOLAR_STEP), math.floor(longitude / cls.SOLAR_STEP),
+        )
+
+    @classmethod
+    def center(cls, index: int, step: float, solar_index: int) -> float:
+        """Punto medio de la intersección entre la celda MERRA-2 y la celda solar en un eje."""
+        inicio = max((index - 0.5) * step, solar_index * cls.SOLAR_STEP)
+        fin = min((index + 0.5) * step, (solar_index + 1) * cls.SOLAR_STEP)
+        return (inicio + fin) / 2
+
+    @classmethod
+    @contextmanager
+    def single_flight(cls, cell: PowerCell):
+        """
+        Exclusión por zona: el primero en llegar pasa; los demás esperan a que
+        termine (sin candado global durante la descarga) y vuelven a intentar.
+        """
+        while True:
+            with cls._in_flight_lock:
+                en_curso = cls._in_flight.get(cell)
+                if en_curso is None:
+                    terminado = cls._in_flight[cell] = threading.Event()
+                    break
+            en_curso.wait()
+        try:
+            yield
+        finally:
+            with cls._in_flight_lock:
+                del cls._in_flight[cell]
+            terminado.set()
+
+
+class NASAPowerCache:
+    """
+    Caché en base de datos de días ya descargados de NASA POWER.
+
+    - Los días finales se sirven siempre desde la caché.
+    - Los días dentro de la ventana provisional (NASA_POWER_PROVISIONAL_DAYS)
+      se vuelven a pedir cuando su descarga tiene más de
+      NASA_POWER_REFRESH_HOURS horas.
+    """
+
+    FIELDS = ['temp_max', 'temp_min', 'temp_avg', 'humidity', 'radiation', 'wind_speed', 'pressure']
+
+    # Huecos menores a esto se piden junto con el rango vecino (una llamada en vez de dos)
+    MERGE_GAP_DAYS = 30
+
+    def __init__(self, provisional_days: int = None, refresh_hours: float = None):
+        self.provisional_days = provisional_days if provisional_days is not None else getattr(settings, 'NASA_POWER_PROVISIONAL_DAYS', 90)
+        self.refresh_hours = refresh_hours if refresh_hours is not None else getattr(settings, 'NASA_POWER_REFRESH_HOURS', 24)
+
+    def provisional_since(self) -> date:
+        """Primer día considerado provisional (NASA todavía puede corregirlo)."""
+        return timezone.now().date() - timedelta(days=self.provisional_days)
+
+    def load(self, cell: PowerCell, start_date: date, end_date: date) -> pd.DataFrame:
+        """Días cacheados de la celda en el rango: DataFrame (índice fecha) con las variables y `_stale`."""
+        stale_before = timezone.now() - timedelta(hours=self.refresh_hours)
+        rows = list(NasaPowerDailyCache.objects.filter(
+            grid_lat=cell.grid_lat, grid_lon=cell.grid_lon, rad_lat=cell.rad_lat, rad_lon=cell.rad_lon,
+            date__range=[start_date, end_date]
+        ).order_by('date').values_list('date', 'is_provisional', 'fetched_at', *self.FIELDS))
+
+        columns = ['date', 'is_provisional', 'fetched_at'] + self.FIELDS
+        frame = pd.DataFrame.from_records(rows, columns=columns)
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop('date')))
+        frame[self.FIELDS] = frame[self.FIELDS].astype(float)
+        frame['_stale'] = frame.pop('is_provisional').astype(bool) & (frame.pop('fetched_at') < stale_before)
+        return frame
+
+    def missing_ranges(self, cached: pd.DataFrame, start_date: date, end_date: date) -> List[Tuple[date, date]]:
+        """Sub-rangos [inicio, fin] que hay que pedir a NASA (faltantes o provisionales vencidos)."""
+        days = pd.date_range(start_date, end_date, freq='D')
+        fresh = cached.index[~cached['_stale']]
+        missing = np.flatnonzero(~days.isin(fresh))
+        if missing.size == 0:
+            return []
+
+        # Cortamos donde el hueco entre días faltantes supera MERGE_GAP_DAYS
+        breaks = np.flatnonzero(np.diff(missing) > self.MERGE_GAP_DAYS)
+        starts = np.concatenate(([missing[0]], missing[breaks + 1]))
+        ends = np.concatenate((missing[breaks], [missing[-1]]))
+        return [(days[s].date(), days[e].date()) for s, e in zip(starts, ends)]
+
+    @transaction.atomic
+    def store(self, cell: PowerCell, frame: pd.DataFrame):
+        """Upsert de los días descargados (DataFrame de NASAPowerAPI) en un solo lote."""
+        if frame.empty:
+            return
+        provisional_since = pd.Timestamp(self.provisional_since())
+        is_provisional = frame.index >= provisional_since
+        values = frame[self.FIELDS].astype(object).where(frame[self.FIELDS].notna(), None)
+
+        objs = [
+            NasaPowerDailyCache(
+                grid_lat=cell.grid_lat,
+                grid_lon=cell.grid_lon,
+                rad_lat=cell.rad_lat,
+                rad_lon=cell.rad_lon,
+                date=day.date(),
+                is_provisional=bool(provisional),
+                **dict(zip(self.FIELDS, row))
+            )
+            for day, provisional, row in zip(frame.index, is_provisional, values.itertuples(index=False, name=None))
+        ]
+        NasaPowerDailyCache.objects.bulk_create(
+            objs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['grid_lat', 'grid_lon', 'rad_lat', 'rad_lon', 'date'],
+            update_fields=self.FIELDS + ['is_provisional', 'fetched_at'],
+        )
@@ -1,10 +1,15 @@
 import math
 from typing import Dict, List, Tuple
 from datetime import date
+from .eto_formules_vectorial import ETOFormulasBatch
+from .utils.metereological_utils import astronomia_diaria
 
 class ETOFormulas:
     """Colección de fórmulas para calcular evapotranspiracion de referencia"""
 
+    # Versión NumPy de todas las fórmulas (columnas completas): ETOFormulas.batch.penman_monteith(...)
+    batch = ETOFormulasBatch
+
     # 🟢 FUENTE ÚNICA DE VERDAD: Definimos los nombres aquí
     METHOD_LABELS = {
         'PENMAN': 'Penman-Monteith (FAO-56)',
@@ -172,35 +177,16 @@ class ETOFormulas:
         # PASO 5: RADIACIÓN
         # ════════════════════════════════════════════════════════════════
 
-        # ▸ Eq. 22 — Latitud en radianes
-        lat_rad = math.radians(latitude)
-
-        # ▸ Eq. 24 — Declinación solar [rad]
-        # δ = 0.409 sin(2π/365 × J - 1.39)
-        sol_dec = 0.409 * math.sin((2.0 * math.pi / 365.0) * day_of_year - 1.39)
-
-        # ▸ Eq. 25 — Ángulo horario de puesta del sol [rad]
-        # ωs = arccos[-tan(φ) tan(δ)]
-        ws_arg = -math.tan(lat_rad) * math.tan(sol_dec)
-        ws_arg = max(-1.0, min(1.0, ws_arg))  # Protección polar
-        ws = math.acos(ws_arg)
-
-        # ▸ Eq. 23 — Distancia relativa inversa Tierra-Sol
-        # dr = 1 + 0.033 cos(2π/365 × J)
-        dr = 1.0 + 0.033 * math.cos((2.0 * math.pi / 365.0) * day_of_year)
-
-        # ▸ Eq. 21 — Radiación extraterrestre [MJ m⁻² día⁻¹]
-        # Ra = (24×60/π) × Gsc × dr × [ωs sin(φ)sin(δ) + cos(φ)cos(δ)sin(ωs)]
-        # donde Gsc = 0.0820 MJ m⁻² min⁻¹
-        Gsc = 0.0820
-        Ra = (24.0 * 60.0 / math.pi) * Gsc * dr * (
-            ws * math.sin(lat_rad) * math.sin(sol_dec) +
-            math.cos(lat_rad) * math.cos(sol_dec) * math.sin(ws)
-        )
-
-        # ▸ Eq. 34 — Horas máximas de insolación (duración del día) [h]
-        # N = (24/π) × ωs
-        N = (24.0 / math.pi) * ws
+        # ▸ Eq. 21-25 y 34 — δ, ωs, dr, Ra y N dependen solo de (latitud, día juliano):
+        #   se leen de la tabla astronómica precalculada por latitud (ver metereological_utils)
+        #   δ  = 0.409 sin(2π/365 × J - 1.39)                                  (Eq. 24)
+        #   ωs = arccos[-tan(φ) tan(δ)]                                        (Eq. 25)
+        #   dr = 1 + 0.033 cos(2π/365 × J)                                     (Eq. 23)
+        #   Ra = (24×60/π) × Gsc × dr × [ωs sin(φ)sin(δ) + cos(φ)cos(δ)sin(ωs)] (Eq. 21)
+        #   N  = (24/π) × ωs                                                   (Eq. 34)
+        astro = astronomia_diaria(latitude, day_of_year)
+        Ra = astro['Ra']
+        N = astro['N']
 
         # ▸ Radiación solar Rs [MJ m⁻² día⁻¹]
         if solar_radiation is not None:
@@ -290,27 +276,8 @@ class ETOFormulas:
         Hargreaves-Samani (1985)
         Unidades de salida: mm/día
         """
-        # 1. Latitud a radianes
-        lat_rad = math.radians(latitude)
-
-        # 2. Declinación solar
-        delta = 0.409 * math.sin(2 * math.pi * day_of_year / 365 - 1.39)
-
-        # 3. Ángulo horario de puesta del sol
-        ws_val = -math.tan(lat_rad) * math.tan(delta)
-        # Protección matemática para zonas polares (no es tu caso, pero es buena práctica)
-        ws_val = max(-1, min(1, ws_val)) 
-        ws = math.acos(ws_val)
-
-        # 4. Distancia relativa Tierra-Sol
-        dr = 1 + 0.033 * math.cos(2 * math.pi * day_of_year / 365)
-
-        # 5. Radiación Extraterrestre (Ra) en MJ/m2/día
-        # Constante solar Gsc = 0.0820 MJ/m2/min
-        Ra = (24 * 60 / math.pi) * 0.0820 * dr * (
-            (ws * math.sin(lat_rad) * math.sin(delta)) + 
-            (math.cos(lat_rad) * math.cos(delta) * math.sin(ws))
-        )
+        # 1-5. Radiación Extraterrestre (Ra) en MJ/m2/día desde la tabla astronómica
+        Ra = astronomia_diaria(latitude, day_of_year)['Ra']
 
         # 6. Fórmula Hargreaves-Samani
         # 🟢 CORRECCIÓN CRÍTICA: Multiplicar por 0.408 para convertir MJ a mm
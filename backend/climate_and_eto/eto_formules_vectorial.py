@@ -0,0 +1,305 @@
+import functools
+import numpy as np
+from .utils.metereological_utils import astronomia
+
+# =============================================================================
+#  API VECTORIAL (NumPy) DE LAS FÓRMULAS DE ETo
+# =============================================================================
+# Réplica columna-a-columna de ETOFormulas: cada método recibe arrays (o
+# escalares, que se difunden por broadcasting) y devuelve un np.ndarray con
+# el mismo redondeo que la versión escalar.
+#
+# Convención de datos faltantes: NaN en una entrada produce NaN en la salida
+# de ese día (la versión escalar lanzaría una excepción). Las entradas
+# opcionales siguen la jerarquía FAO-56 elemento a elemento: un NaN en
+# `temp_dew` hace caer ese día a RHmax/RHmin, y así sucesivamente.
+#
+# Las funciones `_kernel_*` reciben los intermediarios ya calculados (Δ, γ,
+# Ra, es...) para que un motor multi-fórmula pueda compartirlos.
+
+
+def _vectorial(func):
+    """Silencia los warnings de NumPy: los días inválidos quedan como NaN."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _arr(value):
+    """Convierte a array float64. None se interpreta como dato ausente (NaN)."""
+    if value is None:
+        return np.array(np.nan)
+    return np.asarray(value, dtype=float)
+
+
+def _finish(eto):
+    """max(0, ETo) redondeado a 2 decimales, conservando NaN."""
+    return np.round(np.maximum(eto, 0.0), 2)
+
+
+# -----------------------------------------------------------------------------
+#  Intermediarios FAO-56
+# -----------------------------------------------------------------------------
+
+def presion_atmosferica(elevation):
+    """Eq. 7 — P [kPa]"""
+    return 101.3 * ((293.0 - 0.0065 * elevation) / 293.0) ** 5.26
+
+
+def constante_psicrometrica(P):
+    """Eq. 8 — γ [kPa/°C]"""
+    return 0.000665 * P
+
+
+def presion_vapor_saturacion(T):
+    """Eq. 11 — e°(T) [kPa]"""
+    return 0.6108 * np.exp((17.27 * T) / (T + 237.3))
+
+
+def pendiente_presion_vapor(T, e_sat=None):
+    """Eq. 13 — Δ [kPa/°C]. Acepta e°(T) precalculado para no repetir el exp."""
+    if e_sat is None:
+        e_sat = presion_vapor_saturacion(T)
+    return (4098.0 * e_sat) / ((T + 237.3) ** 2)
+
+
+def presion_vapor_real(e_tmax, e_tmin, es, humidity=None, rh_max=None, rh_min=None, temp_dew=None):
+    """
+    ea [kPa] con la jerarquía FAO-56 aplicada día a día:
+    Tdew (Eq. 14) > RHmax+RHmin (Eq. 17) > RHmax (Eq. 18) > RHmean (Eq. 19).
+    """
+    ea = es * (_arr(humidity) / 100.0)
+
+    if rh_max is not None:
+        rh_max = _arr(rh_max)
+        ea = np.where(~np.isnan(rh_max), e_tmin * (rh_max / 100.0), ea)
+        if rh_min is not None:
+            rh_min = _arr(rh_min)
+            eq17 = (e_tmin * (rh_max / 100.0) + e_tmax * (rh_min / 100.0)) / 2.0
+            ea = np.where(~np.isnan(rh_max) & ~np.isnan(rh_min), eq17, ea)
+
+    if temp_dew is not None:
+        temp_dew = _arr(temp_dew)
+        ea = np.where(~np.isnan(temp_dew), presion_vapor_saturacion(temp_dew), ea)
+
+    return ea
+
+
+# -----------------------------------------------------------------------------
+#  Kernels (sin redondeo, reciben intermediarios)
+# -----------------------------------------------------------------------------
+
+def _kernel_penman(temp_max, temp_min, temp_mean, delta, gamma, ea, es, Rs, Rso, u2, G=0.0):
+    """Eq. 38-40 y Eq. 6"""
+    Rns = (1.0 - 0.23) * Rs
+
+    sigma = 4.903e-9
+    tmax_k = temp_max + 273.16
+    tmin_k = temp_min + 273.16
+
+    rs_rso = np.divide(Rs, Rso, out=np.zeros(np.broadcast(Rs, Rso).shape), where=Rso > 0)
+    rs_rso = np.minimum(rs_rso, 1.0)  # FAO-56: Rs/Rso ≤ 1.0
+
+    Rnl = sigma * ((tmax_k ** 4 + tmin_k ** 4) / 2.0) * \
+          (0.34 - 0.14 * np.sqrt(ea)) * \
+          (1.35 * rs_rso - 0.35)
+    Rn = Rns - Rnl
+
+    term_rad = 0.408 * delta * (Rn - G)
+    term_aero = gamma * (900.0 / (temp_mean + 273.0)) * u2 * (es - ea)
+    denominator = delta + gamma * (1.0 + 0.34 * u2)
+
+    return (term_rad + term_aero) / denominator
+
+
+def _kernel_hargreaves(temp_max, temp_min, temp_avg, Ra):
+    return 0.0023 * (temp_avg + 17.8) * np.sqrt(temp_max - temp_min) * Ra * 0.408
+
+
+def _kernel_turc(temp_avg, humidity, radiation):
+    denom = temp_avg + 15
+    base = 0.013 * (temp_avg / np.where(denom == 0, np.nan, denom)) * (23.8856 * radiation + 50)
+    return np.where(humidity >= 50, base, base * (1 + (50 - humidity) / 70))
+
+
+def _kernel_makkink(delta, gamma, radiation):
+    return 0.61 * (delta / (delta + gamma)) * (radiation / 2.45) - 0.12
+
+
+def _kernel_makkink_abstew(delta, gamma, radiation):
+    return 0.65 * (delta / (delta + gamma)) * (radiation / 2.45) - 0.05
+
+
+def _kernel_simple_abstew(temp_max, temp_min, radiation):
+    temp_avg = (temp_max + temp_min) / 2
+    return 0.0031 * (temp_avg + 17.8) * np.sqrt(temp_max - temp_min) * radiation / 2.45
+
+
+def _kernel_priestley_taylor(delta, gamma, radiation):
+    Rn = radiation * 0.77
+    return 1.26 * (delta / (delta + gamma)) * (Rn / 2.45)
+
+
+def _kernel_ivanov(temp_avg, humidity):
+    eto = 0.0018 * (temp_avg + 25) ** 2 * ((100 - humidity) / 100)
+    return np.where(temp_avg <= 0, 0.0, eto)
+
+
+def _kernel_christiansen(delta, gamma, es_mean, humidity, wind_speed, radiation, temp_avg):
+    vpd = es_mean - es_mean * humidity / 100
+    radiation_factor = radiation / 15.39
+    wind_factor = 0.27 * (1 + wind_speed / 3.0)
+    temp_factor = (temp_avg + 17.8) / 21.1
+    return (0.37 * radiation_factor * temp_factor +
+            0.63 * wind_factor * vpd) * (delta / (delta + gamma))
+
+
+# -----------------------------------------------------------------------------
+#  API pública: ETOFormulas.batch
+# -----------------------------------------------------------------------------
+
+class ETOFormulasBatch:
+    """
+    Versión vectorial de ETOFormulas (accesible como ETOFormulas.batch).
+    Mismos nombres y parámetros que la versión escalar; todos aceptan arrays.
+    """
+
+    @staticmethod
+    @_vectorial
+    def penman_monteith(
+        temp_max,
+        temp_min,
+        humidity,
+        wind_speed,
+        latitude,
+        day_of_year,
+        elevation=0,
+        pressure=None,
+        sunshine_hours=None,
+        solar_radiation=None,
+        rh_max=None,
+        rh_min=None,
+        temp_dew=None,
+        g_monthly=None,
+        a_s=None,
+        b_s=None,
+        wind_z_height: float = 2.0) -> np.ndarray:
+        """
+        FAO Penman-Monteith (Eq. 6) sobre columnas completas.
+        Rs se toma de `solar_radiation` y, donde falte, de `sunshine_hours` (Eq. 35);
+        si faltan ambos el día queda en NaN.
+        """
+        temp_max = _arr(temp_max)
+        temp_min = _arr(temp_min)
+        temp_mean = (temp_max + temp_min) / 2.0
+        elevation = _arr(elevation)
+
+        # Eq. 7 / 8
+        P = presion_atmosferica(elevation)
+        if pressure is not None:
+            pressure = _arr(pressure)
+            P = np.where(pressure > 0, pressure, P)
+        gamma = constante_psicrometrica(P)
+
+        # Eq. 11-13
+        e_tmax = presion_vapor_saturacion(temp_max)
+        e_tmin = presion_vapor_saturacion(temp_min)
+        es = (e_tmax + e_tmin) / 2.0
+        delta = pendiente_presion_vapor(temp_mean)
+        ea = presion_vapor_real(e_tmax, e_tmin, es, humidity, rh_max, rh_min, temp_dew)
+
+        # Eq. 21-37
+        astro = astronomia(latitude, day_of_year)
+        Ra = astro['Ra']
+
+        Rs = _arr(solar_radiation)
+        if sunshine_hours is not None:
+            calc_as = a_s if a_s is not None else 0.25
+            calc_bs = b_s if b_s is not None else 0.50
+            rs_angstrom = (calc_as + calc_bs * (_arr(sunshine_hours) / astro['N'])) * Ra
+            Rs = np.where(np.isnan(Rs), rs_angstrom, Rs)
+
+        if a_s is not None and b_s is not None:
+            Rso = (a_s + b_s) * Ra
+        else:
+            Rso = (0.75 + 2e-5 * elevation) * Ra
+
+        # Eq. 42 / 43
+        G = _arr(g_monthly) if g_monthly is not None else 0.0
+
+        # Eq. 47
+        wind_speed = _arr(wind_speed)
+        if wind_z_height != 2.0:
+            u2 = wind_speed * (4.87 / np.log(67.8 * wind_z_height - 5.42))
+        else:
+            u2 = wind_speed
+
+        eto = _kernel_penman(temp_max, temp_min, temp_mean, delta, gamma, ea, es, Rs, Rso, u2, G)
+        return _finish(eto)
+
+    @staticmethod
+    @_vectorial
+    def hargreaves(temp_max, temp_min, temp_avg, latitude, day_of_year) -> np.ndarray:
+        """Hargreaves-Samani (1985) [mm/día]"""
+        Ra = astronomia(latitude, day_of_year)['Ra']
+        return _finish(_kernel_hargreaves(_arr(temp_max), _arr(temp_min), _arr(temp_avg), Ra))
+
+    @staticmethod
+    @_vectorial
+    def turc(temp_avg, humidity, radiation) -> np.ndarray:
+        """Fórmula de Turc"""
+        return _finish(_kernel_turc(_arr(temp_avg), _arr(humidity), _arr(radiation)))
+
+    @staticmethod
+    @_vectorial
+    def makkink(temp_avg, radiation, elevation=0) -> np.ndarray:
+        """Fórmula de Makkink (1957)"""
+        temp_avg = _arr(temp_avg)
+        gamma = constante_psicrometrica(presion_atmosferica(_arr(elevation)))
+        delta = pendiente_presion_vapor(temp_avg)
+        return _finish(_kernel_makkink(delta, gamma, _arr(radiation)))
+
+    @staticmethod
+    @_vectorial
+    def makkink_abstew(temp_avg, radiation, elevation=0) -> np.ndarray:
+        """Fórmula Makkink-Abstew"""
+        temp_avg = _arr(temp_avg)
+        gamma = constante_psicrometrica(presion_atmosferica(_arr(elevation)))
+        delta = pendiente_presion_vapor(temp_avg)
+        return _finish(_kernel_makkink_abstew(delta, gamma, _arr(radiation)))
+
+    @staticmethod
+    @_vectorial
+    def simple_abstew(temp_max, temp_min, radiation) -> np.ndarray:
+        """Simple Abstew (1996)"""
+        return _finish(_kernel_simple_abstew(_arr(temp_max), _arr(temp_min), _arr(radiation)))
+
+    @staticmethod
+    @_vectorial
+    def priestley_taylor(temp_avg, radiation, elevation=0) -> np.ndarray:
+        """Fórmula de Priestley-Taylor"""
+        temp_avg = _arr(temp_avg)
+        gamma = constante_psicrometrica(presion_atmosferica(_arr(elevation)))
+        delta = pendiente_presion_vapor(temp_avg)
+        return _finish(_kernel_priestley_taylor(delta, gamma, _arr(radiation)))
+
+    @staticmethod
+    @_vectorial
+    def ivanov(temp_avg, humidity) -> np.ndarray:
+        """Fórmula de Ivanov (1954)"""
+        return _finish(_kernel_ivanov(_arr(temp_avg), _arr(humidity)))
+
+    @staticmethod
+    @_vectorial
+    def christiansen(temp_max, temp_min, humidity, wind_speed, radiation,
+                     latitude, day_of_year, elevation=0) -> np.ndarray:
+        """Fórmula de Christiansen"""
+        temp_avg = (_arr(temp_max) + _arr(temp_min)) / 2
+        gamma = constante_psicrometrica(presion_atmosferica(_arr(elevation)))
+        es_mean = presion_vapor_saturacion(temp_avg)
+        delta = pendiente_presion_vapor(temp_avg, es_mean)
+        return _finish(_kernel_christiansen(
+            delta, gamma, es_mean, _arr(humidity), _arr(wind_speed), _arr(radiation), temp_avg
+        ))
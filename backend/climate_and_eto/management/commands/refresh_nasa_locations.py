@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from climate_and_eto.services import refresh_all_locations
+
+
+class Command(BaseCommand):
+    help = "Refresca la caché de NASA POWER para todas las ubicaciones con siembras activas (tarea nocturna)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Días hacia atrás a refrescar (default: 30)")
+        parser.add_argument('--workers', type=int, default=None, help="Descargas concurrentes (default: NASA_POWER_BULK_WORKERS)")
+
+    def handle(self, *args, **options):
+        summary = refresh_all_locations(days=options['days'], max_workers=options['workers'])
+        for soil_id, error in summary['errors'].items():
+            self.stderr.write(f"Suelo {soil_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['ok']}/{summary['cells']} celdas refrescadas."
+        ))
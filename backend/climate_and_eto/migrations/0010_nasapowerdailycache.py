@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_and_eto', '0009_remove_irrigationsettings_experience_criterion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NasaPowerDailyCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grid_lat', models.IntegerField()),
+                ('grid_lon', models.IntegerField()),
+                ('date', models.DateField()),
+                ('temp_max', models.FloatField(blank=True, null=True)),
+                ('temp_min', models.FloatField(blank=True, null=True)),
+                ('temp_avg', models.FloatField(blank=True, null=True)),
+                ('humidity', models.FloatField(blank=True, null=True)),
+                ('radiation', models.FloatField(blank=True, null=True)),
+                ('wind_speed', models.FloatField(blank=True, null=True)),
+                ('pressure', models.FloatField(blank=True, null=True)),
+                ('is_provisional', models.BooleanField(default=False)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Caché NASA POWER',
+                'ordering': ['grid_lat', 'grid_lon', 'date'],
+                'unique_together': {('grid_lat', 'grid_lon', 'date')},
+            },
+        ),
+    ]
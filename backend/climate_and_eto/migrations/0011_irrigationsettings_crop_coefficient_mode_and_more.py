@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_and_eto', '0010_nasapowerdailycache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='irrigationsettings',
+            name='crop_coefficient_mode',
+            field=models.CharField(choices=[('SINGLE', 'Kc Único (FAO-56 Cap. 6)'), ('DUAL', 'Kc Dual: Kcb + Evaporación (FAO-56 Cap. 7)')], default='SINGLE', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='irrigationsettings',
+            name='irrigation_type',
+            field=models.CharField(choices=[('DRIP', 'Goteo'), ('SPRINKLER', 'Aspersión'), ('FURROW', 'Surcos'), ('FURROW_ALTERNATE', 'Surcos Alternos'), ('BASIN', 'Inundación / Melgas')], default='DRIP', max_length=20),
+        ),
+    ]
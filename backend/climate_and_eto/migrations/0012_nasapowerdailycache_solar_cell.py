@@ -0,0 +1,52 @@
+import math
+
+from django.db import migrations, models
+
+
+def asignar_celda_solar(apps, schema_editor):
+    """
+    Las filas existentes se descargaron en el centro de su celda MERRA-2: su
+    radiación es la de la celda solar de 1° que contiene ese centro. Si el
+    centro cae justo en un borde de 1° la celda es ambigua y la fila se
+    borra (se vuelve a descargar en la próxima consulta).
+    """
+    NasaPowerDailyCache = apps.get_model("climate_and_eto", "NasaPowerDailyCache")
+    celdas = NasaPowerDailyCache.objects.values_list('grid_lat', 'grid_lon').distinct()
+    for grid_lat, grid_lon in list(celdas):
+        lat, lon = grid_lat * 0.5, grid_lon * 0.625
+        filas = NasaPowerDailyCache.objects.filter(grid_lat=grid_lat, grid_lon=grid_lon)
+        if lat == math.floor(lat) or lon == math.floor(lon):
+            filas.delete()
+        else:
+            filas.update(rad_lat=math.floor(lat), rad_lon=math.floor(lon))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_and_eto', '0011_irrigationsettings_crop_coefficient_mode_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nasapowerdailycache',
+            name='rad_lat',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='nasapowerdailycache',
+            name='rad_lon',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(asignar_celda_solar, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='nasapowerdailycache',
+            options={'ordering': ['grid_lat', 'grid_lon', 'rad_lat', 'rad_lon', 'date'], 'verbose_name': 'Caché NASA POWER'},
+        ),
+        migrations.AlterUniqueTogether(
+            name='nasapowerdailycache',
+            unique_together={('grid_lat', 'grid_lon', 'rad_lat', 'rad_lon', 'date')},
+        ),
+    ]
@@ -69,6 +69,20 @@ class IrrigationSettings(models.Model):
         ('DEPENDABLE', 'Lluvia Confiable (FAO)'),
     ]
 
+    KC_MODES = [
+        ('SINGLE', 'Kc Único (FAO-56 Cap. 6)'),
+        ('DUAL', 'Kc Dual: Kcb + Evaporación (FAO-56 Cap. 7)'),
+    ]
+
+    # Define la fracción de suelo que moja cada riego (fw) en el modo dual
+    IRRIGATION_TYPES = [
+        ('DRIP', 'Goteo'),
+        ('SPRINKLER', 'Aspersión'),
+        ('FURROW', 'Surcos'),
+        ('FURROW_ALTERNATE', 'Surcos Alternos'),
+        ('BASIN', 'Inundación / Melgas'),
+    ]
+
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='irrigation_settings')
     
     # Preferencias de Cálculo
@@ -86,6 +100,10 @@ class IrrigationSettings(models.Model):
         help_text="0.90 para Goteo, 0.75 para Aspersión, 0.60 Gravedad"
     )
 
+    # Balance hídrico: Kc único o dual (separa transpiración y evaporación)
+    crop_coefficient_mode = models.CharField(max_length=10, choices=KC_MODES, default='SINGLE')
+    irrigation_type = models.CharField(max_length=20, choices=IRRIGATION_TYPES, default='DRIP')
+
     def __str__(self):
         return f"Configuración de {self.user.username}"
     
@@ -115,4 +133,38 @@ class ClimateStudy(models.Model):
         verbose_name = "Estudio Climático"
 
     def __str__(self):
-        return f"{self.name} ({self.created_at.date()})"
\ No newline at end of file
+        return f"{self.name} ({self.created_at.date()})"
+
+class NasaPowerDailyCache(models.Model):
+    """
+    Caché persistente de NASA POWER: un registro por zona de la grilla y día.
+    Las variables son las mismas que devuelve NASAPowerAPI (sin ETo), así que
+    cualquier usuario cuyo punto caiga en la zona reutiliza la descarga.
+    """
+    # Índices de celda MERRA-2 (meteorología: 0.5° lat × 0.625° lon)
+    grid_lat = models.IntegerField()
+    grid_lon = models.IntegerField()
+    # Índices de celda de radiación solar (1° × 1°)
+    rad_lat = models.IntegerField()
+    rad_lon = models.IntegerField()
+    date = models.DateField()
+
+    temp_max = models.FloatField(null=True, blank=True)
+    temp_min = models.FloatField(null=True, blank=True)
+    temp_avg = models.FloatField(null=True, blank=True)
+    humidity = models.FloatField(null=True, blank=True)
+    radiation = models.FloatField(null=True, blank=True)
+    wind_speed = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+
+    # Días recientes: NASA aún puede corregirlos, se vuelven a descargar
+    is_provisional = models.BooleanField(default=False)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('grid_lat', 'grid_lon', 'rad_lat', 'rad_lon', 'date')
+        ordering = ['grid_lat', 'grid_lon', 'rad_lat', 'rad_lon', 'date']
+        verbose_name = "Caché NASA POWER"
+
+    def __str__(self):
+        return f"Celda ({self.grid_lat}, {self.grid_lon}) / Solar ({self.rad_lat}, {self.rad_lon}) - {self.date}"
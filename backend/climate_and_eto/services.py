@@ -4,10 +4,16 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
 from .eto_formules import ETOFormulas
 from .models import DailyWeather, IrrigationSettings
+from .signals import daily_weather_bulk_saved
 from django.core.exceptions import ObjectDoesNotExist
-from .bussiness_logic.nasa_power_api import NASAPowerAPI
+from .bussiness_logic.nasa_power_api import NASAPowerAPI, NASAPowerPartialError
+from .bussiness_logic.nasa_power_bulk import FetchJob, NASAPowerBulkFetcher
+from .bussiness_logic.nasa_power_cache import PowerGrid
+from .bussiness_logic.eto_engine import ETOColumnEngine
 
 logger = logging.getLogger(__name__)
 
@@ -37,115 +43,65 @@ def print_month_stats(df_grouped):
 #  1. MOTOR DE CÁLCULO VECTORIAL (PRIVADO Y REUTILIZABLE)
 # =============================================================================
 
-def _fetch_and_calculate_vectors(lat, lon, start_date, end_date, elevation=0):
+def _fetch_and_calculate_vectors(lat, lon, start_date, end_date, elevation=0, formulas=None):
     """
-    Función auxiliar: Baja datos de NASA y calcula TODAS las fórmulas vectorialmente.
-    Devuelve un DataFrame listo para ser analizado (Gráfica) o guardado (Sync).
+    Función auxiliar: Baja datos de NASA y calcula las fórmulas vectorialmente.
+    `formulas` limita el cálculo a esos métodos (None = TODAS).
+    Devuelve (DataFrame, rangos_faltantes): si fallaron algunos bloques
+    anuales se sigue con lo que sí llegó y `rangos_faltantes` lista los
+    (inicio, fin) que no se pudieron descargar ([] si llegó todo).
     """
+    # Validamos la selección antes de ir a la red
+    formulas = ETOColumnEngine.resolve_formulas(formulas)
+
     nasa_api = NASAPowerAPI()
+    faltantes = []
     try:
-        raw_data = nasa_api.get_daily_data(lat, lon, start_date, end_date)
+        # DataFrame columnar directo desde NASA/caché (sin pasar por dict por día)
+        df = nasa_api.get_daily_frame(lat, lon, start_date, end_date)
+    except NASAPowerPartialError as e:
+        # Bloques parciales: no se tira lo descargado (con caché, el reintento solo pide lo que falta)
+        df, faltantes = e.frame, e.failed_ranges
+        print(f"⚠️ NASA: faltan {len(faltantes)} bloques, se continúa con {len(df)} días")
     except Exception as e:
         raise ValueError(f"Error conectando a NASA: {str(e)}")
 
-    if not raw_data:
+    if df is None or df.empty:
         raise ValueError("No se encontraron datos climáticos para el rango seleccionado.")
 
-    # Convertir a DataFrame
-    df = pd.DataFrame.from_dict(raw_data, orient='index')
-    df.index = pd.to_datetime(df.index)
-    
-    # Limpieza de tipos
-    cols = ['temp_max', 'temp_min', 'temp_avg', 'humidity', 'wind_speed', 'radiation', 'pressure']
-    for col in cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
     df['day_of_year'] = df.index.dayofyear
     df['month'] = df.index.month
 
-    # Lógica de cálculo por fila (elevation capturada por closure)
-    elev = elevation  # Captura para uso en closure
-
-    def calculate_daily_row(row):
-        t_max = row.get('temp_max')
-        t_min = row.get('temp_min')
-        t_avg = row.get('temp_avg')
-        rh = row.get('humidity')
-        ws = row.get('wind_speed') 
-        rs = row.get('radiation') 
-        doy = row['day_of_year']
-        
-        # Validar mínimos vitales
-        if pd.isna(t_avg) or pd.isna(rs): 
-            return pd.Series({k: 0 for k in ['PENMAN', 'HARGREAVES', 'TURC']})
-
-        res = {}
-        
-        # --- BLOQUE DE FÓRMULAS (elevation inyectada) ---
-        try:
-            if pd.notna(ws) and pd.notna(rh):
-                res['PENMAN'] = ETOFormulas.penman_monteith(t_max, t_min, rh, ws, lat, doy, elev, solar_radiation=rs)
-            else: res['PENMAN'] = 0
-        except: res['PENMAN'] = 0
-
-        try: res['HARGREAVES'] = ETOFormulas.hargreaves(t_max, t_min, t_avg, lat, doy)
-        except: res['HARGREAVES'] = 0
-
-        try:
-            if pd.notna(rh): res['TURC'] = ETOFormulas.turc(t_avg, rh, rs)
-            else: res['TURC'] = 0
-        except: res['TURC'] = 0
-        
-        try: res['PRIESTLEY'] = ETOFormulas.priestley_taylor(t_avg, rs, elev)
-        except: res['PRIESTLEY'] = 0
-
-        try: res['MAKKINK'] = ETOFormulas.makkink(t_avg, rs, elev)
-        except: res['MAKKINK'] = 0
-        
-        try: res['MAKKINK_ABSTEW'] = ETOFormulas.makkink_abstew(t_avg, rs, elev)
-        except: res['MAKKINK_ABSTEW'] = 0
-
-        try:
-            if pd.notna(rh): res['IVANOV'] = ETOFormulas.ivanov(t_avg, rh)
-            else: res['IVANOV'] = 0
-        except: res['IVANOV'] = 0
-
-        try:
-            if pd.notna(ws) and pd.notna(rh): res['CHRISTIANSEN'] = ETOFormulas.christiansen(t_max, t_min, rh, ws, rs, lat, doy, elev)
-            else: res['CHRISTIANSEN'] = 0
-        except: res['CHRISTIANSEN'] = 0
-        
-        try:
-             if hasattr(ETOFormulas, 'simple_abstew'): res['SIMPLE_ABSTEW'] = ETOFormulas.simple_abstew(t_max, t_min, rs)
-             else: res['SIMPLE_ABSTEW'] = 0
-        except: res['SIMPLE_ABSTEW'] = 0
-
-        return pd.Series(res)
-
-    # Aplicar vectores
-    eto_columns = df.apply(calculate_daily_row, axis=1)
+    # Motor columnar: las fórmulas pedidas en una pasada sobre arrays (sin df.apply por fila)
+    eto_columns = ETOColumnEngine.calculate(df, lat, elevation=elevation, formulas=formulas)
     df = pd.concat([df, eto_columns], axis=1)
     
-    return df
+    return df, faltantes
+
+
+def rangos_a_texto(rangos):
+    """[(inicio, fin)] -> ['YYYY-MM-DD..YYYY-MM-DD'] (para respuestas JSON)."""
+    return [f"{inicio.isoformat()}..{fin.isoformat()}" for inicio, fin in rangos]
 
 # =============================================================================
 #  2. SERVICIOS DE ANÁLISIS Y SINCRONIZACIÓN
 # =============================================================================
 
-def get_historical_climatology(user, lat, lon, start_date, end_date, elevation=0):
+def get_historical_climatology(user, lat, lon, start_date, end_date, elevation=0, formulas=None):
     """
     MODO LECTURA: Genera datos para la gráfica.
     NO guarda en base de datos (evita ensuciar la operación diaria).
+    `formulas`: lista de métodos a calcular (None = las nueve fórmulas).
+    Retorna (meses, rangos_faltantes): si fallaron algunos años los promedios
+    se calculan con los que sí llegaron.
     """
     print_debug_header(f"Generando Gráfica Histórica ({start_date} a {end_date}) [Elev={elevation}m]")
     
     # 1. Calcular en memoria
-    df = _fetch_and_calculate_vectors(lat, lon, start_date, end_date, elevation=elevation)
+    formula_cols = ETOColumnEngine.resolve_formulas(formulas)
+    df, faltantes = _fetch_and_calculate_vectors(lat, lon, start_date, end_date, elevation=elevation, formulas=formula_cols)
 
     # 2. Agregación Mensual
-    formula_cols = ['PENMAN', 'HARGREAVES', 'TURC', 'PRIESTLEY', 'MAKKINK', 
-                    'MAKKINK_ABSTEW', 'IVANOV', 'CHRISTIANSEN', 'SIMPLE_ABSTEW']
     valid_cols = [c for c in formula_cols if c in df.columns]
     
     monthly_stats = df.groupby('month')[valid_cols].mean().reset_index()
@@ -166,86 +122,140 @@ def get_historical_climatology(user, lat, lon, start_date, end_date, elevation=0
             "eto_results": eto_results
         })
 
-    return results
+    return results, faltantes
+
 
+# Columnas que escribe la sincronización (y que se comparan para saber si cambió algo)
+DAILY_SYNC_FIELDS = [
+    'latitude', 'longitude', 'temp_max', 'temp_min', 'solar_rad',
+    'humidity_mean', 'wind_speed', 'eto_mm', 'method', 'source',
+]
 
-def sync_historical_to_daily(user, lat, lon):
+def ultimo_dia_guardado(user, lat, lon, desde):
+    """
+    Último día (>= `desde`) con dato NASA guardado del usuario en la misma
+    zona POWER que (lat, lon). Se lee de DailyWeather, no de la caché: las
+    pocas ubicaciones distintas se comparan por zona y el máximo lo calcula
+    la base. None si no hay ninguno.
+    """
+    cell = PowerGrid.cell(lat, lon)
+    filas = DailyWeather.objects.filter(
+        user=user, source__in=['NASA', 'NASA_HISTORIC'], date__gte=desde,
+        latitude__isnull=False, longitude__isnull=False,
+    )
+    misma_zona = Q(pk__in=[])
+    for f_lat, f_lon in filas.order_by().values_list('latitude', 'longitude').distinct():
+        if PowerGrid.cell(f_lat, f_lon) == cell:
+            misma_zona |= Q(latitude=f_lat, longitude=f_lon)
+    return filas.filter(misma_zona).aggregate(ultimo=Max('date'))['ultimo']
+
+
+def sync_historical_to_daily(user, lat, lon, incremental=False):
     """
     MODO ESCRITURA: Toma el último año de datos y lo inyecta en la tabla operativa.
     Usa la fórmula preferida del usuario para definir el valor de 'eto_mm'.
+    Con `incremental` solo se piden los días desde el último dato NASA guardado
+    del usuario en esta zona (ver ultimo_dia_guardado), repitiendo los últimos
+    NASA_SYNC_RECHECK_DAYS por si NASA corrigió los provisionales.
     """
     print_debug_header(f"💾 SINCRONIZANDO DATOS A OPERACIÓN DIARIA ({user.username})")
     
     # 1. Definir rango: Último año hasta HOY
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=365)
+
+    if incremental:
+        last_saved = ultimo_dia_guardado(user, lat, lon, start_date)
+        if last_saved:
+            recheck = getattr(settings, 'NASA_SYNC_RECHECK_DAYS', 7)
+            start_date = min(max(start_date, last_saved + timedelta(days=1 - recheck)), end_date)
     
-    # 2. Calcular datos (Reutilizamos la lógica vectorial)
-    df = _fetch_and_calculate_vectors(lat, lon, start_date, end_date)
-    
-    # 3. Obtener preferencia del usuario
+    # 2. Obtener preferencia del usuario
     user_settings, _ = IrrigationSettings.objects.get_or_create(user=user)
     pref_method = user_settings.preferred_eto_method # Ej: 'PENMAN'
+
+    # 3. Calcular datos (Reutilizamos la lógica vectorial)
+    # Solo hacen falta la fórmula preferida y Penman (fallback)
+    needed = [m for m in (pref_method, 'PENMAN') if m in ETOColumnEngine.FORMULAS]
+    df, faltantes = _fetch_and_calculate_vectors(lat, lon, start_date, end_date, formulas=needed)
     
-    count_synced = 0
-    count_skipped = 0
+    # 4. ETo final por día (vectorial): preferida, o Penman si la preferida dio 0/Error
+    df = df[df['temp_max'].notna() & df['radiation'].notna()]
+    preferred = df[pref_method] if pref_method in df.columns else pd.Series(np.nan, index=df.index)
+    penman = df['PENMAN'] if 'PENMAN' in df.columns else pd.Series(0.0, index=df.index)
+    use_penman = (preferred.isna() | (preferred == 0)) & (penman > 0)
+    final_eto = preferred.where(~use_penman, penman).fillna(0.0).round(2)
+
+    # 5. Filas existentes del rango en UNA consulta
+    existing = {
+        row[0]: row[1:]
+        for row in DailyWeather.objects.filter(user=user, date__range=[start_date, end_date])
+        .values_list('date', 'source', 'is_manual_override', *DAILY_SYNC_FIELDS)
+    }
 
-    # 4. Guardado Eficiente
-    for date_idx, row in df.iterrows():
-        if pd.isna(row['temp_max']) or pd.isna(row['radiation']):
-            continue
+    def clean(value):
+        return None if pd.isna(value) else float(value)
 
-        date_obj = date_idx.date()
-        
-        # A. Respetar datos MANUALES (Regla de Oro)
-        existing = DailyWeather.objects.filter(user=user, date=date_obj).first()
-        if existing and existing.source == 'MANUAL':
-            count_skipped += 1
-            continue
+    count_skipped = 0
+    count_unchanged = 0
+    to_write = []
 
-        # B. Extraer valor calculado según preferencia
-        try:
-            val = row.get(pref_method)
-            
-            # Fallback inteligente: Si la fórmula preferida dio 0/Error, intentamos Penman
-            if (pd.isna(val) or val == 0) and row.get('PENMAN', 0) > 0:
-                val = row.get('PENMAN')
-                method_to_save = 'PENMAN' # Avisamos que usamos fallback
-            else:
-                method_to_save = pref_method
-            
-            final_eto = round(float(val), 2) if val else 0.0
-        except:
-            final_eto = 0.0
-            method_to_save = pref_method
-
-        # C. Upsert en BD
-        try:
-            DailyWeather.objects.update_or_create(
-                user=user,
-                date=date_obj,
-                defaults={
-                    'latitude': lat,
-                    'longitude': lon,
-                    'temp_max': row.get('temp_max'),
-                    'temp_min': row.get('temp_min'),
-                    'solar_rad': row.get('radiation'),
-                    'humidity_mean': row.get('humidity'),
-                    'wind_speed': row.get('wind_speed'),
-                    # Aquí guardamos el valor real calculado y el método usado
-                    'eto_mm': final_eto,
-                    'method': method_to_save, 
-                    'source': 'NASA_HISTORIC'
-                }
-            )
-            count_synced += 1
-        except Exception as e:
-            print(f"❌ Error guardando {date_obj}: {e}")
+    for date_idx, temp_max, temp_min, radiation, humidity, wind_speed, eto, penman_used in zip(
+        df.index, df['temp_max'], df['temp_min'], df['radiation'], df['humidity'], df['wind_speed'],
+        final_eto, use_penman
+    ):
+        date_obj = date_idx.date()
+        values = {
+            'latitude': lat,
+            'longitude': lon,
+            'temp_max': clean(temp_max),
+            'temp_min': clean(temp_min),
+            'solar_rad': clean(radiation),
+            'humidity_mean': clean(humidity),
+            'wind_speed': clean(wind_speed),
+            # Aquí guardamos el valor real calculado y el método usado
+            'eto_mm': float(eto),
+            'method': 'PENMAN' if penman_used else pref_method,  # Avisamos si usamos fallback
+            'source': 'NASA_HISTORIC',
+        }
+
+        current = existing.get(date_obj)
+        if current:
+            source, is_manual_override, *current_values = current
+            # A. Respetar datos MANUALES (Regla de Oro)
+            if source == 'MANUAL' or is_manual_override:
+                count_skipped += 1
+                continue
+            # B. Solo escribimos lo que cambió
+            if tuple(current_values) == tuple(values[f] for f in DAILY_SYNC_FIELDS):
+                count_unchanged += 1
+                continue
+
+        to_write.append(DailyWeather(user=user, date=date_obj, **values))
+
+    # 6. Upsert por lotes en una sola transacción
+    with transaction.atomic():
+        DailyWeather.objects.bulk_create(
+            to_write,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=DAILY_SYNC_FIELDS + ['updated_at'],
+        )
+    # bulk_create no dispara post_save: avisamos a quien dependa del clima diario
+    if to_write:
+        daily_weather_bulk_saved.send(
+            sender=DailyWeather, user=user, start_date=min(obj.date for obj in to_write)
+        )
 
     result_summary = {
-        "synced": count_synced,
+        "synced": len(to_write),
+        "unchanged": count_unchanged,
         "skipped": count_skipped,
-        "method_used": pref_method
+        "method_used": pref_method,
+        "start_date": start_date.isoformat(),
+        # Años que NASA no entregó en esta corrida (se vuelven a pedir en la próxima)
+        "missing_ranges": rangos_a_texto(faltantes),
     }
     
     print(f"✅ Sincronización completada: {result_summary}")
@@ -344,7 +354,47 @@ def get_hybrid_weather(user, target_date, lat, lon, force_method=None):
         raise Exception(f"No se pudieron obtener datos satelitales: {str(e)}")
 
 # =============================================================================
-#  4. UTILS
+#  4. REFRESCO MASIVO (Todas las ubicaciones de la finca)
+# =============================================================================
+
+def refresh_all_locations(days=30, max_workers=None):
+    """
+    Refresca en la caché de NASA los últimos `days` días de todas las
+    ubicaciones con siembras activas. Las ubicaciones se agrupan por celda de
+    la grilla POWER (una descarga por celda) y las celdas se piden en
+    paralelo, así que el tiempo total lo marca la celda más lenta.
+    """
+    from suelo.models import Soil
+
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+
+    soils = Soil.objects.filter(
+        plantings__activo=True, latitude__isnull=False, longitude__isnull=False
+    ).values_list('id', 'latitude', 'longitude').distinct()
+
+    # Una tarea por celda; guardamos qué suelos dependen de cada una
+    cells = {}
+    for soil_id, lat, lon in soils:
+        cells.setdefault(PowerGrid.cell(lat, lon), {'lat': lat, 'lon': lon, 'soils': set()})['soils'].add(soil_id)
+
+    jobs = [FetchJob(cell, info['lat'], info['lon'], start_date, end_date) for cell, info in cells.items()]
+    print(f"📡 NASA: Refrescando {len(jobs)} celdas ({sum(len(i['soils']) for i in cells.values())} suelos)...")
+
+    summary = {'cells': len(jobs), 'ok': 0, 'failed': 0, 'errors': {}}
+    for result in NASAPowerBulkFetcher(max_workers=max_workers).iter_fetch(jobs):
+        if result.ok:
+            summary['ok'] += 1
+        else:
+            summary['failed'] += 1
+            for soil_id in cells[result.job.key]['soils']:
+                summary['errors'][soil_id] = str(result.error)
+
+    print(f"✅ Refresco completado: {summary['ok']} celdas OK, {summary['failed']} con error")
+    return summary
+
+# =============================================================================
+#  5. UTILS
 # =============================================================================
 
 def get_weather_strictly_local(user, target_date):
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Upsert masivo de DailyWeather (bulk_create no dispara post_save).
+# kwargs: user, start_date (primer día escrito).
+daily_weather_bulk_saved = Signal()
@@ -1,3 +1,252 @@
-from django.test import TestCase
+import threading
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from .bussiness_logic.eto_engine import ETOColumnEngine
+from .bussiness_logic.nasa_power_api import NASAPowerAPI, NASAPowerPartialError
+from .bussiness_logic.nasa_power_cache import NASAPowerCache, PowerGrid
+from .models import DailyWeather
+from .services import _fetch_and_calculate_vectors, ultimo_dia_guardado
+
+
+def _cache_frame(dias, stale=()):
+    """Frame como el de NASAPowerCache.load: índice de fechas y columna `_stale`."""
+    index = pd.DatetimeIndex(pd.to_datetime(list(dias)))
+    frame = pd.DataFrame({campo: 1.0 for campo in NASAPowerCache.FIELDS}, index=index)
+    frame['_stale'] = index.isin(pd.to_datetime(list(stale)))
+    return frame
+
+
+class ETOColumnEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        index = pd.date_range('2024-01-01', periods=3)
+        self.df = pd.DataFrame({
+            'temp_max': [30.0, 30.0, 30.0],
+            'temp_min': [20.0, 20.0, 20.0],
+            'temp_avg': [25.0, np.nan, 25.0],
+            'humidity': [70.0, 70.0, np.nan],
+            'wind_speed': [2.0, 2.0, 2.0],
+            'radiation': [20.0, 20.0, 20.0],
+        }, index=index)
+        self.eto = ETOColumnEngine.calculate(self.df, 2.9, elevation=500)
+
+    def test_dia_completo_da_todas_las_formulas(self):
+        fila = self.eto.iloc[0]
+        self.assertEqual(list(self.eto.columns), ETOColumnEngine.FORMULAS)
+        self.assertTrue((fila > 0).all())
+
+    def test_dia_sin_minimos_vitales(self):
+        # Contrato del antiguo cálculo por fila: tres columnas en 0, el resto NaN
+        fila = self.eto.iloc[1]
+        for formula in ETOColumnEngine.FORMULAS:
+            if formula in ETOColumnEngine.ZERO_WHEN_INVALID:
+                self.assertEqual(fila[formula], 0.0)
+            else:
+                self.assertTrue(np.isnan(fila[formula]), formula)
+
+    def test_formula_sin_sus_entradas_vale_cero(self):
+        fila = self.eto.iloc[2]
+        for formula in ('PENMAN', 'TURC', 'IVANOV', 'CHRISTIANSEN'):
+            self.assertEqual(fila[formula], 0.0)
+        self.assertGreater(fila['HARGREAVES'], 0)
+
+
+class FormulaSelectionTests(SimpleTestCase):
+
+    def setUp(self):
+        index = pd.date_range('2024-01-01', periods=2)
+        self.df = pd.DataFrame({
+            'temp_max': [30.0, 31.0], 'temp_min': [20.0, 19.0], 'temp_avg': [25.0, 25.0],
+            'humidity': [70.0, 65.0], 'wind_speed': [2.0, 1.5], 'radiation': [20.0, 22.0],
+        }, index=index)
+
+    def test_solo_las_formulas_pedidas_en_orden_canonico(self):
+        eto = ETOColumnEngine.calculate(self.df, 2.9, formulas='turc, penman,TURC')
+        self.assertEqual(list(eto.columns), ['PENMAN', 'TURC'])
+        completo = ETOColumnEngine.calculate(self.df, 2.9)
+        pd.testing.assert_frame_equal(eto, completo[['PENMAN', 'TURC']])
+
+    def test_sin_seleccion_son_todas(self):
+        self.assertEqual(ETOColumnEngine.resolve_formulas(None), ETOColumnEngine.FORMULAS)
+        self.assertEqual(ETOColumnEngine.resolve_formulas(''), ETOColumnEngine.FORMULAS)
+
+    def test_formula_desconocida(self):
+        with self.assertRaises(ValueError):
+            ETOColumnEngine.resolve_formulas(['PENMAN', 'NO_EXISTE'])
+
+
+class PowerGridTests(SimpleTestCase):
+
+    def test_el_centro_de_la_zona_cae_en_la_misma_zona(self):
+        for lat, lon in [(2.92, -75.28), (4.6, -74.08), (-0.3, 0.2), (10.74, -63.1)]:
+            cell = PowerGrid.cell(lat, lon)
+            self.assertEqual(PowerGrid.cell(cell.latitude, cell.longitude), cell)
+
+    def test_la_radiacion_parte_una_celda_merra2(self):
+        # Celda MERRA-2 de 2.75..3.25 de latitud: el borde solar de 3° la parte en dos zonas
+        sur, norte = PowerGrid.cell(2.9, -75.3), PowerGrid.cell(3.1, -75.3)
+        self.assertEqual(sur.grid_lat, norte.grid_lat)
+        self.assertNotEqual(sur, norte)
+        self.assertLess(sur.latitude, 3.0)
+        self.assertGreaterEqual(norte.latitude, 3.0)
+
+    def test_puntos_de_la_misma_zona_comparten_celda(self):
+        self.assertEqual(PowerGrid.cell(2.81, -75.2), PowerGrid.cell(2.99, -75.05))
+
+    def test_una_descarga_a_la_vez_por_zona(self):
+        zona, otra = PowerGrid.cell(2.9, -75.3), PowerGrid.cell(4.6, -74.08)
+        dentro, soltar = threading.Event(), threading.Event()
+        orden = []
+
+        def primero():
+            with PowerGrid.single_flight(zona):
+                dentro.set()
+                soltar.wait(5)
+                orden.append('primero')
+
+        def misma_zona():
+            with PowerGrid.single_flight(zona):
+                orden.append('misma_zona')
+
+        hilo = threading.Thread(target=primero)
+        hilo.start()
+        dentro.wait(5)
+        espera = threading.Thread(target=misma_zona)
+        espera.start()
+
+        # Otra zona no espera a la descarga en curso
+        with PowerGrid.single_flight(otra):
+            orden.append('otra_zona')
+        espera.join(0.1)
+        self.assertTrue(espera.is_alive())
+
+        soltar.set()
+        hilo.join(5)
+        espera.join(5)
+        self.assertEqual(orden, ['otra_zona', 'primero', 'misma_zona'])
+        self.assertEqual(PowerGrid._in_flight, {})
+
+
+class NASAPowerCacheMissingRangesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = NASAPowerCache(provisional_days=90, refresh_hours=24)
+
+    def test_sin_faltantes(self):
+        cached = _cache_frame(pd.date_range('2024-01-01', '2024-01-31'))
+        self.assertEqual(self.cache.missing_ranges(cached, date(2024, 1, 1), date(2024, 1, 31)), [])
+
+    def test_cache_vacia_pide_todo(self):
+        cached = _cache_frame([])
+        self.assertEqual(
+            self.cache.missing_ranges(cached, date(2024, 1, 1), date(2024, 3, 1)),
+            [(date(2024, 1, 1), date(2024, 3, 1))],
+        )
+
+    def test_huecos_cortos_se_unen(self):
+        dias = pd.date_range('2024-01-01', '2024-03-31')
+        faltan = set(pd.date_range('2024-01-05', '2024-01-06')) | set(pd.date_range('2024-01-20', '2024-01-21'))
+        cached = _cache_frame([d for d in dias if d not in faltan])
+        self.assertEqual(
+            self.cache.missing_ranges(cached, date(2024, 1, 1), date(2024, 3, 31)),
+            [(date(2024, 1, 5), date(2024, 1, 21))],
+        )
+
+    def test_huecos_largos_se_piden_aparte(self):
+        dias = pd.date_range('2024-01-01', '2024-06-30')
+        faltan = {pd.Timestamp('2024-01-10'), pd.Timestamp('2024-05-10')}
+        cached = _cache_frame([d for d in dias if d not in faltan])
+        self.assertEqual(
+            self.cache.missing_ranges(cached, date(2024, 1, 1), date(2024, 6, 30)),
+            [(date(2024, 1, 10), date(2024, 1, 10)), (date(2024, 5, 10), date(2024, 5, 10))],
+        )
+
+    def test_provisionales_vencidos_cuentan_como_faltantes(self):
+        dias = pd.date_range('2024-01-01', '2024-01-31')
+        cached = _cache_frame(dias, stale=pd.date_range('2024-01-29', '2024-01-31'))
+        self.assertEqual(
+            self.cache.missing_ranges(cached, date(2024, 1, 1), date(2024, 1, 31)),
+            [(date(2024, 1, 29), date(2024, 1, 31))],
+        )
+
+
+class NASAPowerPartialDownloadTests(SimpleTestCase):
+
+    @staticmethod
+    def _bloque(latitude, longitude, start_date, end_date):
+        if start_date.year == 2021:
+            raise ConnectionError('sin respuesta')
+        index = pd.date_range(start_date, end_date)
+        return pd.DataFrame({campo: 1.0 for campo in NASAPowerCache.FIELDS}, index=index)
+
+    def test_rango_largo_en_bloques_anuales(self):
+        api = NASAPowerAPI(use_cache=False)
+        self.assertEqual(api._split_range(date(2024, 1, 1), date(2024, 3, 1)), [(date(2024, 1, 1), date(2024, 3, 1))])
+        self.assertEqual(
+            api._split_range(date(2020, 6, 1), date(2022, 3, 1)),
+            [(date(2020, 6, 1), date(2020, 12, 31)), (date(2021, 1, 1), date(2021, 12, 31)),
+             (date(2022, 1, 1), date(2022, 3, 1))],
+        )
+
+    def test_bloques_fallidos_no_pierden_lo_descargado(self):
+        api = NASAPowerAPI(use_cache=False, chunk_workers=2)
+        with mock.patch.object(api, '_fetch_chunk', side_effect=self._bloque):
+            with self.assertRaises(NASAPowerPartialError) as ctx, \
+                    self.assertLogs('climate_and_eto.bussiness_logic.nasa_power_api', 'ERROR'):
+                api.get_daily_frame(2.9, -75.3, date(2020, 6, 1), date(2022, 3, 1))
+
+        error = ctx.exception
+        self.assertEqual(error.failed_ranges, [(date(2021, 1, 1), date(2021, 12, 31))])
+        self.assertIsInstance(error.__cause__, ConnectionError)
+        recibidos = error.frame.dropna(subset=['temp_max']).index
+        self.assertEqual(len(recibidos), 214 + 60)
+        self.assertFalse(recibidos.year.isin([2021]).any())
+
+    def test_el_servicio_sigue_con_los_anos_descargados(self):
+        index = pd.date_range('2020-01-01', '2020-12-31')
+        frame = pd.DataFrame({campo: 20.0 for campo in NASAPowerCache.FIELDS}, index=index)
+        parcial = NASAPowerPartialError([(date(2021, 1, 1), date(2021, 12, 31))], [frame])
+        parcial.frame = frame
+        with mock.patch.object(NASAPowerAPI, 'get_daily_frame', side_effect=parcial):
+            df, faltantes = _fetch_and_calculate_vectors(2.9, -75.3, date(2020, 1, 1), date(2021, 12, 31), formulas=['PENMAN'])
+
+        self.assertEqual(faltantes, [(date(2021, 1, 1), date(2021, 12, 31))])
+        self.assertEqual(len(df), 366)
+        self.assertIn('PENMAN', df.columns)
+
+    def test_sin_ningun_ano_descargado_es_error(self):
+        vacio = pd.DataFrame(columns=NASAPowerCache.FIELDS, index=pd.DatetimeIndex([]), dtype=float)
+        parcial = NASAPowerPartialError([(date(2021, 1, 1), date(2021, 12, 31))], [])
+        parcial.frame = vacio
+        with mock.patch.object(NASAPowerAPI, 'get_daily_frame', side_effect=parcial):
+            with self.assertRaises(ValueError):
+                _fetch_and_calculate_vectors(2.9, -75.3, date(2021, 1, 1), date(2021, 12, 31))
+
+
+class IncrementalSyncStartTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='clima@example.com', username='clima', password='x')
+
+    def _guardar(self, desde, dias, lat, lon, source='NASA_HISTORIC'):
+        DailyWeather.objects.bulk_create([
+            DailyWeather(user=self.user, date=desde + timedelta(days=d), latitude=lat, longitude=lon, eto_mm=4.0, source=source)
+            for d in range(dias)
+        ])
+
+    def test_ultimo_dia_de_la_misma_zona(self):
+        self._guardar(date(2024, 1, 1), 20, 2.92, -75.28)
+        self._guardar(date(2024, 1, 21), 10, 4.6, -74.08)
+        self._guardar(date(2024, 1, 31), 1, 2.92, -75.28, source='MANUAL')
+
+        # Otro punto de la misma zona POWER comparte los días guardados
+        self.assertEqual(ultimo_dia_guardado(self.user, 2.95, -75.2, date(2023, 1, 1)), date(2024, 1, 20))
+        self.assertEqual(ultimo_dia_guardado(self.user, 4.6, -74.08, date(2023, 1, 1)), date(2024, 1, 30))
+        self.assertIsNone(ultimo_dia_guardado(self.user, 2.92, -75.28, date(2024, 2, 1)))
+        self.assertIsNone(ultimo_dia_guardado(self.user, 10.0, -70.0, date(2023, 1, 1)))
@@ -0,0 +1,75 @@
+from functools import lru_cache
+from typing import NamedTuple
+import numpy as np
+
+# =============================================================================
+#  TABLA ASTRONÓMICA PRECALCULADA (FAO-56 Eq. 21-25 y 34)
+# =============================================================================
+# δ, ωs, dr, Ra y N dependen solo de (latitud, día juliano). Nuestros lotes
+# están en pocas latitudes, así que construimos la tabla de 366 días una vez
+# por latitud y la guardamos en un LRU: las fórmulas solo indexan.
+
+DIAS_TABLA = 366
+Gsc = 0.0820  # Constante solar [MJ m⁻² min⁻¹]
+
+
+class TablaAstronomica(NamedTuple):
+    """Arrays de solo lectura indexados directamente por día juliano (0..366)."""
+    sol_dec: np.ndarray
+    ws: np.ndarray
+    dr: np.ndarray
+    Ra: np.ndarray
+    N: np.ndarray
+
+
+def calcular_astronomia(latitude, day_of_year) -> dict:
+    """Cálculo directo (sin tabla) de la geometría solar; acepta arrays."""
+    lat_rad = np.radians(np.asarray(latitude, dtype=float))
+    doy = np.asarray(day_of_year, dtype=float)
+
+    # ▸ Eq. 24 — Declinación solar [rad]
+    sol_dec = 0.409 * np.sin((2.0 * np.pi / 365.0) * doy - 1.39)
+    # ▸ Eq. 25 — Ángulo horario de puesta del sol [rad] (con protección polar)
+    ws = np.arccos(np.clip(-np.tan(lat_rad) * np.tan(sol_dec), -1.0, 1.0))
+    # ▸ Eq. 23 — Distancia relativa inversa Tierra-Sol
+    dr = 1.0 + 0.033 * np.cos((2.0 * np.pi / 365.0) * doy)
+    # ▸ Eq. 21 — Radiación extraterrestre [MJ m⁻² día⁻¹]
+    Ra = (24.0 * 60.0 / np.pi) * Gsc * dr * (
+        ws * np.sin(lat_rad) * np.sin(sol_dec) +
+        np.cos(lat_rad) * np.cos(sol_dec) * np.sin(ws)
+    )
+    # ▸ Eq. 34 — Duración máxima del día [h]
+    N = (24.0 / np.pi) * ws
+
+    return {'sol_dec': sol_dec, 'ws': ws, 'dr': dr, 'Ra': Ra, 'N': N}
+
+
+@lru_cache(maxsize=128)
+def tabla_astronomica(latitude: float) -> TablaAstronomica:
+    """Tabla de 366 días para una latitud. Se construye una sola vez por proceso."""
+    valores = calcular_astronomia(float(latitude), np.arange(DIAS_TABLA + 1))
+    for arr in valores.values():
+        arr.setflags(write=False)  # Compartida entre llamadas: nadie debe mutarla
+    return TablaAstronomica(**valores)
+
+
+def astronomia(latitude, day_of_year) -> dict:
+    """
+    Geometría solar vectorial. Usa la tabla cacheada si la latitud es escalar
+    y los días son enteros en 0..366; en otro caso calcula directamente.
+    """
+    doy = np.asarray(day_of_year)
+    if np.ndim(latitude) == 0 and doy.size > 0:
+        idx = doy.astype(int, copy=False) if doy.dtype.kind in 'iu' else doy.astype(int)
+        if np.array_equal(idx, doy) and idx.min() >= 0 and idx.max() <= DIAS_TABLA:
+            tabla = tabla_astronomica(float(latitude))
+            return {campo: getattr(tabla, campo)[idx] for campo in TablaAstronomica._fields}
+    return calcular_astronomia(latitude, day_of_year)
+
+
+def astronomia_diaria(latitude: float, day_of_year: int) -> dict:
+    """Versión escalar (floats de Python) para las fórmulas día a día."""
+    if isinstance(day_of_year, (int, np.integer)) and 0 <= day_of_year <= DIAS_TABLA:
+        tabla = tabla_astronomica(float(latitude))
+        return {campo: getattr(tabla, campo).item(day_of_year) for campo in TablaAstronomica._fields}
+    return {campo: float(valor) for campo, valor in astronomia(latitude, day_of_year).items()}
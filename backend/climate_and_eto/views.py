@@ -5,7 +5,7 @@ from datetime import datetime
 from .eto_formules import ETOFormulas
 from .models import DailyWeather, IrrigationSettings, ClimateStudy
 from .serializers import DailyWeatherSerializer, IrrigationSettingsSerializer, ClimateStudySerializer
-from .services import get_hybrid_weather, preview_eto_manual, get_historical_climatology
+from .services import get_hybrid_weather, preview_eto_manual, get_historical_climatology, rangos_a_texto
 
 class DailyWeatherViewSet(viewsets.ModelViewSet):
     serializer_class = DailyWeatherSerializer
@@ -122,6 +122,7 @@ class DailyWeatherViewSet(viewsets.ModelViewSet):
         """
         Endpoint para análisis de datos históricos y comparativa de fórmulas.
         Params: lat, lon, start_date, end_date
+        Opcional: formulas=PENMAN,HARGREAVES (por defecto se calculan todas)
         """
         # 1. Primero obtenemos los parámetros (Corrigiendo el error de tu snippet anterior)
         lat = request.query_params.get('lat')
@@ -129,6 +130,7 @@ class DailyWeatherViewSet(viewsets.ModelViewSet):
         start_str = request.query_params.get('start_date')
         end_str = request.query_params.get('end_date')
         elevation = request.query_params.get('elevation', '0')
+        formulas = request.query_params.get('formulas')
 
         if not all([lat, lon, start_str, end_str]):
             return Response({"error": "Faltan parámetros (lat, lon, start_date, end_date)"}, status=400)
@@ -142,9 +144,15 @@ class DailyWeatherViewSet(viewsets.ModelViewSet):
                 return Response({"error": "La fecha de inicio debe ser anterior a la final"}, status=400)
 
             # 3. Llamada al servicio con ELEVACIÓN
-            data = get_historical_climatology(request.user, float(lat), float(lon), s_date, e_date, elevation=float(elevation))
-            
-            return Response(data)
+            data, faltantes = get_historical_climatology(
+                request.user, float(lat), float(lon), s_date, e_date,
+                elevation=float(elevation), formulas=formulas
+            )
+
+            # Resultado parcial: el cuerpo sigue siendo la lista de meses y los
+            # años que NASA no entregó van en un encabezado
+            headers = {'X-Missing-Ranges': ','.join(rangos_a_texto(faltantes))} if faltantes else None
+            return Response(data, headers=headers)
 
         except ValueError as ve:
             return Response({"error": str(ve)}, status=400)
@@ -166,7 +174,8 @@ class DailyWeatherViewSet(viewsets.ModelViewSet):
         try:
             # Llamamos al nuevo servicio de guardado
             from .services import sync_historical_to_daily
-            result = sync_historical_to_daily(request.user, float(lat), float(lon))
+            incremental = str(request.data.get('incremental', '')).lower() in ('1', 'true', 'yes')
+            result = sync_historical_to_daily(request.user, float(lat), float(lon), incremental=incremental)
             
             return Response({
                 "message": "Sincronización exitosa",
@@ -202,9 +211,21 @@ class IrrigationSettingsViewSet(viewsets.ModelViewSet):
             for k, v in IrrigationSettings.RAIN_METHODS
         ]
 
+        kc_mode_options = [
+            {"value": k, "label": v} 
+            for k, v in IrrigationSettings.KC_MODES
+        ]
+
+        irrigation_type_options = [
+            {"value": k, "label": v} 
+            for k, v in IrrigationSettings.IRRIGATION_TYPES
+        ]
+
         return Response({
             "eto_methods": eto_options,
-            "rain_methods": rain_options
+            "rain_methods": rain_options,
+            "kc_modes": kc_mode_options,
+            "irrigation_types": irrigation_type_options
         })
 
 class ClimateStudyViewSet(viewsets.ModelViewSet):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CultivoConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cultivo"
+
+    def ready(self):
+        # Importar las señales
+        import cultivo.signals
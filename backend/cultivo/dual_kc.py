@@ -0,0 +1,135 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .growth_curves import KC_MIN
+
+# =============================================================================
+#  KC DUAL (FAO-56 Cap. 7): ETc = (Kcb + Ke) · ETo
+# =============================================================================
+# Kcb (transpiración) sale de la curva del cultivo; Ke (evaporación del suelo)
+# depende de la capa superficial evaporable (Ze) y de qué tan seca está (De):
+#   Kr  = 1                          si De <= REW
+#       = (TEW - De) / (TEW - REW)   si De >  REW              (Ec. 74)
+#   Ke  = min(Kr · (Kc_max - Kcb), few · Kc_max)               (Ec. 71)
+#   few = min(1 - fc, fw)                                      (Ec. 75)
+#   De  = De_ant - P - I/fw + E/few   (acotado a [0, TEW])     (Ec. 77)
+# fw es la fracción mojada por el último evento: la lluvia moja todo (1.0)
+# y el riego según su tipo (Tabla 20).
+#
+# Todo lo que no depende del día anterior (Kc_max, fc, few, fw, TEW/REW) se
+# calcula de una vez para lotes × días; solo De avanza día a día, dentro del
+# mismo ciclo del tanque y para todos los lotes a la vez.
+
+# Profundidad de la capa evaporable (m)
+ZE = 0.10
+
+# Fracción de la superficie mojada por tipo de riego (FAO-56 Tabla 20)
+WETTED_FRACTION = {
+    'DRIP': 0.35,
+    'SPRINKLER': 1.0,
+    'FURROW': 0.8,
+    'FURROW_ALTERNATE': 0.4,
+    'BASIN': 1.0,
+}
+
+# Agua fácilmente evaporable (mm) por textura (FAO-56 Tabla 19), en orden de búsqueda
+REW_BY_TEXTURE = (
+    ('arcill', 10.0),
+    ('franco aren', 8.0),
+    ('aren', 5.0),
+    ('lim', 9.0),
+)
+DEFAULT_REW = 9.0
+
+# Lluvias menores casi no mojan la capa superficial (no cambian fw)
+RAIN_WETTING_MM = 3.0
+
+# few mínimo: evita divisiones por cero con cobertura total
+FEW_MIN = 0.01
+
+
+class DualKcInputs(NamedTuple):
+    """Términos del Kc dual que no dependen del día anterior (lotes × días)."""
+    kcb: np.ndarray
+    kc_max: np.ndarray
+    few: np.ndarray
+    fw: np.ndarray
+    tew: np.ndarray     # (lotes, 1)
+    rew: np.ndarray     # (lotes, 1)
+
+
+def kc_max(kcb):
+    """Límite superior de Kc tras una lluvia o riego (Ec. 72, clima estándar: u2 = 2 m/s, HRmin = 45%)."""
+    return np.maximum(1.2, kcb + 0.05)
+
+
+def fraction_cover(kcb, kcmax, height, kc_min: float = KC_MIN):
+    """Fracción de suelo cubierta por el dosel (Ec. 76)."""
+    with np.errstate(invalid='ignore'):
+        base = np.clip((kcb - kc_min) / (kcmax - kc_min), 0.0, 1.0)
+        return np.clip(base ** (1 + 0.5 * height), 0.0, 0.99)
+
+
+def readily_evaporable_water(textura: str) -> float:
+    textura = (textura or '').lower()
+    for clave, rew in REW_BY_TEXTURE:
+        if clave in textura:
+            return rew
+    return DEFAULT_REW
+
+
+def evaporable_water(cc, pmp, da, texturas):
+    """
+    TEW = 1000 · (θcc - 0.5 · θpmp) · Ze (Ec. 73) y REW por textura, con la
+    misma conversión de % a fracción volumétrica que los límites del tanque.
+    Retorna (tew, rew) como columnas (lotes, 1).
+    """
+    tew = 1000 * ((cc / 100) * da - 0.5 * (pmp / 100) * da) * ZE
+    rew = np.array([readily_evaporable_water(t) for t in texturas], dtype=float)[:, None]
+    return tew, np.minimum(rew, tew)
+
+
+def wetted_fraction(rain, irrigation, irrigation_type: str, initial=None):
+    """
+    fw de cada día: la del último evento de mojado (lotes × días). Antes del
+    primer evento de la ventana se usa `initial` (checkpoint) o 1.0.
+    """
+    lotes, dias = irrigation.shape
+    fw_riego = WETTED_FRACTION.get(irrigation_type, 1.0)
+    llueve = rain >= RAIN_WETTING_MM
+    evento = llueve | (irrigation > 0)
+    valor = np.where(llueve, 1.0, fw_riego)
+
+    # Índice del último evento hasta cada día (forward fill vectorizado)
+    ultimo = np.maximum.accumulate(np.where(evento, np.arange(dias)[None, :], -1), axis=1)
+    previa = np.ones(lotes) if initial is None else np.where(np.isnan(initial), 1.0, initial)
+    fw = np.take_along_axis(valor, np.maximum(ultimo, 0), axis=1)
+    return np.where(ultimo >= 0, fw, previa[:, None])
+
+
+def prepare(kcb, height, cc, pmp, da, texturas, rain, irrigation, irrigation_type: str,
+            initial_fw=None) -> DualKcInputs:
+    kcmax = kc_max(kcb)
+    fc = fraction_cover(kcb, kcmax, height)
+    fw = wetted_fraction(rain, irrigation, irrigation_type, initial_fw)
+    # Goteo: parte del bulbo mojado queda bajo el dosel (nota de la Ec. 75)
+    fw_expuesta = np.where((irrigation_type == 'DRIP') & (fw < 1.0), fw * (1 - 2 / 3 * fc), fw)
+    few = np.maximum(np.minimum(1 - fc, fw_expuesta), FEW_MIN)
+    tew, rew = evaporable_water(cc, pmp, da, texturas)
+    return DualKcInputs(kcb=kcb, kc_max=kcmax, few=few, fw=fw, tew=tew, rew=rew)
+
+
+def evaporation_step(de, d, inputs: DualKcInputs, eto, rain_eff, irrigation_net):
+    """
+    Un día de la capa evaporable para todos los lotes (vectores de largo lotes).
+    Retorna (ke, de_nuevo).
+    """
+    tew, rew = inputs.tew[:, 0], inputs.rew[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kr = np.where(de > rew, np.clip((tew - de) / (tew - rew), 0.0, 1.0), 1.0)
+    kcb, kcmax, few = inputs.kcb[:, d], inputs.kc_max[:, d], inputs.few[:, d]
+    ke = np.maximum(np.minimum(kr * (kcmax - kcb), few * kcmax), 0.0)
+    evaporacion = ke * eto
+    nuevo = de - rain_eff - irrigation_net / inputs.fw[:, d] + evaporacion / few
+    return ke, np.clip(nuevo, 0.0, tew)
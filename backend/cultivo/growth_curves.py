@@ -0,0 +1,127 @@
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+# =============================================================================
+#  CURVAS DE CRECIMIENTO POR CULTIVO (FAO-56)
+# =============================================================================
+# Kc, Kcb, profundidad radicular y altura dependen solo del cultivo y de la
+# edad de la siembra. Se precalcula la temporada completa (un valor por día)
+# una vez por cultivo; el balance hídrico solo indexa por edad. Más allá del
+# fin de temporada se mantiene el último valor (kc_fin, raíz máxima).
+
+# Fallbacks (mismos valores que usaba el balance)
+DEFAULT_STAGE_INI = 20
+DEFAULT_STAGE_DEV = 30
+DEFAULT_ROOT_INI = 0.3
+DEFAULT_ROOT_MAX = 1.0
+
+# Kcb (coeficiente basal, FAO-56 Cap. 7) derivado del Kc único del cultivo:
+# etapa inicial con suelo casi desnudo (Tabla 17) y, en media y final,
+# Kc menos el aporte típico de la evaporación del suelo.
+KCB_INI = 0.15
+KCB_OFFSET = 0.05
+KC_MIN = 0.15
+
+
+class CropGrowthCurve(NamedTuple):
+    """Arrays de solo lectura indexados por edad de la siembra (días)."""
+    kc: np.ndarray
+    kcb: np.ndarray
+    root_depth: np.ndarray
+    height: np.ndarray
+
+    @property
+    def season_length(self) -> int:
+        return self.kc.size - 1
+
+    def at(self, ages) -> np.ndarray:
+        """Índices de la curva para las edades dadas (recortadas a la temporada)."""
+        return np.clip(np.asarray(ages, dtype=int), 0, self.season_length)
+
+
+def _fingerprint(crop):
+    return (
+        crop.kc_inicial, crop.kc_medio, crop.kc_fin,
+        crop.etapa_inicial, crop.etapa_desarrollo, crop.etapa_medio, crop.etapa_final,
+        crop.prof_radicular_ini, crop.prof_radicular_max, crop.altura_max,
+    )
+
+
+def _tramos(edad, l_ini, l_dev, l_late, fin_mid, total, v_ini, v_mid, v_end):
+    """Curva por tramos lineales FAO-56 (Fig. 25) evaluada en `edad`."""
+    fin_dev = l_ini + l_dev
+    return np.select(
+        [edad < l_ini, edad < fin_dev, edad < fin_mid, edad < total],
+        [
+            v_ini,
+            v_ini + (edad - l_ini) / l_dev * (v_mid - v_ini),
+            v_mid,
+            v_mid + (edad - fin_mid) / max(l_late, 1) * (v_end - v_mid),
+        ],
+        default=v_end,
+    )
+
+
+def build_growth_curve(crop) -> CropGrowthCurve:
+    """
+    Kc diario por tramos lineales (FAO-56 Fig. 25): kc_inicial durante la
+    etapa inicial, sube a kc_medio en desarrollo, se mantiene en la etapa
+    media y baja a kc_fin en la etapa final. Kcb sigue los mismos tramos
+    (KCB_INI, kc_medio - KCB_OFFSET, kc_fin - KCB_OFFSET). La raíz crece
+    linealmente de prof_radicular_ini a prof_radicular_max durante el
+    desarrollo, y la altura de 0 a altura_max en el mismo tramo.
+    """
+    l_ini = crop.etapa_inicial or DEFAULT_STAGE_INI
+    l_dev = crop.etapa_desarrollo or DEFAULT_STAGE_DEV
+    l_mid = max(crop.etapa_medio or 0, 0)
+    l_late = max(crop.etapa_final or 0, 0)
+    fin_mid = l_ini + l_dev + l_mid
+    total = fin_mid + l_late
+
+    edad = np.arange(total + 1)
+    etapas = (edad, l_ini, l_dev, l_late, fin_mid, total)
+    kc = _tramos(*etapas, crop.kc_inicial, crop.kc_medio, crop.kc_fin)
+
+    kcb_ini = min(KCB_INI, crop.kc_inicial)
+    kcb = _tramos(
+        *etapas, kcb_ini,
+        max(crop.kc_medio - KCB_OFFSET, kcb_ini),
+        max(crop.kc_fin - KCB_OFFSET, KC_MIN),
+    )
+
+    desarrollo = np.clip((edad - l_ini) / l_dev, 0.0, 1.0)
+    pr_ini = crop.prof_radicular_ini or DEFAULT_ROOT_INI
+    pr_max = crop.prof_radicular_max or DEFAULT_ROOT_MAX
+    root_depth = pr_ini + desarrollo * (pr_max - pr_ini)
+    height = desarrollo * (crop.altura_max or 0.0)
+
+    for arr in (kc, kcb, root_depth, height):
+        arr.flags.writeable = False
+    return CropGrowthCurve(kc=kc, kcb=kcb, root_depth=root_depth, height=height)
+
+
+_curves = {}
+_curves_lock = threading.Lock()
+
+
+def get_growth_curve(crop) -> CropGrowthCurve:
+    """
+    Curva memoizada por id de cultivo. La huella de los parámetros protege
+    contra ediciones hechas en otro proceso; en este, la señal post_save de
+    Crop la invalida (invalidate_growth_curve).
+    """
+    huella = _fingerprint(crop)
+    entrada = _curves.get(crop.id)
+    if entrada is not None and entrada[0] == huella:
+        return entrada[1]
+    curve = build_growth_curve(crop)
+    with _curves_lock:
+        _curves[crop.id] = (huella, curve)
+    return curve
+
+
+def invalidate_growth_curve(crop_id):
+    with _curves_lock:
+        _curves.pop(crop_id, None)
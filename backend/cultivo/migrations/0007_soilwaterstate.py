@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cultivo', '0006_croptoplant_historical_formula_choice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoilWaterState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('water_mm', models.FloatField(help_text='Agua en el suelo al final del día')),
+                ('depletion_mm', models.FloatField(help_text='Agotamiento respecto a capacidad de campo (Dr)')),
+                ('drainage_mm', models.FloatField(default=0.0, help_text='Percolación sobre capacidad de campo')),
+                ('root_depth_m', models.FloatField(help_text='Profundidad radicular (m)')),
+                ('field_capacity_mm', models.FloatField()),
+                ('wilting_point_mm', models.FloatField()),
+                ('critical_mm', models.FloatField(help_text='Umbral crítico (p)')),
+                ('kc', models.FloatField()),
+                ('eto_mm', models.FloatField()),
+                ('etc_mm', models.FloatField()),
+                ('rain_mm', models.FloatField(help_text='Lluvia bruta')),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('planting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='water_states', to='cultivo.croptoplant')),
+            ],
+            options={
+                'verbose_name': 'Estado Hídrico del Suelo',
+                'verbose_name_plural': 'Estados Hídricos del Suelo',
+                'ordering': ['planting', 'date'],
+                'unique_together': {('planting', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cultivo', '0007_soilwaterstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soilwaterstate',
+            name='evaporation_depletion_mm',
+            field=models.FloatField(blank=True, help_text='Agotamiento de la capa evaporable (De)', null=True),
+        ),
+        migrations.AddField(
+            model_name='soilwaterstate',
+            name='wetted_fraction',
+            field=models.FloatField(blank=True, help_text='Fracción mojada por el último evento (fw)', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cultivo', '0009_soilwaterstate_evaporation_depletion_mm_and_more'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='soilwaterstate',
+            old_name='created_at',
+            new_name='updated_at',
+        ),
+    ]
@@ -113,4 +113,44 @@ class IrrigationExecution(models.Model):
         verbose_name_plural = "Historial de Riegos"
 
     def __str__(self):
-        return f"{self.date} - {self.water_volume_mm}mm en {self.planting}"
\ No newline at end of file
+        return f"{self.date} - {self.water_volume_mm}mm en {self.planting}"
+
+class SoilWaterState(models.Model):
+    """
+    Checkpoint diario del balance hídrico de una siembra (estado al final del día).
+    `calculate_irrigation` retoma desde el último checkpoint y solo simula los
+    días nuevos. Editar clima, lluvia o riegos de una fecha borra los
+    checkpoints desde esa fecha en adelante (ver cultivo/signals.py).
+    """
+    planting = models.ForeignKey(CropToPlant, on_delete=models.CASCADE, related_name='water_states')
+    date = models.DateField()
+
+    # Tanque (mm)
+    water_mm = models.FloatField(help_text="Agua en el suelo al final del día")
+    depletion_mm = models.FloatField(help_text="Agotamiento respecto a capacidad de campo (Dr)")
+    drainage_mm = models.FloatField(default=0.0, help_text="Percolación sobre capacidad de campo")
+    root_depth_m = models.FloatField(help_text="Profundidad radicular (m)")
+    field_capacity_mm = models.FloatField()
+    wilting_point_mm = models.FloatField()
+    critical_mm = models.FloatField(help_text="Umbral crítico (p)")
+
+    # Flujos del día (para el reporte de 'ayer')
+    kc = models.FloatField()
+    eto_mm = models.FloatField()
+    etc_mm = models.FloatField()
+    rain_mm = models.FloatField(help_text="Lluvia bruta")
+
+    # Capa evaporable (solo en modo Kc dual)
+    evaporation_depletion_mm = models.FloatField(null=True, blank=True, help_text="Agotamiento de la capa evaporable (De)")
+    wetted_fraction = models.FloatField(null=True, blank=True, help_text="Fracción mojada por el último evento (fw)")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('planting', 'date')
+        ordering = ['planting', 'date']
+        verbose_name = "Estado Hídrico del Suelo"
+        verbose_name_plural = "Estados Hídricos del Suelo"
+
+    def __str__(self):
+        return f"{self.planting} - {self.date}: {round(self.water_mm, 1)} mm"
@@ -0,0 +1,367 @@
+from datetime import timedelta
+
+import numpy as np
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import OuterRef, Subquery
+
+from climate_and_eto.models import DailyWeather
+from climate_and_eto.services import get_weather_strictly_local
+from precipitaciones.models import PrecipitationRecord, Station
+
+from . import water_balance
+from .models import IrrigationExecution, SoilWaterState
+
+# Ventana máxima de simulación sin checkpoint (días hacia atrás desde hoy)
+WINDOW_DAYS = 30
+
+
+class MissingDailyData(ObjectDoesNotExist):
+    """Falta ETo o lluvia de un día de la ventana. `date` = primer día faltante."""
+
+    def __init__(self, message, date):
+        super().__init__(message)
+        self.date = date
+
+
+def reading_station(user):
+    """
+    Estación cuya lluvia usa el balance de las siembras del usuario: la
+    primera que registró. Las señales de invalidación usan la misma regla.
+    """
+    return Station.objects.filter(user=user).order_by('pk').first()
+
+
+def get_eto_for_planting(planting, user, eval_date):
+    """
+    Función centralizada para obtener la ETo de un día dado.
+    Si la siembra usa fuente DAILY → consulta DailyWeather (NASA/Sensores).
+    Si la siembra usa fuente HISTORICAL → extrae del JSON del ClimateStudy.
+    
+    Estructura del JSON de ClimateStudy.result_data:
+    [
+        {"month": 1, "month_name": "January", "eto_results": {"PENMAN": 5.2, "HARGREAVES": 4.8}},
+        {"month": 2, ...},
+        ...
+    ]
+    
+    Retorna float (mm/día). Lanza ObjectDoesNotExist si no hay datos.
+    """
+    if planting.eto_source == 'HISTORICAL' and planting.historical_study_id:
+        study = planting.historical_study
+        if not study or not study.result_data:
+            raise ObjectDoesNotExist(
+                f"El estudio histórico vinculado (ID={planting.historical_study_id}) no contiene datos."
+            )
+        
+        month_num = eval_date.month
+        formula_key = planting.historical_formula_choice
+        
+        # Buscar la fila del mes correspondiente en el JSON
+        month_row = None
+        for row in study.result_data:
+            row_month = row.get('month') or row.get('mes')
+            if row_month and int(row_month) == month_num:
+                month_row = row
+                break
+        
+        if not month_row:
+            raise ObjectDoesNotExist(
+                f"No se encontraron datos para el mes {month_num} en el estudio '{study.name}'."
+            )
+        
+        # Las fórmulas están dentro de "eto_results" (sub-diccionario)
+        eto_results = month_row.get('eto_results', {})
+        # Fallback: si no hay "eto_results", buscar fórmulas en la raíz (compatibilidad)
+        if not eto_results:
+            excluded_keys = {'mes', 'month', 'month_name', 'name'}
+            eto_results = {k: v for k, v in month_row.items() if k not in excluded_keys and isinstance(v, (int, float))}
+        
+        if formula_key == 'AVERAGE_ALL':
+            values = [v for v in eto_results.values() if isinstance(v, (int, float))]
+            if not values:
+                raise ObjectDoesNotExist(
+                    f"No hay valores numéricos de ETo en el mes {month_num} del estudio '{study.name}'."
+                )
+            return sum(values) / len(values)
+        else:
+            eto_val = eto_results.get(formula_key)
+            if eto_val is None:
+                raise ObjectDoesNotExist(
+                    f"La fórmula '{formula_key}' no existe en el mes {month_num} del estudio '{study.name}'."
+                )
+            return float(eto_val)
+    else:
+        # Modo DAILY: lectura estricta de la base de datos local
+        weather_record = get_weather_strictly_local(user, eval_date)
+        return weather_record.eto_mm
+
+
+# ---------------------------------------------------------
+# SERIES DIARIAS DE UNA VENTANA (Una consulta por tabla)
+# ---------------------------------------------------------
+# El balance hídrico necesita ETo, lluvia y riegos de cada día de la ventana.
+# En lugar de un `.filter(...).first()` por día, se trae el rango completo y
+# se vuelca en arrays indexados por día (NaN = no hay registro).
+
+def _por_dia(filas, start_date, n_days):
+    """[(fecha, valor)] -> array de n_days indexado por (fecha - start_date)."""
+    serie = np.full(n_days, np.nan)
+    for dia, valor in filas:
+        i = (dia - start_date).days
+        if 0 <= i < n_days and valor is not None:
+            serie[i] = valor
+    return serie
+
+
+def daily_eto_series(user, start_date, n_days):
+    """ETo diaria (DailyWeather) del usuario en la ventana: una consulta."""
+    filas = DailyWeather.objects.filter(
+        user=user, date__range=[start_date, start_date + timedelta(days=n_days - 1)]
+    ).values_list('date', 'eto_mm')
+    return _por_dia(filas, start_date, n_days)
+
+
+def station_rain_series(station, start_date, n_days):
+    """Lluvia guardada (effective_precipitation_mm) de la estación: una consulta."""
+    filas = PrecipitationRecord.objects.filter(
+        station=station, date__range=[start_date, start_date + timedelta(days=n_days - 1)]
+    ).values_list('date', 'effective_precipitation_mm')
+    return _por_dia(filas, start_date, n_days)
+
+
+def irrigation_series(planting, start_date, n_days):
+    """Riego bruto aplicado por día (varios eventos el mismo día se suman)."""
+    serie = np.zeros(max(n_days, 0))
+    if n_days <= 0:
+        return serie
+    filas = planting.irrigations.filter(
+        date__range=[start_date, start_date + timedelta(days=n_days - 1)]
+    ).values_list('date', 'water_volume_mm')
+    for dia, mm in filas:
+        serie[(dia - start_date).days] += mm or 0.0
+    return serie
+
+
+def planting_eto_series(planting, user, start_date, n_days, daily_eto=None):
+    """
+    ETo de la siembra en la ventana según su fuente. Retorna (serie, errores):
+    `errores` = {índice del día: mensaje} para los días sin dato.
+    - DAILY: una consulta a DailyWeather (o `daily_eto` ya cargada).
+    - HISTORICAL: un valor por mes del estudio (sin consultas por día).
+    """
+    if n_days <= 0:
+        return np.zeros(0), {}
+
+    if planting.eto_source == 'HISTORICAL' and planting.historical_study_id:
+        serie = np.full(n_days, np.nan)
+        errores = {}
+        fechas = [start_date + timedelta(days=d) for d in range(n_days)]
+        por_mes = {}
+        for d, dia in enumerate(fechas):
+            if dia.month not in por_mes:
+                try:
+                    por_mes[dia.month] = (get_eto_for_planting(planting, user, dia), None)
+                except ObjectDoesNotExist as e:
+                    por_mes[dia.month] = (np.nan, str(e))
+            serie[d], error = por_mes[dia.month]
+            if error:
+                errores[d] = error
+        return serie, errores
+
+    serie = daily_eto_series(user, start_date, n_days) if daily_eto is None else daily_eto.copy()
+    errores = {
+        int(d): f"No existe registro climático para el {start_date + timedelta(days=int(d))}."
+        for d in np.flatnonzero(np.isnan(serie))
+    }
+    return serie, errores
+
+
+def _primer_faltante(eto, rain, errores, station, start_date, desde=0):
+    """MissingDailyData del primer día sin ETo o lluvia (desde el índice `desde`), o None."""
+    faltantes = np.isnan(eto[desde:]) | np.isnan(rain[desde:])
+    if not faltantes.any():
+        return None
+    d = int(desde) + int(np.argmax(faltantes))
+    dia = start_date + timedelta(days=d)
+    if d in errores:
+        return MissingDailyData(errores[d], dia)
+    return MissingDailyData(
+        f"No existe registro de precipitación para el {dia} en '{station.name}'. "
+        "Por favor sincronice o registre el dato manualmente.",
+        dia
+    )
+
+
+def load_strict_window(planting, user, station, start_date, n_days):
+    """
+    Series de la ventana para el cálculo estricto: (eto, lluvia, riego).
+    Si falta un dato lanza MissingDailyData con el primer día faltante
+    (en un mismo día, la ETo se reporta antes que la lluvia).
+    """
+    eto, errores = planting_eto_series(planting, user, start_date, n_days)
+    rain = station_rain_series(station, start_date, n_days) if n_days > 0 else np.zeros(0)
+
+    faltante = _primer_faltante(eto, rain, errores, station, start_date)
+    if faltante:
+        raise faltante
+    return eto, rain, irrigation_series(planting, start_date, n_days)
+
+
+def load_bulk_window(plantings, user, station, start_date, n_days, start_offsets):
+    """
+    Series de la ventana para varias siembras del mismo usuario, con una
+    consulta por tabla en total (no por lote):
+    ETo lotes × días, lluvia de la estación (días), riegos lotes × días y
+    {índice del lote: MissingDailyData} para los lotes con huecos en su
+    propia ventana (desde su `start_offset`).
+    """
+    lotes = len(plantings)
+    if lotes == 0 or n_days <= 0:
+        return np.zeros((lotes, 0)), np.zeros(0), np.zeros((lotes, 0)), {}
+
+    # DailyWeather es del usuario: se carga una vez para todos los lotes DAILY
+    daily = None
+    if any(not (p.eto_source == 'HISTORICAL' and p.historical_study_id) for p in plantings):
+        daily = daily_eto_series(user, start_date, n_days)
+
+    eto = np.empty((lotes, n_days))
+    rain = station_rain_series(station, start_date, n_days)
+    faltantes = {}
+    for i, planting in enumerate(plantings):
+        eto[i], errores = planting_eto_series(planting, user, start_date, n_days, daily_eto=daily)
+        faltante = _primer_faltante(eto[i], rain, errores, station, start_date, desde=start_offsets[i])
+        if faltante:
+            faltantes[i] = faltante
+
+    # Riegos de todos los lotes: una consulta
+    irrigation = np.zeros((lotes, n_days))
+    indice = {p.id: i for i, p in enumerate(plantings)}
+    filas = IrrigationExecution.objects.filter(
+        planting__in=plantings, date__range=[start_date, start_date + timedelta(days=n_days - 1)]
+    ).values_list('planting_id', 'date', 'water_volume_mm')
+    for planting_id, dia, mm in filas:
+        irrigation[indice[planting_id], (dia - start_date).days] += mm or 0.0
+
+    return eto, rain, irrigation, faltantes
+
+
+# ---------------------------------------------------------
+# CHECKPOINTS DEL TANQUE (Balance incremental)
+# ---------------------------------------------------------
+
+def latest_checkpoints(plantings, window_starts, today):
+    """
+    Último SoilWaterState anterior a hoy de cada siembra, en una consulta.
+    Solo sirve si cae dentro de la ventana de la siembra (>= inicio - 1 día):
+    más viejo obligaría a simular un hueco mayor a WINDOW_DAYS.
+    Retorna {planting_id: SoilWaterState}.
+    """
+    ultimo = SoilWaterState.objects.filter(
+        planting=OuterRef('planting'), date__lt=today
+    ).order_by('-date').values('date')[:1]
+    estados = SoilWaterState.objects.filter(planting__in=plantings, date=Subquery(ultimo))
+
+    inicios = {p.id: inicio for p, inicio in zip(plantings, window_starts)}
+    return {
+        estado.planting_id: estado for estado in estados
+        if estado.date >= inicios[estado.planting_id] - timedelta(days=1)
+    }
+
+
+def _opcional(valor):
+    return None if np.isnan(valor) else float(valor)
+
+
+def checkpoint_initials(plantings, checkpoints):
+    """
+    Estado inicial de cada lote desde su checkpoint (NaN = sin checkpoint):
+    agua del tanque, De y fw de la capa evaporable. Retorna tres arrays.
+    """
+    def _valor(planting, campo):
+        estado = checkpoints.get(planting.id)
+        valor = getattr(estado, campo) if estado is not None else None
+        return np.nan if valor is None else valor
+
+    return tuple(
+        np.array([_valor(p, campo) for p in plantings], dtype=float)
+        for campo in ('water_mm', 'evaporation_depletion_mm', 'wetted_fraction')
+    )
+
+
+def save_checkpoints(plantings, timeline, batch_size=500):
+    """Guarda (upsert) cada día simulado de cada lote como checkpoint."""
+    objs = []
+    for i, planting in enumerate(plantings):
+        for d in np.flatnonzero(~np.isnan(timeline.water[i])):
+            objs.append(SoilWaterState(
+                planting=planting,
+                date=timeline.dates[d].item(),
+                water_mm=timeline.water[i, d],
+                depletion_mm=timeline.field_capacity[i, d] - timeline.water[i, d],
+                drainage_mm=timeline.drainage[i, d],
+                root_depth_m=timeline.root_depth[i, d],
+                field_capacity_mm=timeline.field_capacity[i, d],
+                wilting_point_mm=timeline.wilting_point[i, d],
+                critical_mm=timeline.critical[i, d],
+                kc=timeline.kc[i, d],
+                eto_mm=timeline.eto[i, d],
+                etc_mm=timeline.etc[i, d],
+                rain_mm=timeline.rain[i, d],
+                evaporation_depletion_mm=_opcional(timeline.evaporation_depletion[i, d]),
+                wetted_fraction=_opcional(timeline.wetted_fraction[i, d]),
+            ))
+    if objs:
+        SoilWaterState.objects.bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['planting', 'date'],
+            update_fields=[
+                'water_mm', 'depletion_mm', 'drainage_mm', 'root_depth_m', 'field_capacity_mm',
+                'wilting_point_mm', 'critical_mm', 'kc', 'eto_mm', 'etc_mm', 'rain_mm',
+                'evaporation_depletion_mm', 'wetted_fraction', 'updated_at',
+            ],
+        )
+
+
+def final_state(planting, today, timeline=None, i=0, checkpoint=None):
+    """
+    Estado del tanque al cierre de ayer: último día simulado del lote `i`,
+    o el checkpoint si no hubo días nuevos, o (siembra de hoy) suelo a
+    capacidad de campo sin historia.
+    """
+    if timeline is not None and timeline.dates.size and not np.isnan(timeline.water[i, -1]):
+        return {
+            'water': float(timeline.water[i, -1]),
+            'field_capacity': float(timeline.field_capacity[i, -1]),
+            'wilting_point': float(timeline.wilting_point[i, -1]),
+            'critical': float(timeline.critical[i, -1]),
+            'kc': float(timeline.kc[i, -1]),
+            'eto': float(timeline.eto[i, -1]),
+            'etc': float(timeline.etc[i, -1]),
+            'rain': float(timeline.rain[i, -1]),
+        }
+    if checkpoint is not None:
+        return {
+            'water': checkpoint.water_mm,
+            'field_capacity': checkpoint.field_capacity_mm,
+            'wilting_point': checkpoint.wilting_point_mm,
+            'critical': checkpoint.critical_mm,
+            'kc': checkpoint.kc,
+            'eto': checkpoint.eto_mm,
+            'etc': checkpoint.etc_mm,
+            'rain': checkpoint.rain_mm,
+        }
+    hoy = water_balance.date_range(today, 1)
+    _, l_cc, l_pmp, _, l_crit = water_balance.day_limits([planting], hoy)
+    kc, _ = water_balance.crop_curves([planting], hoy)
+    return {
+        'water': float(l_cc[0, 0]),
+        'field_capacity': float(l_cc[0, 0]),
+        'wilting_point': float(l_pmp[0, 0]),
+        'critical': float(l_crit[0, 0]),
+        'kc': float(kc[0, 0]),
+        'eto': 0.0,
+        'etc': 0.0,
+        'rain': 0.0,
+    }
@@ -0,0 +1,158 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from climate_and_eto.models import ClimateStudy, DailyWeather, IrrigationSettings
+from climate_and_eto.signals import daily_weather_bulk_saved
+from precipitaciones.models import PrecipitationRecord, Station
+from precipitaciones.signals import precipitation_bulk_saved
+from suelo.models import Soil
+
+from .growth_curves import invalidate_growth_curve
+from .models import Crop, CropToPlant, IrrigationExecution, SoilWaterState
+
+# =============================================================================
+#  INVALIDACIÓN DE CHECKPOINTS DEL BALANCE HÍDRICO
+# =============================================================================
+# Un checkpoint del día D depende de todo lo ocurrido hasta D. Cambiar clima,
+# lluvia o riegos de una fecha invalida los checkpoints desde esa fecha; cambiar
+# la siembra, su suelo, su cultivo, su estudio histórico o la configuración de
+# riego los invalida todos.
+#
+# Los post_save con raw=True (loaddata, incluidas las migraciones de datos) no
+# tocan SoilWaterState: la tabla puede no existir todavía.
+
+
+# Dueño de cada registro diario: sus checkpoints son los afectados
+_DUENO = {
+    DailyWeather: 'user_id',
+    PrecipitationRecord: 'station_id',
+    IrrigationExecution: 'planting_id',
+}
+
+
+@receiver(post_init, sender=DailyWeather)
+@receiver(post_init, sender=PrecipitationRecord)
+@receiver(post_init, sender=IrrigationExecution)
+def recordar_valores_cargados(sender, instance, **kwargs):
+    # Fecha y dueño tal como vinieron de la base (sin consulta extra):
+    # mover un registro afecta también a la fecha y al dueño viejos
+    if instance.pk is not None:
+        instance._cargado = (instance.__dict__.get('date'), instance.__dict__.get(_DUENO[sender]))
+
+
+def _afectados(sender, instance):
+    """[(dueño, fecha desde)] afectados por guardar o borrar el registro."""
+    actual = (getattr(instance, _DUENO[sender]), instance.date)
+    fecha_vieja, dueno_viejo = getattr(instance, '_cargado', (None, None))
+    if fecha_vieja is None:
+        return [actual]
+    if dueno_viejo == actual[0]:
+        return [(actual[0], min(actual[1], fecha_vieja))]
+    return [actual, (dueno_viejo, fecha_vieja)]
+
+
+def _olvidar_cargado(instance):
+    instance._cargado = (instance.date, getattr(instance, _DUENO[type(instance)]))
+
+
+def _usuario_lector(station_id):
+    """
+    Usuario cuyas siembras leen la lluvia de esta estación (el cálculo usa
+    la primera estación del usuario), o None si la estación no es la leída.
+    """
+    primera = Station.objects.filter(user__stations__id=station_id).order_by('pk').values_list('pk', 'user_id').first()
+    if primera and primera[0] == station_id:
+        return primera[1]
+    return None
+
+
+@receiver(post_save, sender=DailyWeather)
+@receiver(post_delete, sender=DailyWeather)
+def invalidar_por_clima(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    for user_id, desde in _afectados(sender, instance):
+        SoilWaterState.objects.filter(planting__user_id=user_id, date__gte=desde).delete()
+    _olvidar_cargado(instance)
+
+
+@receiver(post_save, sender=PrecipitationRecord)
+@receiver(post_delete, sender=PrecipitationRecord)
+def invalidar_por_lluvia(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    for station_id, desde in _afectados(sender, instance):
+        user_id = _usuario_lector(station_id)
+        if user_id is not None:
+            SoilWaterState.objects.filter(planting__user_id=user_id, date__gte=desde).delete()
+    _olvidar_cargado(instance)
+
+
+@receiver(post_save, sender=IrrigationExecution)
+@receiver(post_delete, sender=IrrigationExecution)
+def invalidar_por_riego(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    for planting_id, desde in _afectados(sender, instance):
+        SoilWaterState.objects.filter(planting_id=planting_id, date__gte=desde).delete()
+    _olvidar_cargado(instance)
+
+
+@receiver(daily_weather_bulk_saved)
+def invalidar_por_clima_masivo(sender, user, start_date, **kwargs):
+    SoilWaterState.objects.filter(planting__user=user, date__gte=start_date).delete()
+
+
+@receiver(precipitation_bulk_saved)
+def invalidar_por_lluvia_masivo(sender, station, start_date, **kwargs):
+    user_id = _usuario_lector(station.id)
+    if user_id is not None:
+        SoilWaterState.objects.filter(planting__user_id=user_id, date__gte=start_date).delete()
+
+
+@receiver(post_delete, sender=Station)
+def invalidar_estacion(sender, instance, **kwargs):
+    # Borrar la estación leída hace que el cálculo lea otra (o ninguna)
+    SoilWaterState.objects.filter(planting__user_id=instance.user_id).delete()
+
+
+@receiver(post_save, sender=ClimateStudy)
+@receiver(pre_delete, sender=ClimateStudy)
+def invalidar_estudio_historico(sender, instance, **kwargs):
+    # Siembras HISTORICAL: su ETo sale del estudio (al borrarlo pasan a DAILY)
+    if kwargs.get('raw'):
+        return
+    SoilWaterState.objects.filter(planting__historical_study=instance).delete()
+
+
+@receiver(post_save, sender=CropToPlant)
+def invalidar_siembra(sender, instance, created, **kwargs):
+    if not created and not kwargs.get('raw'):
+        SoilWaterState.objects.filter(planting=instance).delete()
+
+
+@receiver(post_save, sender=Crop)
+def invalidar_cultivo(sender, instance, **kwargs):
+    invalidate_growth_curve(instance.id)
+    if kwargs.get('raw'):
+        return
+    SoilWaterState.objects.filter(planting__crop=instance).delete()
+
+
+@receiver(post_delete, sender=Crop)
+def olvidar_curva_cultivo(sender, instance, **kwargs):
+    invalidate_growth_curve(instance.id)
+
+
+@receiver(post_save, sender=Soil)
+def invalidar_suelo(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    SoilWaterState.objects.filter(planting__soil=instance).delete()
+
+
+@receiver(post_save, sender=IrrigationSettings)
+def invalidar_configuracion(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    SoilWaterState.objects.filter(planting__user_id=instance.user_id).delete()
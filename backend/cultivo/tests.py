@@ -1,3 +1,281 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from types import SimpleNamespace
 
-# Create your tests here.
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from precipitaciones.models import Station
+from suelo.models import Soil
+
+from . import dual_kc
+from .growth_curves import get_growth_curve
+from .models import Crop, CropToPlant, SoilWaterState
+from .services import MissingDailyData, checkpoint_initials
+from .water_balance import simulate
+
+
+def _siembra(id, fecha_siembra, textura='Franco'):
+    """Siembra en memoria con lo que leen las curvas y el balance (sin base de datos)."""
+    crop = SimpleNamespace(
+        id=1000 + id, kc_inicial=0.4, kc_medio=1.15, kc_fin=0.7,
+        etapa_inicial=15, etapa_desarrollo=25, etapa_medio=40, etapa_final=20,
+        prof_radicular_ini=0.2, prof_radicular_max=0.9, altura_max=1.2, agotam_critico=0.5,
+    )
+    soil = SimpleNamespace(capacidad_campo=32.0, punto_marchitez=16.0, densidad_aparente=1.3, textura=textura)
+    return SimpleNamespace(id=id, crop=crop, soil=soil, fecha_siembra=fecha_siembra)
+
+
+def _ajustes(modo='SINGLE'):
+    return SimpleNamespace(
+        effective_rain_method='FIXED', system_efficiency=0.9,
+        crop_coefficient_mode=modo, irrigation_type='DRIP',
+    )
+
+
+def _ventana(dias=90):
+    """Dos siembras (la segunda arranca dentro de la ventana) con clima y riegos fijos."""
+    rng = np.random.default_rng(3)
+    riego = np.zeros((2, dias))
+    riego[:, [d for d in (12, 33, 55, 70) if d < dias]] = 25.0
+    return SimpleNamespace(
+        inicio=date(2024, 3, 1),
+        siembras=[_siembra(1, date(2024, 2, 20)), _siembra(2, date(2024, 3, 10), 'Arcilloso')],
+        eto=rng.uniform(2.5, 6.0, dias),
+        rain=np.where(rng.random(dias) < 0.25, rng.uniform(1.0, 30.0, dias), 0.0),
+        riego=riego,
+        offsets=[0, 9],
+    )
+
+
+def _simular(v, modo='SINGLE'):
+    return simulate(v.siembras, _ajustes(modo), v.inicio, v.eto, v.rain, v.riego, start_offsets=v.offsets)
+
+
+def _retomar(v, completo, corte, modo='SINGLE'):
+    """Simula desde `corte` arrancando del checkpoint que dejó `completo` el día anterior."""
+    c = corte - 1
+    checkpoints = {
+        p.id: SimpleNamespace(
+            water_mm=completo.water[i, c],
+            evaporation_depletion_mm=None if np.isnan(completo.evaporation_depletion[i, c]) else completo.evaporation_depletion[i, c],
+            wetted_fraction=None if np.isnan(completo.wetted_fraction[i, c]) else completo.wetted_fraction[i, c],
+        )
+        for i, p in enumerate(v.siembras)
+    }
+    agua, de, fw = checkpoint_initials(v.siembras, checkpoints)
+    return simulate(
+        v.siembras, _ajustes(modo), v.inicio + timedelta(days=corte),
+        v.eto[corte:], v.rain[corte:], v.riego[:, corte:],
+        initial_water=agua, initial_evaporation=de, initial_wetted=fw,
+    )
+
+
+class WaterBalanceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.v = _ventana()
+        self.timeline = _simular(self.v)
+
+    def test_el_agua_queda_entre_los_limites_del_tanque(self):
+        t = self.timeline
+        activo = ~np.isnan(t.water)
+        self.assertTrue((t.water[activo] <= t.field_capacity[activo] + 1e-9).all())
+        self.assertTrue((t.water[activo] >= t.wilting_point[activo] - 1e-9).all())
+
+    def test_antes_del_inicio_no_se_simula(self):
+        t = self.timeline
+        self.assertTrue(np.isnan(t.water[1, :self.v.offsets[1]]).all())
+        # El día de inicio arranca a capacidad de campo menos el consumo del día
+        self.assertLessEqual(t.water[1, self.v.offsets[1]], t.field_capacity[1, self.v.offsets[1]])
+
+    def test_balance_diario(self):
+        t = self.timeline
+        np.testing.assert_allclose(t.etc, t.eto * t.kc)
+        np.testing.assert_allclose(t.rain_eff, t.rain * 0.8)
+        np.testing.assert_allclose(t.irrigation_net, t.irrigation * 0.9)
+
+
+class SimulateCheckpointTests(SimpleTestCase):
+    """Retomar desde un checkpoint debe dar lo mismo que simular la ventana completa."""
+
+    CORTE = 40
+
+    def test_kc_unico(self):
+        v = _ventana()
+        completo = _simular(v)
+        retomado = _retomar(v, completo, self.CORTE)
+        for campo in ('water', 'etc', 'drainage'):
+            np.testing.assert_allclose(
+                getattr(retomado, campo), getattr(completo, campo)[:, self.CORTE:], rtol=0, atol=1e-9, err_msg=campo
+            )
+
+
+class DualKcCheckpointTests(SimpleTestCase):
+
+    CORTE = 40
+
+    def test_kc_dual(self):
+        v = _ventana()
+        completo = _simular(v, 'DUAL')
+        retomado = _retomar(v, completo, self.CORTE, 'DUAL')
+        for campo in ('water', 'etc', 'drainage', 'evaporation_depletion'):
+            np.testing.assert_allclose(
+                getattr(retomado, campo), getattr(completo, campo)[:, self.CORTE:], rtol=0, atol=1e-9, err_msg=campo
+            )
+
+    def test_modo_unico_no_evapora_aparte(self):
+        t = _simular(_ventana())
+        self.assertTrue((t.ke == 0).all())
+        self.assertTrue(np.isnan(t.evaporation_depletion).all())
+
+
+class DualKcTests(SimpleTestCase):
+
+    def setUp(self):
+        lotes, dias = 3, 1
+        kcb = np.full((lotes, dias), 0.8)
+        cc, pmp, da = np.full((lotes, 1), 32.0), np.full((lotes, 1), 16.0), np.full((lotes, 1), 1.3)
+        self.inputs = dual_kc.prepare(
+            kcb, np.full((lotes, dias), 0.5), cc, pmp, da, ['Franco'] * lotes,
+            np.zeros((lotes, dias)), np.zeros((lotes, dias)), 'SPRINKLER',
+        )
+        self.tew, self.rew = self.inputs.tew[:, 0], self.inputs.rew[:, 0]
+
+    def _paso(self, de, eto=5.0, lluvia=0.0, riego=0.0):
+        n = len(de)
+        return dual_kc.evaporation_step(
+            np.asarray(de, dtype=float), 0, self.inputs,
+            np.full(n, eto), np.full(n, lluvia), np.full(n, riego),
+        )
+
+    def test_agua_evaporable(self):
+        # TEW = 1000·(θcc - 0.5·θpmp)·Ze y REW por textura, nunca mayor que TEW
+        np.testing.assert_allclose(self.tew, 1000 * (0.32 * 1.3 - 0.5 * 0.16 * 1.3) * dual_kc.ZE)
+        self.assertTrue((self.rew <= self.tew).all())
+        self.assertEqual(dual_kc.readily_evaporable_water('Franco arenoso'), 8.0)
+        self.assertEqual(dual_kc.readily_evaporable_water(None), dual_kc.DEFAULT_REW)
+
+    def test_limites_de_kr_y_ke(self):
+        ke, _ = self._paso([0.0, self.rew[1], self.tew[2]])
+        kcmax, kcb, few = self.inputs.kc_max[:, 0], self.inputs.kcb[:, 0], self.inputs.few[:, 0]
+        tope = np.minimum(kcmax - kcb, few * kcmax)
+        # Kr = 1 hasta REW: Ke en su tope; con la capa seca (De = TEW) Kr = 0
+        np.testing.assert_allclose(ke[:2], tope[:2])
+        self.assertEqual(ke[2], 0.0)
+        self.assertTrue((ke <= few * kcmax + 1e-12).all())
+
+    def test_kr_decrece_entre_rew_y_tew(self):
+        medio = (self.rew[0] + self.tew[0]) / 2
+        ke, _ = self._paso([self.rew[0], medio, self.tew[0]])
+        self.assertGreater(ke[0], ke[1])
+        self.assertGreater(ke[1], ke[2])
+
+    def test_de_queda_acotado(self):
+        _, de = self._paso([self.tew[0]] * 3, eto=50.0)
+        np.testing.assert_allclose(de, self.tew)
+        _, de = self._paso([1.0] * 3, lluvia=40.0)
+        np.testing.assert_allclose(de, 0.0)
+
+    def test_fraccion_mojada_del_ultimo_evento(self):
+        lluvia = np.array([[0.0, 10.0, 0.0, 0.0, 1.0]])
+        riego = np.array([[0.0, 0.0, 0.0, 20.0, 0.0]])
+        fw = dual_kc.wetted_fraction(lluvia, riego, 'DRIP', initial=np.array([0.6]))
+        np.testing.assert_allclose(fw, [[0.6, 1.0, 1.0, 0.35, 0.35]])
+
+
+class GrowthCurveTests(SimpleTestCase):
+
+    def test_curva_por_tramos(self):
+        curva = get_growth_curve(_siembra(7, date(2024, 1, 1)).crop)
+        self.assertEqual(curva.season_length, 100)
+        self.assertAlmostEqual(curva.kc[0], 0.4)
+        self.assertAlmostEqual(curva.kc[50], 1.15)
+        self.assertAlmostEqual(curva.kc[100], 0.7)
+        self.assertAlmostEqual(curva.root_depth[40], 0.9)
+        self.assertTrue((curva.kcb <= curva.kc + 1e-12).all())
+        self.assertEqual(curva.at([-5, 500]).tolist(), [0, 100])
+
+    def test_el_balance_usa_la_curva(self):
+        v = _ventana(30)
+        t = _simular(v)
+        edades = (t.dates - np.datetime64(v.siembras[0].fecha_siembra, 'D')).astype(int)
+        curva = get_growth_curve(v.siembras[0].crop)
+        np.testing.assert_allclose(t.kc[0], curva.kc[curva.at(edades)])
+        np.testing.assert_allclose(t.root_depth[0], curva.root_depth[curva.at(edades)])
+
+
+def _ventana_fija(planting, user, station, start_date, n_days):
+    """Reemplazo de load_strict_window: clima fijo por fecha, sin base de datos."""
+    dias = np.array([(start_date + timedelta(days=d)).toordinal() for d in range(n_days)])
+    return 3.0 + (dias % 5) * 0.5, np.where(dias % 7 == 0, 12.0, 0.0), np.zeros(n_days)
+
+
+@mock.patch('cultivo.views.load_strict_window', side_effect=_ventana_fija)
+class IrrigationEndpointsTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(email='riego@example.com', username='riego', password='x')
+        soil = Soil.objects.create(user=user, nombre='Lote', textura='Franco', capacidad_campo=32.0, punto_marchitez=16.0)
+        Station.objects.create(user=user, name='Finca', latitude=2.92, longitude=-75.28)
+        self.planting = CropToPlant.objects.create(
+            crop=Crop.objects.filter(user__isnull=True).first(), user=user, soil=soil,
+            fecha_siembra=date.today() - timedelta(days=60),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = f'/api/cultivo/plantings/{self.planting.id}/'
+
+    def test_get_solo_consulta_y_post_guarda_checkpoints(self, _):
+        consulta = self.client.get(self.url + 'calculate_irrigation/')
+        self.assertEqual(consulta.status_code, 200)
+        self.assertFalse(SoilWaterState.objects.exists())
+
+        guardado = self.client.post(self.url + 'calculate_irrigation/')
+        self.assertEqual(guardado.status_code, 200)
+        self.assertEqual(SoilWaterState.objects.filter(planting=self.planting).count(), 30)
+        self.assertEqual(guardado.data, consulta.data)
+
+        self.client.get('/api/cultivo/plantings/calculate_irrigation_bulk/')
+        self.assertEqual(SoilWaterState.objects.count(), 30)
+
+    def test_historia_sale_de_los_checkpoints(self, _):
+        simulada = self.client.get(self.url + 'water_balance_history/').data
+        self.client.post(self.url + 'calculate_irrigation/')
+        SoilWaterState.objects.filter(planting=self.planting).update(water_mm=20.0)
+
+        historia = self.client.get(self.url + 'water_balance_history/').data
+        self.assertEqual([d['date'] for d in historia], [d['date'] for d in simulada])
+        self.assertEqual({d['water_level'] for d in historia}, {20.0})
+        self.assertEqual([d['rain'] for d in historia], [d['rain'] for d in simulada])
+
+    def test_historia_con_datos_faltantes(self, load):
+        load.side_effect = MissingDailyData("Falta ETo", date.today() - timedelta(days=3))
+        with self.assertLogs('django.request', 'WARNING'):
+            respuesta = self.client.get(self.url + 'water_balance_history/')
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertIn('solution', respuesta.data)
+
+
+class MigrationsTests(TransactionTestCase):
+    """
+    La base de pruebas se crea vacía y se migra completa antes de correr.
+    Aquí además se repite desde 0002 la carga de datos FAO (0003), que corre
+    con las señales conectadas.
+    """
+
+    def test_migrar_desde_una_base_sin_datos(self):
+        call_command('migrate', 'cultivo', '0002', verbosity=0)
+        Crop.objects.all().delete()
+        call_command('migrate', verbosity=0)
+
+        executor = MigrationExecutor(connection)
+        self.assertEqual(executor.migration_plan(executor.loader.graph.leaf_nodes()), [])
+        self.assertTrue(Crop.objects.filter(user__isnull=True).exists())
+        self.assertFalse(SoilWaterState.objects.exists())
@@ -0,0 +1,257 @@
+from datetime import date
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from precipitaciones.dependable_rain import FALLBACK_RATIO
+
+from . import dual_kc
+from .growth_curves import get_growth_curve
+
+# =============================================================================
+#  MOTOR DE BALANCE HÍDRICO (Una sola fuente de verdad)
+# =============================================================================
+# Lo usan `calculate_irrigation` (recomendación de hoy) y `water_balance_history`
+# (gráfica). Recibe las series diarias ya cargadas (ETo, lluvia, riego) como
+# arrays lotes × días y devuelve la línea de tiempo completa del tanque.
+#
+# Todo lo que no depende del día anterior (raíz, límites del suelo, Kc, lluvia
+# efectiva) se calcula de una vez con numpy; Kc y raíz salen de la curva
+# precalculada de cada cultivo. Solo la recursión del tanque
+# avanza día a día, y cada paso procesa todos los lotes a la vez.
+#
+# IrrigationSettings.crop_coefficient_mode elige el coeficiente:
+#   SINGLE: ETc = Kc · ETo (FAO-56 Cap. 6)
+#   DUAL:   ETc = (Kcb + Ke) · ETo (FAO-56 Cap. 7, ver dual_kc). La capa
+#           evaporable (De) avanza en el mismo ciclo que el tanque.
+
+# Fallbacks de suelo y cultivo (mismos valores que usaban las vistas)
+DEFAULT_CC = 25.0
+DEFAULT_PMP = 12.0
+DEFAULT_DA = 1.2
+DEFAULT_P = 0.5
+
+
+class WaterBalanceTimeline(NamedTuple):
+    """Estado diario del tanque. Cada array es lotes × días (mm salvo indicación)."""
+    dates: np.ndarray           # datetime64[D], (días,)
+    root_depth: np.ndarray      # m
+    field_capacity: np.ndarray  # tanque lleno
+    wilting_point: np.ndarray   # tanque vacío
+    taw: np.ndarray             # agua útil total
+    critical: np.ndarray        # umbral crítico (p)
+    kc: np.ndarray
+    eto: np.ndarray
+    etc: np.ndarray
+    rain: np.ndarray            # lluvia bruta
+    rain_eff: np.ndarray
+    irrigation: np.ndarray      # riego bruto aplicado
+    irrigation_net: np.ndarray
+    water: np.ndarray           # agua en el suelo al final del día
+    drainage: np.ndarray        # exceso sobre capacidad de campo
+    kcb: np.ndarray             # Kc dual: basal (en SINGLE, igual a kc)
+    ke: np.ndarray              # Kc dual: evaporación (en SINGLE, 0)
+    evaporation_depletion: np.ndarray  # Kc dual: De de la capa evaporable (en SINGLE, NaN)
+    wetted_fraction: np.ndarray        # Kc dual: fw del último mojado (en SINGLE, NaN)
+
+
+def date_range(start_date: date, days: int) -> np.ndarray:
+    return np.datetime64(start_date, 'D') + np.arange(max(days, 0))
+
+
+def _ages(plantings, dates: np.ndarray) -> np.ndarray:
+    """Edad (días, >= 0) de cada siembra en cada fecha: lotes × días."""
+    siembras = np.array([np.datetime64(p.fecha_siembra, 'D') for p in plantings])
+    return np.maximum((dates[None, :] - siembras[:, None]).astype(int), 0)
+
+
+def _columna(valores) -> np.ndarray:
+    return np.asarray(valores, dtype=float)[:, None]
+
+
+def _curve_values(plantings, dates: np.ndarray, *campos):
+    """Campos de la curva precalculada de cada cultivo, lotes × días cada uno."""
+    ages = _ages(plantings, dates)
+    valores = [np.empty(ages.shape) for _ in campos]
+    for i, planting in enumerate(plantings):
+        curve = get_growth_curve(planting.crop)
+        idx = curve.at(ages[i])
+        for arr, campo in zip(valores, campos):
+            arr[i] = getattr(curve, campo)[idx]
+    return valores
+
+
+def crop_curves(plantings, dates: np.ndarray):
+    """
+    Kc y profundidad radicular (m) por día, lotes × días, leídos de la curva
+    precalculada de cada cultivo (ver growth_curves). Retorna (kc, rd).
+    """
+    kc, rd = _curve_values(plantings, dates, 'kc', 'root_depth')
+    return kc, rd
+
+
+def dual_curves(plantings, dates: np.ndarray):
+    """Kcb y altura del cultivo (m) por día, lotes × días. Retorna (kcb, altura)."""
+    kcb, height = _curve_values(plantings, dates, 'kcb', 'height')
+    return kcb, height
+
+
+def soil_columns(plantings):
+    """CC, PMP (% Vol) y densidad aparente de cada lote como columnas (lotes, 1)."""
+    soils = [p.soil for p in plantings]
+    cc = _columna([s.capacidad_campo or DEFAULT_CC for s in soils])
+    pmp = _columna([s.punto_marchitez or DEFAULT_PMP for s in soils])
+    da = _columna([s.densidad_aparente or DEFAULT_DA for s in soils])
+    return cc, pmp, da
+
+
+def day_limits(plantings, dates: np.ndarray):
+    """
+    Profundidad radicular y límites del tanque por día (lotes × días).
+    Retorna (rd, l_cc, l_pmp, taw, l_crit).
+    """
+    _, rd = crop_curves(plantings, dates)
+    cc, pmp, da = soil_columns(plantings)
+    p = _columna([pl.crop.agotam_critico or DEFAULT_P for pl in plantings])
+
+    l_cc = (cc / 100) * da * rd * 1000    # Tanque Lleno
+    l_pmp = (pmp / 100) * da * rd * 1000  # Tanque Vacío
+    taw = l_cc - l_pmp                    # Agua Útil
+    l_crit = l_cc - taw * p               # Umbral Crítico (p)
+    return rd, l_cc, l_pmp, taw, l_crit
+
+
+def effective_rain(rain: np.ndarray, method: str, dates: np.ndarray, dependable_ratios: Optional[dict] = None) -> np.ndarray:
+    """
+    Lluvia efectiva según IrrigationSettings.effective_rain_method:
+    FIXED (80%), USDA (SCS) o DEPENDABLE (fracción FAO mensual de la estación).
+    """
+    rain = np.asarray(rain, dtype=float)
+    if method == 'FIXED':
+        return rain * 0.80
+    if method == 'USDA':
+        return np.where(rain < 250, rain * (125 - 0.2 * rain) / 125, 125 + 0.1 * rain)
+    if method == 'DEPENDABLE' and dependable_ratios is not None:
+        meses = dates.astype('datetime64[M]').astype(int) % 12 + 1
+        ratios = np.array([dependable_ratios[m] for m in range(1, 13)])
+        return rain * ratios[meses - 1]
+    return rain * FALLBACK_RATIO
+
+
+def simulate(plantings: Sequence, settings_obj, start_date: date, eto, rain, irrigation,
+             dependable_ratios: Optional[dict] = None, initial_water=None,
+             start_offsets=None, initial_evaporation=None, initial_wetted=None) -> WaterBalanceTimeline:
+    """
+    Balance hídrico diario desde `start_date` para varias siembras a la vez.
+
+    - `eto`, `rain`, `irrigation`: arrays lotes × días sin huecos (las vistas
+      deciden qué hacer con los datos faltantes antes de llamar). Una serie
+      1-D (ej. la lluvia de la estación) se comparte entre todos los lotes.
+    - `initial_water`: agua por lote al final del día anterior a su inicio
+      (checkpoint); NaN o None = arranca con el suelo a capacidad de campo.
+    - `initial_evaporation`, `initial_wetted`: De y fw del checkpoint (solo
+      modo DUAL); NaN o None = capa superficial recién mojada (De = 0, fw = 1).
+    - `start_offsets`: día de la ventana en que arranca cada lote (ej. siembras
+      recientes). Antes de su inicio el lote no se simula (agua = NaN).
+    - Si la raíz crece, el suelo nuevo que explora entra a capacidad de campo.
+    """
+    lotes = len(plantings)
+    eto = np.atleast_2d(np.asarray(eto, dtype=float))
+    dates = date_range(start_date, eto.shape[1])
+    eto = np.broadcast_to(eto, (lotes, dates.size))
+    rain = np.broadcast_to(np.asarray(rain, dtype=float), (lotes, dates.size))
+    irrigation = np.broadcast_to(np.asarray(irrigation, dtype=float), (lotes, dates.size))
+    offsets = np.zeros(lotes, dtype=int) if start_offsets is None else np.asarray(start_offsets, dtype=int)
+
+    rd, l_cc, l_pmp, taw, l_crit = day_limits(plantings, dates)
+    kc, _ = crop_curves(plantings, dates)
+    rain_eff = effective_rain(rain, settings_obj.effective_rain_method, dates, dependable_ratios)
+    irrigation_net = irrigation * settings_obj.system_efficiency
+
+    # Kc dual: términos fijos de la capa evaporable; solo De queda para el ciclo
+    dual = settings_obj.crop_coefficient_mode == 'DUAL'
+    evaporation = np.full((lotes, dates.size), np.nan)
+    if dual:
+        kcb, height = dual_curves(plantings, dates)
+        cc, pmp, da = soil_columns(plantings)
+        dual_inputs = dual_kc.prepare(
+            kcb, height, cc, pmp, da, [p.soil.textura for p in plantings],
+            rain, irrigation, settings_obj.irrigation_type,
+            initial_fw=None if initial_wetted is None else np.broadcast_to(np.asarray(initial_wetted, dtype=float), (lotes,)),
+        )
+        wetted = dual_inputs.fw
+        ke = np.zeros((lotes, dates.size))
+        de = np.zeros(lotes) if initial_evaporation is None else \
+            np.nan_to_num(np.broadcast_to(np.asarray(initial_evaporation, dtype=float), (lotes,)), nan=0.0)
+        etc = np.empty((lotes, dates.size))
+    else:
+        kcb, ke, wetted = kc, np.zeros((lotes, dates.size)), np.full((lotes, dates.size), np.nan)
+        etc = eto * kc
+    entradas = rain_eff + irrigation_net
+
+    initial = np.full(lotes, np.nan) if initial_water is None else \
+        np.broadcast_to(np.asarray(initial_water, dtype=float), (lotes,))
+    con_checkpoint = ~np.isnan(initial)
+
+    # Crecimiento radicular: agua que entra con el suelo nuevo. Un lote que
+    # arranca a capacidad de campo no suma nada el día de inicio; uno que
+    # retoma un checkpoint sí (respecto al día anterior).
+    crecimiento = np.maximum(np.diff(l_cc, axis=1, prepend=l_cc[:, :1]), 0.0)
+    if dates.size and con_checkpoint.any():
+        _, cc_previo, _, _, _ = day_limits(plantings, dates[:1] - 1)
+        crecimiento[:, 0] = np.maximum(l_cc[:, 0] - cc_previo[:, 0], 0.0)
+    dias = np.arange(dates.size)[None, :]
+    activo = dias >= offsets[:, None]
+    crecimiento[(dias < offsets[:, None]) | ((dias == offsets[:, None]) & ~con_checkpoint[:, None])] = 0.0
+
+    water = np.full((lotes, dates.size), np.nan)
+    drainage = np.zeros((lotes, dates.size))
+    if dates.size:
+        inicio = np.minimum(offsets, dates.size - 1)
+        current = np.where(con_checkpoint, initial, l_cc[np.arange(lotes), inicio])
+    else:
+        current = initial.copy()
+
+    for d in range(dates.size):
+        if dual:
+            ke_d, de_nuevo = dual_kc.evaporation_step(de, d, dual_inputs, eto[:, d], rain_eff[:, d], irrigation_net[:, d])
+            de = np.where(activo[:, d], de_nuevo, de)
+            ke[:, d] = ke_d
+            etc[:, d] = (kcb[:, d] + ke_d) * eto[:, d]
+            evaporation[activo[:, d], d] = de[activo[:, d]]
+        nuevo = current + crecimiento[:, d] + (entradas[:, d] - etc[:, d])
+        drenaje = np.maximum(nuevo - l_cc[:, d], 0.0)
+        nuevo = np.maximum(np.minimum(nuevo, l_cc[:, d]), l_pmp[:, d])
+        current = np.where(activo[:, d], nuevo, current)
+        drainage[:, d] = np.where(activo[:, d], drenaje, 0.0)
+        water[activo[:, d], d] = current[activo[:, d]]
+
+    if dual:
+        kc = kcb + ke
+    return WaterBalanceTimeline(
+        dates=dates, root_depth=rd, field_capacity=l_cc, wilting_point=l_pmp, taw=taw,
+        critical=l_crit, kc=kc, eto=eto, etc=etc, rain=rain, rain_eff=rain_eff,
+        irrigation=irrigation, irrigation_net=irrigation_net, water=water, drainage=drainage,
+        kcb=kcb, ke=ke, evaporation_depletion=evaporation, wetted_fraction=wetted,
+    )
+
+
+def diagnose(current_water: float, limit_cc: float, limit_pmp: float, tam: float, limit_critical: float):
+    """
+    Diagnóstico del estado actual del suelo.
+    Retorna (riego_sugerido_neto, déficit, estado, mensaje).
+    """
+    deficit_neto = limit_cc - current_water
+
+    # Porcentaje de Agotamiento
+    agotamiento = 100 - ((current_water - limit_pmp) / tam * 100)
+
+    if current_water < limit_critical:
+        return deficit_neto, deficit_neto, "Estrés Hídrico", \
+            f"¡URGENTE! Nivel crítico ({round(agotamiento)}% agotado). Reponer lámina para recuperar CC."
+    if deficit_neto > 0:
+        if deficit_neto < 3.0:
+            return 0.0, deficit_neto, "Normal (Déficit Leve)", \
+                f"Suelo levemente seco (-{round(deficit_neto, 2)} mm), no es necesario regar hoy."
+        return deficit_neto, deficit_neto, "Normal", "Nivel óptimo, pero cabe agua. Puedes regar para saturar."
+    return 0.0, deficit_neto, "Saturado", "Suelo lleno. NO regar."
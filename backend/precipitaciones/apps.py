@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PrecipitacionesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "precipitaciones"
+
+    def ready(self):
+        # Importar las señales
+        import precipitaciones.signals
@@ -0,0 +1,292 @@
+import glob
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .earth_engine import CHIRPS_DAILY, get_ee
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+#  FUENTES DE DATOS CHIRPS (Intercambiables por despliegue)
+# =============================================================================
+# Todas las fuentes exponen el mismo contrato:
+#   extraer({clave: (lat, lon)}, start_date, end_date)
+#       -> {clave: [('YYYY-MM-DD', mm | None), ...]}   (end_date exclusivo, como GEE)
+# CHIRPS_BACKEND = 'gee' (Google Earth Engine) | 'local' (rásters en CHIRPS_LOCAL_DIR)
+
+
+class ChirpsBackend(ABC):
+    name = None
+
+    @abstractmethod
+    def extraer(self, puntos, start_date, end_date):
+        """Serie diaria de cada punto en [start_date, end_date) (ver contrato arriba)."""
+
+
+class EarthEngineChirpsBackend(ChirpsBackend):
+    """
+    Extracción en Google Earth Engine. Todas las estaciones viajan en una sola
+    FeatureCollection y cada imagen diaria se reduce con `reduceRegions`, así
+    que el costo es una llamada a GEE por bloque de fechas, no una por estación.
+    """
+    name = 'gee'
+
+    # getInfo() de Earth Engine devuelve como máximo 5000 elementos por llamada
+    MAX_FEATURES = 5000
+
+    def extraer(self, puntos, start_date, end_date):
+        if not puntos:
+            return {}
+
+        ee = get_ee()
+
+        # Earth Engine usa [LONGITUD, LATITUD]
+        estaciones = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Point([f_lon, f_lat]), {'key': str(clave)})
+            for clave, (f_lat, f_lon) in puntos.items()
+        ])
+        claves = {str(clave): clave for clave in puntos}
+
+        def reducir_imagen(img):
+            date = img.date().format('YYYY-MM-dd')
+            tabla = img.select('precipitation').reduceRegions(
+                collection=estaciones,
+                reducer=ee.Reducer.mean().setOutputs(['precipitation']),
+                scale=5000
+            )
+            # Sin geometría: solo viajan clave, fecha y valor
+            return tabla.map(lambda f: ee.Feature(None, {
+                'key': f.get('key'), 'date': date, 'precipitation': f.get('precipitation')
+            }))
+
+        # Bloques de fechas para no superar el límite de getInfo (estaciones × días)
+        dias_por_bloque = max(1, self.MAX_FEATURES // len(puntos))
+        resultados = {clave: [] for clave in puntos}
+
+        bloque_inicio = start_date
+        while bloque_inicio < end_date:
+            bloque_fin = min(bloque_inicio + timedelta(days=dias_por_bloque), end_date)
+            ee_start = bloque_inicio.strftime('%Y-%m-%d')
+            ee_end = bloque_fin.strftime('%Y-%m-%d')
+            print(f"🛰️ Consultando CHIRPS ({ee_start} a {ee_end}) para {len(puntos)} estación(es)...")
+
+            chirps = ee.ImageCollection(CHIRPS_DAILY) \
+                .filterDate(ee_start, ee_end) \
+                .filterBounds(estaciones)
+
+            # Ejecutar en Google
+            try:
+                data = chirps.map(reducir_imagen).flatten().getInfo()
+            except Exception as e:
+                raise Exception(f"Error interno GEE: {e}")
+
+            for feature in data.get('features', []):
+                props = feature['properties']
+                clave = claves.get(props.get('key'))
+                if clave is not None:
+                    resultados[clave].append((props.get('date'), props.get('precipitation')))
+
+            bloque_inicio = bloque_fin
+
+        for valores in resultados.values():
+            valores.sort(key=lambda v: v[0])
+        return resultados
+
+
+class LocalRasterChirpsBackend(ChirpsBackend):
+    """
+    Lectura de rásters CHIRPS diarios guardados en disco (CHIRPS_LOCAL_DIR),
+    sin red ni credenciales. Formatos aceptados (nombres oficiales de CHC):
+
+    - NetCDF anual:   chirps-v2.0.2021.days_p05.nc   (requiere netCDF4)
+    - GeoTIFF diario: chirps-v2.0.2021.01.31.tif     (requiere rasterio)
+
+    Solo se leen los píxeles de las estaciones: en NetCDF una lectura
+    [días, fila, columna] por estación (HDF5 trae solo los chunks que la
+    contienen); en GeoTIFF una ventana 1×1 por archivo. Los archivos abiertos
+    y sus grillas se reutilizan entre llamadas.
+    """
+    name = 'local'
+
+    NODATA = -9999.0
+    MAX_OPEN_FILES = 32
+
+    def __init__(self, directory=None):
+        self.directory = directory or getattr(settings, 'CHIRPS_LOCAL_DIR', '')
+        if not self.directory or not os.path.isdir(self.directory):
+            raise Exception(f"CHIRPS_LOCAL_DIR no existe o no está configurado: '{self.directory}'")
+        self._handles = OrderedDict()
+        self._coords = {}
+        # netCDF4/HDF5 no es thread-safe: serializamos las lecturas
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    #  Archivos
+    # -------------------------------------------------------------------------
+    def _archivo_anual(self, year):
+        archivos = sorted(glob.glob(os.path.join(self.directory, f'*{year}*.nc')))
+        return archivos[0] if archivos else None
+
+    def _archivo_diario(self, day):
+        archivos = sorted(glob.glob(os.path.join(self.directory, f'*{day:%Y.%m.%d}*.tif')))
+        return archivos[0] if archivos else None
+
+    def _abrir(self, path):
+        """Handle abierto (LRU): abrir un NetCDF/GeoTIFF cuesta más que leer un píxel."""
+        if path in self._handles:
+            self._handles.move_to_end(path)
+            return self._handles[path]
+        # Archivo (re)abierto: sus ejes se vuelven a leer
+        self._coords = {k: v for k, v in self._coords.items() if k[0] != path}
+
+        if path.endswith('.nc'):
+            import netCDF4
+            ds = netCDF4.Dataset(path, 'r')
+        else:
+            import rasterio
+            ds = rasterio.open(path)
+        self._handles[path] = ds
+        if len(self._handles) > self.MAX_OPEN_FILES:
+            _, viejo = self._handles.popitem(last=False)
+            viejo.close()
+        return ds
+
+    def _limpiar(self, valores):
+        valores = np.ma.filled(np.ma.asarray(valores, dtype=float), np.nan)
+        valores[valores <= self.NODATA] = np.nan
+        return [None if np.isnan(v) else round(float(v), 4) for v in valores]
+
+    # -------------------------------------------------------------------------
+    #  NetCDF anual
+    # -------------------------------------------------------------------------
+    def _coordenadas(self, path, ds, name):
+        """Ejes lat/lon del archivo: se leen una sola vez."""
+        if (path, name) not in self._coords:
+            self._coords[(path, name)] = np.asarray(ds.variables[name][:], dtype=float)
+        return self._coords[(path, name)]
+
+    @staticmethod
+    def _indice_cercano(coords, valor):
+        """
+        Índice del píxel que contiene `valor`, o None si el punto queda a más
+        de medio píxel fuera del eje (fuera de la extensión del archivo).
+        """
+        medio = abs(float(coords[1] - coords[0])) / 2 if coords.size > 1 else 0.0
+        if valor < coords.min() - medio or valor > coords.max() + medio:
+            return None
+        return int(np.abs(coords - valor).argmin())
+
+    def _leer_netcdf(self, path, puntos, year_start, year_end):
+        ds = self._abrir(path)
+        lat_name = 'latitude' if 'latitude' in ds.variables else 'lat'
+        lon_name = 'longitude' if 'longitude' in ds.variables else 'lon'
+        lats = self._coordenadas(path, ds, lat_name)
+        lons = self._coordenadas(path, ds, lon_name)
+        precip = ds.variables['precip']
+
+        # Días del archivo: CHIRPS anual empieza el 1 de enero
+        primer_dia = date(year_start.year, 1, 1)
+        i0 = (year_start - primer_dia).days
+        i1 = min((year_end - primer_dia).days, precip.shape[0])
+        fechas = [(primer_dia + timedelta(days=i)).isoformat() for i in range(i0, i1)]
+
+        resultados = {}
+        for clave, (f_lat, f_lon) in puntos.items():
+            fila = self._indice_cercano(lats, f_lat)
+            col = self._indice_cercano(lons, f_lon)
+            if fila is None or col is None:
+                # Fuera de la extensión del archivo: sin dato (igual que en GeoTIFF)
+                resultados[clave] = [(fecha, None) for fecha in fechas]
+                continue
+            resultados[clave] = list(zip(fechas, self._limpiar(precip[i0:i1, fila, col])))
+        return resultados
+
+    # -------------------------------------------------------------------------
+    #  GeoTIFF diario
+    # -------------------------------------------------------------------------
+    def _leer_geotiff(self, path, puntos):
+        from rasterio.windows import Window
+        ds = self._abrir(path)
+        resultados = {}
+        for clave, (f_lat, f_lon) in puntos.items():
+            fila, col = ds.index(f_lon, f_lat)
+            if not (0 <= fila < ds.height and 0 <= col < ds.width):
+                resultados[clave] = None
+                continue
+            pixel = ds.read(1, window=Window(col, fila, 1, 1), masked=True)
+            resultados[clave] = self._limpiar(pixel.ravel())[0]
+        return resultados
+
+    # -------------------------------------------------------------------------
+    def extraer(self, puntos, start_date, end_date):
+        if not puntos:
+            return {}
+        resultados = {clave: [] for clave in puntos}
+        faltantes = []
+
+        with self._lock:
+            year = start_date.year
+            while year <= end_date.year:
+                tramo_inicio = max(start_date, date(year, 1, 1))
+                tramo_fin = min(end_date, date(year + 1, 1, 1))  # exclusivo
+                if tramo_inicio >= tramo_fin:
+                    break
+
+                anual = self._archivo_anual(year)
+                if anual:
+                    leidos = self._leer_netcdf(anual, puntos, tramo_inicio, tramo_fin)
+                    for clave, valores in leidos.items():
+                        resultados[clave].extend(valores)
+                    # Archivo anual incompleto (año en curso): días finales sin dato
+                    n_leidos = len(next(iter(leidos.values())))
+                    faltantes.extend(
+                        tramo_inicio + timedelta(days=i) for i in range(n_leidos, (tramo_fin - tramo_inicio).days)
+                    )
+                else:
+                    day = tramo_inicio
+                    while day < tramo_fin:
+                        diario = self._archivo_diario(day)
+                        if diario:
+                            for clave, mm in self._leer_geotiff(diario, puntos).items():
+                                resultados[clave].append((day.isoformat(), mm))
+                        else:
+                            faltantes.append(day)
+                        day += timedelta(days=1)
+                year += 1
+
+        if faltantes:
+            # Los días sin archivo quedan como huecos (se vuelven a pedir en la próxima consulta)
+            logger.warning(
+                f"CHIRPS local: {len(faltantes)} día(s) sin archivo en {self.directory} "
+                f"({faltantes[0]:%Y-%m-%d}..{faltantes[-1]:%Y-%m-%d})"
+            )
+        return resultados
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+BACKENDS = {
+    'gee': EarthEngineChirpsBackend,
+    'local': LocalRasterChirpsBackend,
+}
+
+
+def get_chirps_backend():
+    """Fuente CHIRPS configurada (CHIRPS_BACKEND), una instancia por proceso."""
+    global _backend
+    nombre = getattr(settings, 'CHIRPS_BACKEND', 'gee')
+    if _backend is None or _backend.name != nombre:
+        with _backend_lock:
+            if _backend is None or _backend.name != nombre:
+                if nombre not in BACKENDS:
+                    raise Exception(f"CHIRPS_BACKEND inválido: '{nombre}'. Opciones: {', '.join(BACKENDS)}")
+                _backend = BACKENDS[nombre]()
+    return _backend
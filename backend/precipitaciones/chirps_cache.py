@@ -0,0 +1,152 @@
+import math
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import ChirpsDailyCache
+
+# La serie cacheada de un píxel cambió (días nuevos o valores corregidos).
+# kwargs: pixel, start_date (primer día que cambió).
+chirps_pixel_changed = Signal()
+
+
+class ChirpsPixelCache:
+    """
+    Caché en base de datos de la serie diaria CHIRPS por píxel.
+
+    - Un punto se ubica en su píxel de 0.05°: todas las estaciones del mismo
+      píxel comparten la serie.
+    - Solo se descargan los tramos faltantes; huecos cortos se piden junto al
+      tramo vecino (una llamada en vez de dos).
+    - Los días dentro de CHIRPS_PROVISIONAL_DAYS (datos preliminares) se
+      vuelven a pedir cuando su descarga tiene más de CHIRPS_REFRESH_HOURS.
+    """
+
+    PIXEL_SIZE = 0.05
+    ORIGIN_LAT = -50.0
+    ORIGIN_LON = -180.0
+
+    # Huecos menores a esto se piden junto con el rango vecino
+    MERGE_GAP_DAYS = 30
+
+    # Descargas en curso por píxel: dos vistas simultáneas no descargan dos
+    # veces, y píxeles distintos no se esperan entre sí (ver single_flight).
+    _in_flight = {}
+    _in_flight_lock = threading.Lock()
+
+    def __init__(self, provisional_days: int = None, refresh_hours: float = None):
+        self.provisional_days = provisional_days if provisional_days is not None else getattr(settings, 'CHIRPS_PROVISIONAL_DAYS', 60)
+        self.refresh_hours = refresh_hours if refresh_hours is not None else getattr(settings, 'CHIRPS_REFRESH_HOURS', 24)
+
+    @classmethod
+    def pixel(cls, latitude: float, longitude: float) -> Tuple[int, int]:
+        """Píxel CHIRPS que contiene el punto (fila, columna)."""
+        return (
+            math.floor((float(latitude) - cls.ORIGIN_LAT) / cls.PIXEL_SIZE),
+            math.floor((float(longitude) - cls.ORIGIN_LON) / cls.PIXEL_SIZE),
+        )
+
+    @classmethod
+    def center(cls, pixel: Tuple[int, int]) -> Tuple[float, float]:
+        """Centro del píxel (lat, lon): la consulta canónica para toda estación del píxel."""
+        return (
+            cls.ORIGIN_LAT + (pixel[0] + 0.5) * cls.PIXEL_SIZE,
+            cls.ORIGIN_LON + (pixel[1] + 0.5) * cls.PIXEL_SIZE,
+        )
+
+    @classmethod
+    @contextmanager
+    def single_flight(cls, pixel: Tuple[int, int]):
+        """
+        Un solo hilo a la vez por píxel. Quien llega mientras otro descarga ese
+        píxel espera a que termine y vuelve a intentar (ya encontrará la caché
+        llena). La entrada del píxel se borra al salir.
+        """
+        while True:
+            with cls._in_flight_lock:
+                en_curso = cls._in_flight.get(pixel)
+                if en_curso is None:
+                    terminado = cls._in_flight[pixel] = threading.Event()
+                    break
+            en_curso.wait()
+        try:
+            yield
+        finally:
+            with cls._in_flight_lock:
+                del cls._in_flight[pixel]
+            terminado.set()
+
+    def provisional_since(self) -> date:
+        return timezone.now().date() - timedelta(days=self.provisional_days)
+
+    def load(self, pixel: Tuple[int, int], start_date: date, end_date: date) -> Tuple[Dict[str, float], set]:
+        """
+        Días cacheados en [start_date, end_date): ({'YYYY-MM-DD': mm | None}, {fechas vencidas}).
+        """
+        stale_before = timezone.now() - timedelta(hours=self.refresh_hours)
+        rows = ChirpsDailyCache.objects.filter(
+            pixel_row=pixel[0], pixel_col=pixel[1], date__gte=start_date, date__lt=end_date
+        ).values_list('date', 'precipitation_mm', 'is_provisional', 'fetched_at')
+
+        cached, stale = {}, set()
+        for day, mm, provisional, fetched_at in rows:
+            cached[day.isoformat()] = mm
+            if provisional and fetched_at < stale_before:
+                stale.add(day.isoformat())
+        return cached, stale
+
+    def missing_ranges(self, cached: Dict, stale: set, start_date: date, end_date: date) -> List[Tuple[date, date]]:
+        """Tramos [inicio, fin) a descargar (faltantes o provisionales vencidos)."""
+        ranges = []
+        curr = start_date
+        while curr < end_date:
+            key = curr.isoformat()
+            if key not in cached or key in stale:
+                if ranges and (curr - ranges[-1][1]).days < self.MERGE_GAP_DAYS:
+                    ranges[-1] = (ranges[-1][0], curr + timedelta(days=1))
+                else:
+                    ranges.append((curr, curr + timedelta(days=1)))
+            curr += timedelta(days=1)
+        return ranges
+
+    @transaction.atomic
+    def store(self, pixel: Tuple[int, int], valores: List[Tuple[str, float]]) -> List[date]:
+        """
+        Upsert de los días descargados [(fecha_str, mm)] en un solo lote.
+        Devuelve los días nuevos o con otro valor; si hay alguno se emite
+        chirps_pixel_changed. Re-descargar provisionales iguales no cuenta.
+        """
+        if not valores:
+            return []
+        dias = [(date.fromisoformat(fecha_str), mm) for fecha_str, mm in valores]
+        previos = dict(ChirpsDailyCache.objects.filter(
+            pixel_row=pixel[0], pixel_col=pixel[1], date__in=[day for day, _ in dias]
+        ).values_list('date', 'precipitation_mm'))
+        cambiados = [day for day, mm in dias if day not in previos or previos[day] != mm]
+
+        provisional_since = self.provisional_since()
+        objs = [
+            ChirpsDailyCache(
+                pixel_row=pixel[0],
+                pixel_col=pixel[1],
+                date=day,
+                precipitation_mm=mm,
+                is_provisional=day >= provisional_since,
+            )
+            for day, mm in dias
+        ]
+        ChirpsDailyCache.objects.bulk_create(
+            objs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['pixel_row', 'pixel_col', 'date'],
+            update_fields=['precipitation_mm', 'is_provisional', 'fetched_at'],
+        )
+        if cambiados:
+            chirps_pixel_changed.send(sender=ChirpsDailyCache, pixel=pixel, start_date=min(cambiados))
+        return cambiados
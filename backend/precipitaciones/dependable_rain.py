@@ -0,0 +1,172 @@
+import warnings
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .chirps_cache import ChirpsPixelCache
+from .models import ChirpsDailyCache, DependableRainFit, PrecipitationRecord
+
+# =============================================================================
+#  LLUVIA CONFIABLE (FAO / AGLW)
+# =============================================================================
+# A partir de la historia de la estación (registros propios y, de respaldo, la
+# caché CHIRPS de su píxel) se arma una matriz años × 12 de totales mensuales.
+# Por cada mes se toma la distribución empírica (posición de Weibull m/(n+1)):
+#   - P80: total superado 4 de cada 5 años (80% de excedencia)
+#   - P50: total superado 1 de cada 2 años (mediana)
+# La lluvia efectiva confiable del mes es la fórmula FAO/AGLW sobre P80:
+#   Pe = 0.6·P - 10   (P <= 70 mm/mes)
+#   Pe = 0.8·P - 24   (P >  70 mm/mes)
+# y la fracción diaria que usa el balance es ratio = Pe / promedio mensual,
+# acotada a [0, 1]. Meses sin historia suficiente usan FALLBACK_RATIO.
+
+FALLBACK_RATIO = 0.75
+
+# Un mes cuenta solo si tiene al menos esta fracción de días con dato
+MIN_MONTH_COVERAGE = 0.9
+
+EXCEEDANCE_DEPENDABLE = 0.8
+EXCEEDANCE_NORMAL = 0.5
+
+
+def fao_dependable_effective(p_monthly):
+    """Fórmula FAO/AGLW (mm/mes), vectorizada. Nunca negativa."""
+    p = np.asarray(p_monthly, dtype=float)
+    pe = np.where(p <= 70, 0.6 * p - 10, 0.8 * p - 24)
+    return np.maximum(pe, 0.0)
+
+
+def monthly_totals_matrix(fechas, valores, min_coverage: float = MIN_MONTH_COVERAGE) -> Tuple[np.ndarray, int]:
+    """
+    Totales mensuales (años × 12) de una serie diaria (fechas date o
+    'YYYY-MM-DD'; valores nulos o negativos se ignoran). Los meses sin datos
+    o con menos de `min_coverage` de días con dato quedan en NaN.
+    Retorna (matriz, primer_año).
+    """
+    fechas = np.asarray(fechas, dtype='datetime64[D]')
+    mm = np.asarray(valores, dtype=float)
+    validos = ~np.isnan(mm) & (mm >= 0)
+    fechas, mm = fechas[validos], mm[validos]
+    if fechas.size == 0:
+        return np.full((0, 12), np.nan), 0
+
+    meses = fechas.astype('datetime64[M]').astype(np.int64)  # meses desde 1970-01
+    primer_mes = (meses.min() // 12) * 12
+    fila = (meses - primer_mes) // 12
+    col = meses % 12
+    n_years = int(fila.max()) + 1
+
+    totales = np.zeros((n_years, 12))
+    dias = np.zeros((n_years, 12))
+    np.add.at(totales, (fila, col), mm)
+    np.add.at(dias, (fila, col), 1)
+
+    # Días de cada mes de la grilla (bisiestos incluidos)
+    grilla = np.datetime64('1970-01', 'M') + primer_mes + np.arange(n_years * 12)
+    dias_mes = ((grilla + 1).astype('datetime64[D]') - grilla.astype('datetime64[D]')).astype(int)
+
+    totales[(dias == 0) | (dias < min_coverage * dias_mes.reshape(n_years, 12))] = np.nan
+    return totales, 1970 + int(primer_mes // 12)
+
+
+def fit_dependable_rain(totales: np.ndarray, min_years: int = None) -> list:
+    """
+    Ajuste por mes sobre la matriz de totales (todas las columnas a la vez).
+    Retorna [{'month', 'years', 'mean', 'p80', 'p50', 'pe_dependable', 'ratio'}].
+    """
+    min_years = min_years if min_years is not None else getattr(settings, 'DEPENDABLE_RAIN_MIN_YEARS', 3)
+    n = np.sum(~np.isnan(totales), axis=0)
+
+    with warnings.catch_warnings():
+        # Meses sin ningún año completo: NaN esperado
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(totales, axis=0) if totales.size else np.full(12, np.nan)
+        # Excedencia p = cuantil (1 - p) de la distribución empírica de Weibull
+        p80, p50 = (
+            np.nanquantile(totales, [1 - EXCEEDANCE_DEPENDABLE, 1 - EXCEEDANCE_NORMAL], axis=0, method='weibull')
+            if totales.size else np.full((2, 12), np.nan)
+        )
+
+    pe = fao_dependable_effective(p80)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.clip(np.where(mean > 0, pe / mean, 0.0), 0.0, 1.0)
+
+    suficiente = n >= max(min_years, 1)
+    ratio = np.where(suficiente, ratio, FALLBACK_RATIO)
+
+    def _r(valor):
+        return round(float(valor), 2) if not np.isnan(valor) else None
+
+    return [
+        {
+            'month': m + 1,
+            'years': int(n[m]),
+            'mean': _r(mean[m]),
+            'p80': _r(p80[m]),
+            'p50': _r(p50[m]),
+            'pe_dependable': _r(pe[m]) if suficiente[m] else None,
+            'ratio': round(float(ratio[m]), 4),
+            'fallback': not bool(suficiente[m]),
+        }
+        for m in range(12)
+    ]
+
+
+def _serie_estacion(station, pixel):
+    """
+    Serie diaria de la estación: registros propios con prioridad y, donde no
+    hay, la caché CHIRPS del píxel (sin descargar nada).
+    """
+    serie = dict(
+        ChirpsDailyCache.objects.filter(pixel_row=pixel[0], pixel_col=pixel[1])
+        .exclude(precipitation_mm__isnull=True)
+        .values_list('date', 'precipitation_mm')
+    )
+    serie.update(PrecipitationRecord.objects.filter(station=station).values_list('date', 'precipitation_mm'))
+    fechas = list(serie)
+    return fechas, [serie[f] for f in fechas]
+
+
+def get_dependable_rain(station) -> dict:
+    """
+    Ajuste de lluvia confiable de la estación. Se lee de DependableRainFit y
+    solo se recalcula si fue invalidado (registros nuevos).
+    """
+    fit = DependableRainFit.objects.filter(station=station).first()
+    if fit is not None:
+        return fit.result_data
+
+    pixel = ChirpsPixelCache.pixel(station.latitude, station.longitude)
+    fechas, valores = _serie_estacion(station, pixel)
+    totales, primer_year = monthly_totals_matrix(fechas, valores)
+    years = int(np.sum(np.any(~np.isnan(totales), axis=1))) if totales.size else 0
+
+    result = {
+        'years': years,
+        'first_year': primer_year or None,
+        'last_year': primer_year + totales.shape[0] - 1 if totales.size else None,
+        'months': fit_dependable_rain(totales),
+    }
+    print(f"🌧️ Lluvia confiable ajustada para '{station.name}' ({years} años)")
+
+    DependableRainFit.objects.update_or_create(
+        station=station,
+        defaults={'pixel_row': pixel[0], 'pixel_col': pixel[1], 'years': years, 'result_data': result},
+    )
+    return result
+
+
+def dependable_rain_ratios(station) -> Dict[int, float]:
+    """{mes: fracción efectiva de la lluvia diaria}. Sin estación: FALLBACK_RATIO."""
+    if station is None:
+        return {m: FALLBACK_RATIO for m in range(1, 13)}
+    return {m['month']: m['ratio'] for m in get_dependable_rain(station)['months']}
+
+
+def invalidate(station_ids: Optional[Iterable[int]] = None, pixel: Optional[Tuple[int, int]] = None):
+    """Borra los ajustes de esas estaciones o de las estaciones en ese píxel."""
+    if station_ids is not None:
+        DependableRainFit.objects.filter(station_id__in=list(station_ids)).delete()
+    if pixel is not None:
+        DependableRainFit.objects.filter(pixel_row=pixel[0], pixel_col=pixel[1]).delete()
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from django.conf import settings
+
+# =============================================================================
+#  CONEXIÓN A GOOGLE EARTH ENGINE (Una sola vez por proceso)
+# =============================================================================
+# `import ee` y la autenticación cuestan ~1s. Se hacen en el primer uso real
+# (no al arrancar gunicorn ni en cada petición) y el resultado queda cacheado
+# para todo el worker. El candado evita que dos hilos autentiquen a la vez.
+
+CHIRPS_DAILY = 'UCSB-CHG/CHIRPS/DAILY'
+
+# Ruta al archivo JSON de la cuenta de servicio
+KEY_PATH = getattr(
+    settings, 'GEE_KEY_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ee-key.json')
+)
+SCOPES = ['https://www.googleapis.com/auth/earthengine']
+
+_lock = threading.Lock()
+_ee = None
+_state = {
+    'initialized': False,
+    'initialized_at': None,
+    'credentials': None,   # 'service_account' | 'default'
+    'init_ms': None,
+    'last_error': None,
+}
+
+
+def _initialize():
+    """Importa ee y autentica. Llamar siempre con _lock tomado."""
+    global _ee
+    started = time.monotonic()
+    import ee
+
+    if os.path.exists(KEY_PATH):
+        from google.oauth2.service_account import Credentials
+        print(f"🔑 Cargando credenciales GEE...")
+        credentials = Credentials.from_service_account_file(KEY_PATH, scopes=SCOPES)
+        ee.Initialize(credentials)
+        _state['credentials'] = 'service_account'
+    else:
+        print("⚠️ No se encontró ee-key.json")
+        ee.Initialize()
+        _state['credentials'] = 'default'
+
+    _ee = ee
+    _state.update({
+        'initialized': True,
+        'initialized_at': time.time(),
+        'init_ms': round((time.monotonic() - started) * 1000, 1),
+        'last_error': None,
+    })
+
+
+def get_ee():
+    """
+    Devuelve el módulo `ee` ya inicializado. Solo la primera llamada del
+    proceso importa y autentica; si falla, la siguiente vuelve a intentarlo.
+    """
+    if _ee is not None:
+        return _ee
+    with _lock:
+        if _ee is None:
+            try:
+                _initialize()
+            except Exception as e:
+                _state['last_error'] = str(e)
+                print(f"❌ Error Auth GEE: {e}")
+                raise Exception(f"Fallo de Autenticación GEE: {e}")
+    return _ee
+
+
+def reset():
+    """Olvida la sesión (ej. tras rotar ee-key.json). La próxima llamada re-autentica."""
+    global _ee
+    with _lock:
+        _ee = None
+        _state.update({'initialized': False, 'initialized_at': None, 'credentials': None, 'init_ms': None})
+
+
+def health(probe: bool = False) -> dict:
+    """
+    Estado de la conexión. Sin `probe` no toca la red (liveness). Con `probe`
+    inicializa si hace falta y hace una consulta mínima a CHIRPS (readiness).
+    """
+    status = dict(_state, key_file=os.path.exists(KEY_PATH), ready=_state['initialized'])
+    if not probe:
+        return status
+
+    started = time.monotonic()
+    try:
+        ee = get_ee()
+        ee.Image(ee.ImageCollection(CHIRPS_DAILY).first()).bandNames().getInfo()
+        status['ready'] = True
+    except Exception as e:
+        status['ready'] = False
+        status['last_error'] = str(e)
+    # La inicialización pudo ocurrir durante el probe
+    status.update(initialized=_state['initialized'], initialized_at=_state['initialized_at'],
+                  credentials=_state['credentials'], init_ms=_state['init_ms'])
+    status['probe_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return status
+
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precipitaciones', '0002_precipitationstudy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChirpsDailyCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pixel_row', models.IntegerField()),
+                ('pixel_col', models.IntegerField()),
+                ('date', models.DateField()),
+                ('precipitation_mm', models.FloatField(blank=True, null=True)),
+                ('is_provisional', models.BooleanField(default=False)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Caché CHIRPS',
+                'ordering': ['pixel_row', 'pixel_col', 'date'],
+                'unique_together': {('pixel_row', 'pixel_col', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precipitaciones', '0003_chirpsdailycache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DependableRainFit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pixel_row', models.IntegerField()),
+                ('pixel_col', models.IntegerField()),
+                ('years', models.IntegerField(default=0, help_text='Años con al menos un mes completo')),
+                ('result_data', models.JSONField(verbose_name='Ajuste Mensual')),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+                ('station', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dependable_rain_fit', to='precipitaciones.station')),
+            ],
+            options={
+                'verbose_name': 'Ajuste Lluvia Confiable',
+                'indexes': [models.Index(fields=['pixel_row', 'pixel_col'], name='precipitaci_pixel_r_028e2d_idx')],
+            },
+        ),
+    ]
@@ -99,4 +99,55 @@ class PrecipitationStudy(models.Model):
         verbose_name_plural = "Estudios Pluviométricos"
 
     def __str__(self):
-        return f"{self.name} ({self.created_at.date()})"
\ No newline at end of file
+        return f"{self.name} ({self.created_at.date()})"
+
+class ChirpsDailyCache(models.Model):
+    """
+    Caché persistente de CHIRPS: un registro por píxel (0.05°) y día.
+    Lo usa el análisis histórico "al vuelo": varias vistas de la misma
+    estación (o de estaciones en el mismo píxel) no vuelven a descargar.
+    """
+    # Índices del píxel CHIRPS (0.05° desde -50° lat, -180° lon)
+    pixel_row = models.IntegerField()
+    pixel_col = models.IntegerField()
+    date = models.DateField()
+
+    # Nulo = CHIRPS no tiene dato procesado ese día (también se cachea)
+    precipitation_mm = models.FloatField(null=True, blank=True)
+
+    # Días recientes: CHIRPS preliminar aún puede cambiar, se vuelven a descargar
+    is_provisional = models.BooleanField(default=False)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('pixel_row', 'pixel_col', 'date')
+        ordering = ['pixel_row', 'pixel_col', 'date']
+        verbose_name = "Caché CHIRPS"
+
+    def __str__(self):
+        return f"Píxel ({self.pixel_row}, {self.pixel_col}) - {self.date}"
+
+
+class DependableRainFit(models.Model):
+    """
+    Ajuste de lluvia confiable (FAO) de una estación: totales mensuales al
+    80% y 50% de excedencia y la fracción efectiva de la lluvia diaria por
+    mes. Se recalcula solo cuando llegan registros nuevos (se borra al
+    guardar lluvia de la estación o al cambiar CHIRPS de su píxel).
+    """
+    station = models.OneToOneField(Station, on_delete=models.CASCADE, related_name='dependable_rain_fit')
+
+    # Píxel CHIRPS usado como respaldo (para invalidar al llegar datos satelitales)
+    pixel_row = models.IntegerField()
+    pixel_col = models.IntegerField()
+
+    years = models.IntegerField(default=0, help_text="Años con al menos un mes completo")
+    result_data = models.JSONField(verbose_name="Ajuste Mensual")
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['pixel_row', 'pixel_col'])]
+        verbose_name = "Ajuste Lluvia Confiable"
+
+    def __str__(self):
+        return f"Lluvia confiable {self.station.name} ({self.years} años)"
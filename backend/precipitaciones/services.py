@@ -1,45 +1,28 @@
-import ee
-import os
-import json
-from datetime import datetime
-from google.oauth2.service_account import Credentials 
+import numpy as np
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
 from .models import PrecipitationRecord
+from .earth_engine import get_ee
+from .chirps_backends import get_chirps_backend
+from .chirps_cache import ChirpsPixelCache
+from .dependable_rain import monthly_totals_matrix
+from .signals import precipitation_bulk_saved
 from django.core.exceptions import ObjectDoesNotExist
 
-# Ruta al archivo JSON
-KEY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ee-key.json')
-
 def inicializar_earth_engine():
     """
-    Autenticación robusta con Scopes explícitos.
-    """
-    try:
-        ee.Image('UCSB-CHG/CHIRPS/DAILY')
-    except:
-        try:
-            if os.path.exists(KEY_PATH):
-                print(f"🔑 Cargando credenciales GEE...")
-                SCOPES = ['https://www.googleapis.com/auth/earthengine']
-                credentials = Credentials.from_service_account_file(KEY_PATH, scopes=SCOPES)
-                ee.Initialize(credentials)
-            else:
-                print("⚠️ No se encontró ee-key.json")
-                ee.Initialize()
-        except Exception as e:
-            print(f"❌ Error Auth GEE: {e}")
-            raise Exception(f"Fallo de Autenticación GEE: {e}")
-
-def obtener_y_guardar_precipitacion_diaria_rango(station, lat, lon, start_date, end_date):
-    """
-    Descarga datos de CHIRPS (Honesto: Sin modificar fechas).
+    Devuelve el módulo `ee` autenticado. La autenticación ocurre una sola vez
+    por proceso (ver earth_engine.get_ee).
     """
-    # 1. Validación de Datos de Entrada
-    print(f"📍 Validando coordenadas para estación '{station.name}': Lat={lat}, Lon={lon}")
+    return get_ee()
 
+def _validar_coordenadas(lat, lon):
     try:
         f_lat = float(lat)
         f_lon = float(lon)
-        
+
         if not (-90 <= f_lat <= 90):
             raise ValueError(f"Latitud inválida ({f_lat}).")
         if not (-180 <= f_lon <= 180):
@@ -47,79 +30,167 @@ def obtener_y_guardar_precipitacion_diaria_rango(station, lat, lon, start_date,
 
     except (ValueError, TypeError):
         raise Exception(f"Coordenadas corruptas: Lat: {lat}, Lon: {lon}")
+    return f_lat, f_lon
 
-    # 2. Inicializar Conexión
-    inicializar_earth_engine()
-    
-    # 3. Definir Fechas y Geometría
-    # Earth Engine usa [LONGITUD, LATITUD]
-    punto = ee.Geometry.Point([f_lon, f_lat])
-    
-    ee_start = start_date.strftime('%Y-%m-%d')
-    ee_end = end_date.strftime('%Y-%m-%d')
-    
-    print(f"🛰️ Consultando CHIRPS ({ee_start} a {ee_end})...")
-
-    # 4. Colección CHIRPS
-    chirps = ee.ImageCollection('UCSB-CHG/CHIRPS/DAILY') \
-        .filterDate(ee_start, ee_end) \
-        .filterBounds(punto)
-
-    # 5. Reducer
-    def extraer_dato(img):
-        date = img.date().format('YYYY-MM-dd')
-        value = img.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=punto,
-            scale=5000 
-        ).get('precipitation')
-        return ee.Feature(None, {'date': date, 'precipitation': value})
-
-    # Ejecutar en Google
-    try:
-        data = chirps.map(extraer_dato).getInfo()
-    except Exception as e:
-        raise Exception(f"Error interno GEE: {e}")
 
-    # 6. Guardar en BD
+def extraer_chirps_estaciones(puntos, start_date, end_date):
+    """
+    Extracción CHIRPS multi-estación con la fuente configurada (CHIRPS_BACKEND):
+    Google Earth Engine o rásters locales (ver chirps_backends).
+    `puntos` = {clave: (lat, lon)}. end_date es exclusivo.
+    Retorna {clave: [(fecha_str, mm), ...]} (mm crudo de CHIRPS, puede ser None).
+    """
+    return get_chirps_backend().extraer(puntos, start_date, end_date)
+
+
+def obtener_serie_chirps(lat, lon, start_date, end_date):
+    """
+    Serie diaria CHIRPS del píxel del punto en [start_date, end_date), servida
+    desde la caché persistente; solo se descargan los tramos que faltan.
+    Retorna [(fecha_str, mm), ...] ordenada (mm puede ser None).
+    """
+    cache = ChirpsPixelCache()
+    pixel = cache.pixel(lat, lon)
+
+    with cache.single_flight(pixel):
+        cached, stale = cache.load(pixel, start_date, end_date)
+        rangos = cache.missing_ranges(cached, stale, start_date, end_date)
+        if rangos:
+            print(f"🛰️ CHIRPS: descargando {len(rangos)} tramo(s) faltante(s) del píxel {pixel}")
+        for inicio, fin in rangos:
+            valores = extraer_chirps_estaciones({'pixel': cache.center(pixel)}, inicio, fin)['pixel']
+            cache.store(pixel, valores)
+            cached.update(valores)
+
+    return sorted(cached.items())
+
+
+@transaction.atomic
+def guardar_precipitacion_chirps(station, valores, batch_size=None):
+    """
+    Guarda en BD los valores CHIRPS de una estación en bloque:
+    una consulta para leer lo existente, upsert por lotes y nunca se pisan
+    los registros MANUALES (Regla de Oro).
+    Retorna (lista [{'date', 'mm'}] de lo guardado, {'created', 'updated', 'skipped'}).
+    """
+    batch_size = batch_size or getattr(settings, 'PRECIPITATION_BULK_BATCH_SIZE', 500)
+
+    # 1. Limpieza de valores (nulos fuera, negativos a 0)
+    limpios = {}
+    for fecha_str, precip_mm in valores:
+        if precip_mm is None:
+            # Si GEE devuelve nulo, es que no hay dato procesado. Saltamos.
+            continue
+        limpios[datetime.strptime(fecha_str, '%Y-%m-%d').date()] = round(max(float(precip_mm), 0.0), 2)
+
+    stats = {'created': 0, 'updated': 0, 'skipped': 0}
+    if not limpios:
+        return [], stats
+
+    # 2. Lo que ya existe en el rango (una sola consulta)
+    existentes = dict(
+        PrecipitationRecord.objects.filter(
+            station=station, date__range=[min(limpios), max(limpios)]
+        ).values_list('date', 'source')
+    )
+
+    # 3. Armar el lote respetando datos MANUALES
     resultados = []
-    registros_creados = 0
-
-    if 'features' in data:
-        for feature in data['features']:
-            props = feature['properties']
-            fecha_str = props.get('date')
-            precip_mm = props.get('precipitation')
-
-            if precip_mm is None:
-                # Si GEE devuelve nulo, es que no hay dato procesado. Saltamos.
-                continue
-
-            if precip_mm < 0:
-                precip_mm = 0.0
-            
-            valor_final = round(float(precip_mm), 2)
-            fecha_obj = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-
-            obj, created = PrecipitationRecord.objects.update_or_create(
-                station=station,
-                date=fecha_obj,
-                defaults={
-                    'precipitation_mm': valor_final,          
-                    'effective_precipitation_mm': valor_final,
-                    'source': 'SATELLITE'
-                }
-            )
-            
-            resultados.append({
-                "date": fecha_str,
-                "mm": valor_final
-            })
-            if created: registros_creados += 1
-
-    print(f"✅ Sincronización finalizada. Registros nuevos: {registros_creados}.")
+    objs = []
+    for fecha_obj, valor_final in sorted(limpios.items()):
+        fuente_actual = existentes.get(fecha_obj)
+        if fuente_actual == 'MANUAL':
+            stats['skipped'] += 1
+            continue
+        stats['updated' if fuente_actual else 'created'] += 1
+
+        objs.append(PrecipitationRecord(
+            station=station,
+            date=fecha_obj,
+            precipitation_mm=valor_final,
+            effective_precipitation_mm=valor_final,
+            source='SATELLITE'
+        ))
+        resultados.append({
+            "date": fecha_obj.strftime('%Y-%m-%d'),
+            "mm": valor_final
+        })
+
+    # 4. Upsert por lotes (INSERT ... ON CONFLICT DO UPDATE)
+    PrecipitationRecord.objects.bulk_create(
+        objs,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['station', 'date'],
+        update_fields=['precipitation_mm', 'effective_precipitation_mm', 'source'],
+    )
+    # bulk_create no dispara post_save: avisamos a quien dependa de la lluvia
+    # (ajuste de lluvia confiable, checkpoints del balance hídrico)
+    if objs:
+        precipitation_bulk_saved.send(sender=PrecipitationRecord, station=station, start_date=objs[0].date)
+
+    print(f"✅ Sincronización finalizada ({station.name}). Registros nuevos: {stats['created']}, "
+          f"actualizados: {stats['updated']}, manuales respetados: {stats['skipped']}.")
+    return resultados, stats
+
+
+def obtener_y_guardar_precipitacion_diaria_rango(station, lat, lon, start_date, end_date):
+    """
+    Descarga datos de CHIRPS (Honesto: Sin modificar fechas).
+    """
+    # 1. Validación de Datos de Entrada
+    print(f"📍 Validando coordenadas para estación '{station.name}': Lat={lat}, Lon={lon}")
+    punto = _validar_coordenadas(lat, lon)
+
+    # 2. Descarga (misma ruta que la sincronización multi-estación)
+    valores = extraer_chirps_estaciones({station.id: punto}, start_date, end_date)[station.id]
+
+    # 3. Guardar en BD (y en la caché del píxel: marca qué días son provisionales)
+    ChirpsPixelCache().store(ChirpsPixelCache.pixel(*punto), valores)
+    resultados, _ = guardar_precipitacion_chirps(station, valores)
     return resultados
 
+
+def sincronizar_chirps_estaciones(stations, start_date, end_date):
+    """
+    Sincronización de lluvias de toda la finca con una sola extracción GEE
+    por bloque de fechas. Retorna {station_id: {'count', 'data', 'created', 'updated', 'skipped'} | {'error'}}.
+    """
+    resumen = {}
+    puntos = {}
+    por_id = {}
+    for station in stations:
+        try:
+            puntos[station.id] = _validar_coordenadas(station.latitude, station.longitude)
+            por_id[station.id] = station
+        except Exception as e:
+            resumen[station.id] = {'error': str(e)}
+
+    valores = extraer_chirps_estaciones(puntos, start_date, end_date)
+
+    cache = ChirpsPixelCache()
+    for station_id, station in por_id.items():
+        # La caché del píxel registra qué días son provisionales
+        cache.store(cache.pixel(*puntos[station_id]), valores[station_id])
+        datos, stats = guardar_precipitacion_chirps(station, valores[station_id])
+        resumen[station_id] = {'count': len(datos), 'data': datos, **stats}
+    return resumen
+
+def fecha_inicio_incremental(station, end_date, default_days=30):
+    """
+    Inicio para una sincronización incremental: el último registro satelital
+    guardado de la estación menos CHIRPS_SYNC_RECHECK_DAYS (se vuelven a pedir
+    por si CHIRPS reemplazó los datos preliminares). Sin ninguno, los últimos
+    `default_days`.
+    """
+    ultimo = PrecipitationRecord.objects.filter(station=station).exclude(source='MANUAL') \
+        .aggregate(ultimo=Max('date'))['ultimo']
+    if ultimo is None:
+        return end_date - timedelta(days=default_days)
+    recheck = getattr(settings, 'CHIRPS_SYNC_RECHECK_DAYS', 15)
+    return min(ultimo + timedelta(days=1 - recheck), end_date)
+
+
 def get_precipitation_strictly_local(station, target_date):
     """
     Busca datos de precipitación SOLO en la base de datos local.
@@ -137,8 +208,11 @@ def get_precipitation_strictly_local(station, target_date):
 
 def get_historical_precipitation_on_the_fly(lat, lon, start_date, end_date):
     """
-    MODO LECTURA "AL VUELO": Descarga datos de CHIRPS directamente y promedia
-    mensualmente sin guardar en la Base de Datos Histórica.
+    MODO LECTURA "AL VUELO": Promedia mensualmente la serie CHIRPS sin guardar
+    en la tabla operativa. Los días se leen de la caché por píxel
+    (ChirpsDailyCache) y solo se descargan los tramos faltantes.
+    Por mes retorna el promedio, la desviación estándar entre años y el
+    total de cada año; la agregación es vectorial (numpy), no día a día.
     """
     print(f"Generando Histórico de Lluvias Al Vuelo ({start_date} a {end_date})")
     
@@ -149,54 +223,25 @@ def get_historical_precipitation_on_the_fly(lat, lon, start_date, end_date):
     except (ValueError, TypeError):
         raise ValueError(f"Coordenadas corruptas: Lat: {lat}, Lon: {lon}")
 
-    # 2. Obtener datos crudos de CHIRPS
-    inicializar_earth_engine()
-    punto = ee.Geometry.Point([f_lon, f_lat])
-    ee_start = start_date.strftime('%Y-%m-%d')
-    ee_end = end_date.strftime('%Y-%m-%d')
-    
-    chirps = ee.ImageCollection('UCSB-CHG/CHIRPS/DAILY') \
-        .filterDate(ee_start, ee_end) \
-        .filterBounds(punto)
-
-    def extraer_dato(img):
-        date = img.date().format('YYYY-MM-dd')
-        value = img.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=punto,
-            scale=5000 
-        ).get('precipitation')
-        return ee.Feature(None, {'date': date, 'precipitation': value})
+    # 2. Obtener datos crudos de CHIRPS (caché + tramos faltantes)
+    valores = obtener_serie_chirps(f_lat, f_lon, start_date, end_date)
 
-    try:
-        data = chirps.map(extraer_dato).getInfo()
-    except Exception as e:
-        raise Exception(f"Error interno GEE: {e}")
-
-    # Diccionario para agrupar las lluvias diarias en totales mensuales por cada año
-    monthly_totals_by_year = {i: {} for i in range(1, 13)}
-
-    if 'features' in data:
-        for feature in data['features']:
-            props = feature['properties']
-            fecha_str = props.get('date')
-            precip_mm = props.get('precipitation')
-
-            if precip_mm is None or precip_mm < 0:
-                continue
-            
-            # Parse Date
-            try:
-                date_obj = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-                month_idx = date_obj.month
-                year_idx = date_obj.year
-                
-                if year_idx not in monthly_totals_by_year[month_idx]:
-                    monthly_totals_by_year[month_idx][year_idx] = 0.0
-                
-                monthly_totals_by_year[month_idx][year_idx] += float(precip_mm)
-            except:
-                continue
+    # 3. Totales mensuales por año (matriz años × 12, NaN = mes sin datos)
+    if valores:
+        fechas, mm = zip(*valores)
+    else:
+        fechas, mm = [], []
+    totales, primer_year = monthly_totals_matrix(fechas, mm, min_coverage=0)
+
+    # El promedio CROPWAT es la suma de los totales de cada mes dividida
+    # entre el número de años en los que se registró el mes.
+    num_years = np.sum(~np.isnan(totales), axis=0)
+    suma = np.nansum(totales, axis=0)
+    promedio = np.divide(suma, num_years, out=np.zeros(12), where=num_years > 0)
+    desviacion = np.sqrt(np.divide(
+        np.nansum((totales - promedio) ** 2, axis=0), num_years - 1,
+        out=np.zeros(12), where=num_years > 1
+    ))
 
     results = []
     meses_nombres = {
@@ -205,20 +250,18 @@ def get_historical_precipitation_on_the_fly(lat, lon, start_date, end_date):
     }
 
     for month_idx in range(1, 13):
-        year_totals = monthly_totals_by_year[month_idx]
-        num_years = len(year_totals)
-        
-        # El promedio CROPWAT es la suma de los totales de cada mes dividida 
-        # entre el número de años en los que se registró el mes.
-        if num_years > 0:
-            avg_monthly_mm = sum(year_totals.values()) / num_years
-        else:
-            avg_monthly_mm = 0.0
-
+        columna = totales[:, month_idx - 1]
         results.append({
             "month": month_idx,
             "month_name": meses_nombres[month_idx],
-            "precipitation": round(avg_monthly_mm, 2)
+            "precipitation": round(float(promedio[month_idx - 1]), 2),
+            "std_dev": round(float(desviacion[month_idx - 1]), 2),
+            "years": int(num_years[month_idx - 1]),
+            # Total del mes en cada año con datos
+            "yearly_totals": {
+                str(primer_year + i): round(float(total), 2)
+                for i, total in enumerate(columna) if not np.isnan(total)
+            },
         })
 
     return results
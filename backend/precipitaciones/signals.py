@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import ChirpsDailyCache, PrecipitationRecord
+from .chirps_cache import chirps_pixel_changed
+from .dependable_rain import invalidate
+
+# Upsert masivo de PrecipitationRecord (bulk_create no dispara post_save).
+# kwargs: station, start_date (primer día escrito).
+precipitation_bulk_saved = Signal()
+
+
+@receiver(post_save, sender=PrecipitationRecord)
+@receiver(post_delete, sender=PrecipitationRecord)
+def invalidar_lluvia_confiable(sender, instance, **kwargs):
+    """
+    Un registro nuevo, editado o borrado cambia la historia de la estación:
+    el ajuste de lluvia confiable se recalcula en la próxima consulta.
+    """
+    invalidate(station_ids=[instance.station_id])
+
+
+@receiver(precipitation_bulk_saved)
+def invalidar_lluvia_confiable_masivo(sender, station, **kwargs):
+    invalidate(station_ids=[station.id])
+
+
+@receiver(chirps_pixel_changed, sender=ChirpsDailyCache)
+def invalidar_lluvia_confiable_pixel(sender, pixel, **kwargs):
+    """Solo cuando CHIRPS trae días nuevos o corregidos, no en cada re-descarga."""
+    invalidate(pixel=pixel)
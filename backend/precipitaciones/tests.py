@@ -1,3 +1,251 @@
-from django.test import TestCase
+import math
+import threading
+from datetime import date, timedelta
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .chirps_backends import ChirpsBackend, LocalRasterChirpsBackend
+from .chirps_cache import ChirpsPixelCache
+from .dependable_rain import (
+    FALLBACK_RATIO, fao_dependable_effective, fit_dependable_rain, monthly_totals_matrix,
+)
+from .models import DependableRainFit, PrecipitationRecord, Station
+from .services import fecha_inicio_incremental
+
+
+def _weibull(valores, p):
+    """Cuantil empírico de Weibull calculado a mano: posición p·(n+1) sobre la muestra ordenada."""
+    x = sorted(v for v in valores if not math.isnan(v))
+    h = p * (len(x) + 1)
+    if h <= 1:
+        return x[0]
+    if h >= len(x):
+        return x[-1]
+    k = int(h)
+    return x[k - 1] + (h - k) * (x[k] - x[k - 1])
+
+
+class LocalRasterIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        # Eje de centros de píxel de 0.05° (como el de los NetCDF de CHIRPS)
+        self.coords = np.round(np.arange(-4.975, 13.0, 0.05), 3)
+
+    def test_indice_del_pixel_que_contiene_el_punto(self):
+        i = LocalRasterChirpsBackend._indice_cercano(self.coords, 2.92)
+        self.assertLessEqual(abs(self.coords[i] - 2.92), 0.025)
+
+    def test_rechaza_puntos_fuera_de_la_extension(self):
+        self.assertEqual(LocalRasterChirpsBackend._indice_cercano(self.coords, -5.0), 0)
+        self.assertIsNone(LocalRasterChirpsBackend._indice_cercano(self.coords, -5.01))
+        self.assertIsNone(LocalRasterChirpsBackend._indice_cercano(self.coords, 40.0))
+
+    def test_eje_descendente(self):
+        i = LocalRasterChirpsBackend._indice_cercano(self.coords[::-1], 12.93)
+        self.assertEqual(i, 1)
+        self.assertIsNone(LocalRasterChirpsBackend._indice_cercano(self.coords[::-1], 13.2))
+
+
+class ChirpsBackendContractTests(SimpleTestCase):
+
+    def test_una_fuente_sin_extraer_no_se_instancia(self):
+        class SinExtraer(ChirpsBackend):
+            name = 'incompleta'
+
+        with self.assertRaises(TypeError):
+            SinExtraer()
+        with self.assertRaises(TypeError):
+            ChirpsBackend()
+
+
+class ChirpsPixelCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = ChirpsPixelCache(provisional_days=60, refresh_hours=24)
+
+    def _dias(self, inicio, fin):
+        return {(inicio + timedelta(days=i)).isoformat(): 1.0 for i in range((fin - inicio).days)}
+
+    def test_el_centro_del_pixel_cae_en_el_mismo_pixel(self):
+        for lat, lon in [(2.92, -75.28), (-0.024, 0.001), (4.6, -74.08)]:
+            pixel = ChirpsPixelCache.pixel(lat, lon)
+            self.assertEqual(ChirpsPixelCache.pixel(*ChirpsPixelCache.center(pixel)), pixel)
+
+    def test_pixeles_distintos_no_se_esperan(self):
+        pixel, otro = ChirpsPixelCache.pixel(2.92, -75.28), ChirpsPixelCache.pixel(4.6, -74.08)
+        dentro, soltar = threading.Event(), threading.Event()
+
+        def descarga_larga():
+            with ChirpsPixelCache.single_flight(pixel):
+                dentro.set()
+                soltar.wait(5)
+
+        hilo = threading.Thread(target=descarga_larga)
+        hilo.start()
+        dentro.wait(5)
+        with ChirpsPixelCache.single_flight(otro):
+            self.assertIn(pixel, ChirpsPixelCache._in_flight)
+        soltar.set()
+        hilo.join(5)
+        self.assertEqual(ChirpsPixelCache._in_flight, {})
+
+    def test_tramos_semiabiertos(self):
+        cached = self._dias(date(2024, 1, 1), date(2024, 2, 1))
+        self.assertEqual(self.cache.missing_ranges(cached, set(), date(2024, 1, 1), date(2024, 2, 1)), [])
+        self.assertEqual(
+            self.cache.missing_ranges(cached, set(), date(2024, 1, 1), date(2024, 2, 3)),
+            [(date(2024, 2, 1), date(2024, 2, 3))],
+        )
+
+    def test_huecos_cortos_se_unen_y_largos_no(self):
+        cached = self._dias(date(2024, 1, 1), date(2024, 7, 1))
+        for dia in ('2024-01-05', '2024-01-20', '2024-05-10'):
+            del cached[dia]
+        self.assertEqual(
+            self.cache.missing_ranges(cached, set(), date(2024, 1, 1), date(2024, 7, 1)),
+            [(date(2024, 1, 5), date(2024, 1, 21)), (date(2024, 5, 10), date(2024, 5, 11))],
+        )
+
+    def test_provisionales_vencidos_cuentan_como_faltantes(self):
+        cached = self._dias(date(2024, 1, 1), date(2024, 2, 1))
+        self.assertEqual(
+            self.cache.missing_ranges(cached, {'2024-01-31'}, date(2024, 1, 1), date(2024, 2, 1)),
+            [(date(2024, 1, 31), date(2024, 2, 1))],
+        )
+
+
+class ChirpsPixelStoreTests(TestCase):
+
+    def setUp(self):
+        self.pixel = ChirpsPixelCache.pixel(2.92, -75.28)
+        user = get_user_model().objects.create_user(email='lluvia@example.com', username='lluvia', password='x')
+        self.station = Station.objects.create(user=user, name='Finca', latitude=2.92, longitude=-75.28)
+        self.cache = ChirpsPixelCache()
+        self.cache.store(self.pixel, [('2024-01-01', 3.5), ('2024-01-02', 0.0)])
+        self._ajustar()
+
+    def _ajustar(self):
+        DependableRainFit.objects.update_or_create(
+            station=self.station,
+            defaults={'pixel_row': self.pixel[0], 'pixel_col': self.pixel[1], 'result_data': []},
+        )
+
+    def test_redescarga_igual_conserva_el_ajuste(self):
+        self.assertEqual(self.cache.store(self.pixel, [('2024-01-01', 3.5), ('2024-01-02', 0.0)]), [])
+        self.assertTrue(DependableRainFit.objects.filter(station=self.station).exists())
+
+    def test_dias_nuevos_o_corregidos_invalidan_el_ajuste(self):
+        self.assertEqual(self.cache.store(self.pixel, [('2024-01-02', 1.2)]), [date(2024, 1, 2)])
+        self.assertFalse(DependableRainFit.objects.filter(station=self.station).exists())
+
+        self._ajustar()
+        self.assertEqual(self.cache.store(self.pixel, [('2024-01-03', 0.0)]), [date(2024, 1, 3)])
+        self.assertFalse(DependableRainFit.objects.filter(station=self.station).exists())
+
+
+@override_settings(CHIRPS_SYNC_RECHECK_DAYS=5)
+class IncrementalChirpsStartTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(email='sync@example.com', username='sync', password='x')
+        self.station = Station.objects.create(user=user, name='Finca', latitude=2.92, longitude=-75.28)
+        self.hoy = date(2024, 6, 30)
+
+    def _registrar(self, dia, source):
+        PrecipitationRecord.objects.bulk_create([
+            PrecipitationRecord(station=self.station, date=dia, precipitation_mm=2.0, source=source)
+        ])
+
+    def test_sin_registros_pide_los_ultimos_dias(self):
+        self.assertEqual(fecha_inicio_incremental(self.station, self.hoy), date(2024, 5, 31))
+
+    def test_repite_los_ultimos_dias_guardados(self):
+        self._registrar(date(2024, 6, 20), 'CHIRPS')
+        self._registrar(date(2024, 6, 28), 'MANUAL')
+        self.assertEqual(fecha_inicio_incremental(self.station, self.hoy), date(2024, 6, 16))
+
+        self._registrar(date(2024, 6, 30), 'CHIRPS')
+        self.assertEqual(fecha_inicio_incremental(self.station, self.hoy), date(2024, 6, 26))
+
+
+class MonthlyTotalsTests(SimpleTestCase):
+
+    def test_totales_y_cobertura(self):
+        # Febrero bisiesto completo, marzo con solo 20 días (por debajo del 90%)
+        fechas = [date(2024, 2, 1) + timedelta(days=i) for i in range(29)]
+        fechas += [date(2024, 3, 1) + timedelta(days=i) for i in range(20)]
+        valores = [2.0] * len(fechas)
+        totales, primer_year = monthly_totals_matrix(fechas, valores)
+
+        self.assertEqual(primer_year, 2024)
+        self.assertEqual(totales.shape, (1, 12))
+        self.assertAlmostEqual(totales[0, 1], 58.0)
+        self.assertTrue(np.isnan(totales[0, 2]))
+        self.assertTrue(np.isnan(totales[0, 0]))
+
+    def test_serie_vacia(self):
+        totales, primer_year = monthly_totals_matrix([], [])
+        self.assertEqual(totales.shape, (0, 12))
+        self.assertEqual(primer_year, 0)
+
+
+class ClimatologyTotalsTests(SimpleTestCase):
+
+    def test_nulos_y_negativos_no_cuentan(self):
+        fechas = [date(2023, 4, 1) + timedelta(days=i) for i in range(30)]
+        valores = [1.0] * 28 + [None, -5.0]
+        totales, _ = monthly_totals_matrix(fechas, valores)
+        # 28 de 30 días (93%) alcanza la cobertura mínima
+        self.assertAlmostEqual(totales[0, 3], 28.0)
+
+    def test_sin_cobertura_minima_cuenta_todo_mes_con_datos(self):
+        # La climatología al vuelo promedia cualquier mes con al menos un día
+        fechas = ['2022-05-03', '2023-05-10', '2023-06-01']
+        totales, primer_year = monthly_totals_matrix(fechas, [4.0, 6.0, 1.5], min_coverage=0)
+        self.assertEqual(primer_year, 2022)
+        np.testing.assert_allclose(totales[:, 4], [4.0, 6.0])
+        self.assertTrue(np.isnan(totales[0, 5]))
+        self.assertAlmostEqual(totales[1, 5], 1.5)
+
+
+class DependableRainFitTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.totales = rng.gamma(2.0, 60.0, size=(14, 12))
+        self.totales[rng.random(self.totales.shape) < 0.2] = np.nan
+        self.totales[:, 6] = np.nan
+        self.totales[:2, 6] = [40.0, 90.0]
+
+    def fit(self, min_years):
+        return fit_dependable_rain(self.totales, min_years=min_years)
+
+    def test_cuantiles_de_weibull(self):
+        for mes in self.fit(min_years=3):
+            columna = self.totales[:, mes['month'] - 1]
+            if mes['fallback']:
+                continue
+            self.assertAlmostEqual(mes['p80'], round(_weibull(columna, 0.2), 2), places=2)
+            self.assertAlmostEqual(mes['p50'], round(_weibull(columna, 0.5), 2), places=2)
+            self.assertEqual(mes['years'], int(np.sum(~np.isnan(columna))))
+
+    def test_lluvia_efectiva_y_fraccion(self):
+        for mes in self.fit(min_years=3):
+            if mes['fallback']:
+                continue
+            pe = float(fao_dependable_effective(mes['p80']))
+            self.assertAlmostEqual(mes['pe_dependable'], round(pe, 2), places=1)
+            self.assertGreaterEqual(mes['ratio'], 0.0)
+            self.assertLessEqual(mes['ratio'], 1.0)
+
+    def test_meses_con_poca_historia_usan_respaldo(self):
+        julio = self.fit(min_years=3)[6]
+        self.assertTrue(julio['fallback'])
+        self.assertEqual(julio['years'], 2)
+        self.assertEqual(julio['ratio'], FALLBACK_RATIO)
+        self.assertIsNone(julio['pe_dependable'])
+
+    def test_formula_fao(self):
+        np.testing.assert_allclose(fao_dependable_effective([10.0, 70.0, 100.0]), [0.0, 32.0, 56.0])
@@ -28,11 +28,11 @@ class StationViewSet(viewsets.ModelViewSet):
         # Asigna automáticamente el usuario dueño
         serializer.save(user=self.request.user)
 
-    # 🚀 ACCIÓN NUEVA: Descargar datos satelitales CHIRPS
-    @action(detail=True, methods=['post'])
-    def fetch_chirps(self, request, pk=None):
-        station = self.get_object()
-        
+    def _rango_fechas(self, request):
+        """
+        Rango (start_date, end_date) del body; por defecto los últimos 30 días.
+        Retorna (start, end, None) o (None, None, Response de error).
+        """
         # 1. Definir fechas por defecto (Hoy y hace 30 días)
         # Usamos timezone.now() para ser consistentes con la BD
         now = timezone.now().date()
@@ -48,17 +48,37 @@ class StationViewSet(viewsets.ModelViewSet):
             try:
                 start_date = datetime.strptime(start_input, '%Y-%m-%d').date()
             except ValueError:
-                return Response({"error": "Formato start_date inválido (YYYY-MM-DD)"}, status=400)
+                return None, None, Response({"error": "Formato start_date inválido (YYYY-MM-DD)"}, status=400)
                 
         if end_input:
             try:
                 end_date = datetime.strptime(end_input, '%Y-%m-%d').date()
             except ValueError:
-                return Response({"error": "Formato end_date inválido (YYYY-MM-DD)"}, status=400)
+                return None, None, Response({"error": "Formato end_date inválido (YYYY-MM-DD)"}, status=400)
 
         # Validación lógica de fechas
         if start_date > end_date:
-             return Response({"error": "La fecha de inicio no puede ser mayor a la final"}, status=400)
+             return None, None, Response({"error": "La fecha de inicio no puede ser mayor a la final"}, status=400)
+
+        return start_date, end_date, None
+
+    def _es_incremental(self, request):
+        """Modo incremental: solo desde el último dato guardado (si no se envía start_date)."""
+        flag = str(request.data.get('incremental', '')).lower() in ('1', 'true', 'yes')
+        return flag and not request.data.get('start_date')
+
+    # 🚀 ACCIÓN NUEVA: Descargar datos satelitales CHIRPS
+    @action(detail=True, methods=['post'])
+    def fetch_chirps(self, request, pk=None):
+        station = self.get_object()
+
+        start_date, end_date, error = self._rango_fechas(request)
+        if error:
+            return error
+
+        if self._es_incremental(request):
+            from .services import fecha_inicio_incremental
+            start_date = fecha_inicio_incremental(station, end_date)
 
         try:
             # Llamada a Google Earth Engine (Servicio)
@@ -76,6 +96,8 @@ class StationViewSet(viewsets.ModelViewSet):
             return Response({
                 "message": f"Sincronización exitosa. Se procesaron {count} registros.",
                 "count": count,
+                "start_date": start_date,
+                "end_date": end_date,
                 "data": resultados
             })
         except Exception as e:
@@ -85,6 +107,47 @@ class StationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
+    @action(detail=False, methods=['post'])
+    def fetch_chirps_bulk(self, request):
+        """
+        Descarga CHIRPS para varias estaciones en una sola extracción GEE.
+        Body: station_ids (opcional, por defecto todas las activas), start_date, end_date, incremental.
+        """
+        start_date, end_date, error = self._rango_fechas(request)
+        if error:
+            return error
+
+        stations = self.get_queryset().filter(is_active=True)
+        station_ids = request.data.get('station_ids')
+        if station_ids:
+            stations = self.get_queryset().filter(id__in=station_ids)
+
+        if not stations.exists():
+            return Response({"error": "No hay estaciones para sincronizar"}, status=400)
+
+        if self._es_incremental(request):
+            # Una sola extracción: desde la estación más atrasada
+            from .services import fecha_inicio_incremental
+            start_date = min(fecha_inicio_incremental(st, end_date) for st in stations)
+
+        try:
+            from .services import sincronizar_chirps_estaciones
+            resumen = sincronizar_chirps_estaciones(list(stations), start_date, end_date)
+            total = sum(r.get('count', 0) for r in resumen.values())
+            return Response({
+                "message": f"Sincronización exitosa. Se procesaron {total} registros en {len(resumen)} estaciones.",
+                "count": total,
+                "start_date": start_date,
+                "end_date": end_date,
+                "stations": resumen
+            })
+        except Exception as e:
+            print(f"Error CHIRPS (multi-estación): {e}")
+            return Response(
+                {"error": f"Error conectando con satélite CHIRPS: {str(e)}"}, 
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
     @action(detail=True, methods=['get'])
     def historical_analysis(self, request, pk=None):
         """
@@ -150,6 +213,30 @@ class StationViewSet(viewsets.ModelViewSet):
             print(f"Error en Sync History Precipitaciones: {e}")
             return Response({"error": str(e)}, status=500)
 
+    @action(detail=True, methods=['get'])
+    def dependable_rain(self, request, pk=None):
+        """
+        Lluvia confiable FAO de la estación: por mes P80, P50, lluvia efectiva
+        confiable y la fracción diaria que usa el balance hídrico (DEPENDABLE).
+        """
+        from .dependable_rain import get_dependable_rain
+        station = self.get_object()
+        return Response(get_dependable_rain(station))
+
+    @action(detail=False, methods=['get'])
+    def earth_engine_status(self, request):
+        """
+        Estado de la conexión con Google Earth Engine.
+        Sin parámetros solo informa el estado en memoria; con ?probe=true
+        autentica si hace falta y consulta CHIRPS (503 si no responde).
+        """
+        from .earth_engine import health
+        probe = request.query_params.get('probe', '').lower() in ('1', 'true', 'yes')
+        data = health(probe=probe)
+        if probe and not data['ready']:
+            return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(data)
+
 # ------------------------------------------------------------------
 # VISTAS DE REGISTROS DE LLUVIA (Operación Diaria)
 # ------------------------------------------------------------------
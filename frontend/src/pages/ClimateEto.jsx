@@ -248,7 +248,9 @@ export default function ClimateEto() {
             });
             const chartData = res.data.map(item => ({ name: item.month_name, ...item.eto_results }));
             setHistoricalData(chartData);
-            toast.success("Análisis completado.");
+            const missing = res.headers['x-missing-ranges'];
+            if (missing) toast(`Análisis parcial: NASA no entregó ${missing}. Reintenta para completarlo.`, { icon: '⚠️' });
+            else toast.success("Análisis completado.");
         } catch (error) { toast.error("Error analizando"); }
         finally { setAnalyzing(false); }
     };
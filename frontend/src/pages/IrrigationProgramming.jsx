@@ -31,7 +31,7 @@ export default function IrrigationProgramming() {
   const handleCalculate = async (plantingId) => {
     setCalculating(prev => ({ ...prev, [plantingId]: true }));
     try {
-      const res = await api.get(`/cultivo/plantings/${plantingId}/calculate_irrigation/`);
+      const res = await api.post(`/cultivo/plantings/${plantingId}/calculate_irrigation/`);
       setCalculations(prev => ({ ...prev, [plantingId]: res.data }));
       toast.success("Balance hídrico actualizado correctamente");
     } catch (error) {
@@ -12,7 +12,9 @@ export default function Settings() {
   // Opciones traídas del Backend (Listas vacías iniciales)
   const [availableOptions, setAvailableOptions] = useState({
     eto_methods: [],
-    rain_methods: []
+    rain_methods: [],
+    kc_modes: [],
+    irrigation_types: []
   });
 
   // Estado del formulario
@@ -21,6 +23,8 @@ export default function Settings() {
     preferred_eto_method: '',
     effective_rain_method: '',
     system_efficiency: 0.90,
+    crop_coefficient_mode: 'SINGLE',
+    irrigation_type: 'DRIP',
     experience_criterion: 80.0
   });
 
@@ -180,6 +184,57 @@ export default function Settings() {
             </p>
           </div>
         </div>
+        {/* TARJETA: COEFICIENTE DE CULTIVO (Kc único / dual) */}
+        <div className="bg-white p-6 rounded-xl shadow-sm border border-gray-200 md:col-span-2">
+          <div className="flex items-center gap-3 mb-2">
+            <div className="bg-teal-100 p-2 rounded-lg text-teal-600">
+              <Droplets size={24} />
+            </div>
+            <h3 className="text-lg font-bold text-gray-700">Coeficiente de Cultivo</h3>
+          </div>
+          <p className="text-sm text-gray-500 mb-6">
+            El Kc dual separa la transpiración del cultivo (Kcb) de la evaporación del suelo mojado (Ke). Recomendado para goteo y frutales jóvenes.
+          </p>
+
+          <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+            {availableOptions.kc_modes.map((mode) => (
+              <label 
+                key={mode.value}
+                className={`flex items-start gap-3 p-3 rounded-lg border cursor-pointer transition-all ${
+                  formData.crop_coefficient_mode === mode.value 
+                    ? 'bg-teal-50 border-teal-500 ring-1 ring-teal-500' 
+                    : 'hover:bg-gray-50 border-gray-200'
+                }`}
+              >
+                <input 
+                  type="radio" 
+                  name="kc_mode" 
+                  value={mode.value}
+                  checked={formData.crop_coefficient_mode === mode.value}
+                  onChange={(e) => setFormData({...formData, crop_coefficient_mode: e.target.value})}
+                  className="mt-1 accent-teal-600"
+                />
+                <span className="font-bold text-gray-800">{mode.label}</span>
+              </label>
+            ))}
+          </div>
+
+          {formData.crop_coefficient_mode === 'DUAL' && (
+            <div className="mt-6">
+              <label className="text-sm font-bold text-gray-700 block mb-2">Tipo de Riego (fracción de suelo mojada)</label>
+              <select
+                value={formData.irrigation_type}
+                onChange={(e) => setFormData({...formData, irrigation_type: e.target.value})}
+                className="w-full md:w-1/2 p-3 border border-gray-300 rounded-lg"
+              >
+                {availableOptions.irrigation_types.map((type) => (
+                  <option key={type.value} value={type.value}>{type.label}</option>
+                ))}
+              </select>
+            </div>
+          )}
+        </div>
+
         {/* Criterio de experiencia*/}     
         <div className="bg-white p-6 rounded-xl shadow-sm border border-gray-200 md:col-span-2">
            <div className="flex items-center gap-3 mb-4"><div className="bg-emerald-100 p-2 rounded-lg text-emerald-600"><TreePine size={24} /></div><h3 className="text-lg font-bold text-gray-700">Criterio de Experiencia (Área de Sombra)</h3></div>